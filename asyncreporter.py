@@ -0,0 +1,127 @@
+import asyncio
+import functools
+import inspect
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import database
+from shipmentreporter import Reporter, WORKERS
+
+# Streaming methods and the attribute their pages continue after
+STREAMS = {
+    "iter_vessels_that_docked_port_between": "imo",
+    "iter_ports_in_country": "id",
+    "iter_vessels_from_country": "imo",
+}
+
+# Reporter methods that are not reports
+EXCLUDED = ("run_parallel", "close")
+
+
+class AsyncReporter:
+    def __init__(self, database_path: str = None, workers: int = WORKERS, timeout: float = None, cache: bool = False):
+        """Open an asyncio-facing reporter on the configured database (or ``database_path``).
+
+        Every Reporter method is available as a coroutine, run on a pool of
+        ``workers`` threads that each read through their own connection.
+        ``timeout`` is the default limit in seconds for a single call.
+        """
+        self.reporter = Reporter(database_path, cache=cache, concurrent=True, workers=workers)
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="async-reporter")
+        self._slots = asyncio.Semaphore(workers)
+        self._running = {}
+        self._lock = threading.Lock()
+
+    async def call(self, function, *args, timeout: float = None, **kwargs):
+        """Run ``function(*args, **kwargs)`` on a worker thread and await its result.
+
+        Calls wait for a free worker rather than queueing in the executor. On
+        cancellation or timeout the query running on the worker's connection
+        is interrupted, so the worker is freed instead of finishing the work.
+        """
+        token = object()
+
+        def run():
+            conn = self.reporter.conn
+            with self._lock:
+                self._running[token] = conn
+            try:
+                return function(*args, **kwargs)
+            finally:
+                with self._lock:
+                    del self._running[token]
+
+        async with self._slots:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, run)
+            try:
+                return await asyncio.wait_for(future, timeout if timeout is not None else self.timeout)
+            except (asyncio.CancelledError, TimeoutError):
+                self._interrupt(token)
+                raise
+
+    def _interrupt(self, token):
+        """Helper method to abort the statement of a call that is still running."""
+        with self._lock:
+            conn = self._running.get(token)
+            if conn is not None:
+                conn.interrupt()
+
+    @staticmethod
+    def _page(iterate, args: tuple, kwargs: dict, chunk_size: int, after) -> list:
+        """Helper method to read one page of a streaming Reporter method."""
+        rows = iterate(*args, chunk_size=chunk_size, after=after, **kwargs)
+        try:
+            return list(itertools.islice(rows, chunk_size))
+        finally:
+            rows.close()
+
+    async def aclose(self):
+        """Wait for running calls, then close the worker pool and the connections."""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        self.reporter.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(database_path={self.reporter.database_path}, workers={self.workers}, timeout={self.timeout})"
+
+
+def _coroutine(name: str):
+    method = getattr(Reporter, name)
+
+    @functools.wraps(method)
+    async def coroutine(self, *args, **kwargs):
+        return await self.call(getattr(self.reporter, name), *args, **kwargs)
+
+    return coroutine
+
+
+def _stream(name: str, key: str):
+    method = getattr(Reporter, name)
+
+    # Pages are separate keyset queries, so no cursor is held between them
+    # and a slow consumer does not tie up a worker
+    @functools.wraps(method)
+    async def stream(self, *args, chunk_size: int = database.CHUNK_SIZE, after=None, **kwargs):
+        while True:
+            page = await self.call(self._page, getattr(self.reporter, name), args, kwargs, chunk_size, after)
+            for item in page:
+                yield item
+            if len(page) < chunk_size:
+                return
+            after = getattr(page[-1], key)
+
+    return stream
+
+
+for _name, _method in inspect.getmembers(Reporter, inspect.isfunction):
+    if _name in STREAMS:
+        setattr(AsyncReporter, _name, _stream(_name, STREAMS[_name]))
+    elif not _name.startswith("_") and _name not in EXCLUDED:
+        setattr(AsyncReporter, _name, _coroutine(_name))
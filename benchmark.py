@@ -0,0 +1,327 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+import database
+import frame
+import identitymap
+import ingest
+import routes
+import scenarios
+import shipmentapp
+import snapshot
+import synthetic
+from port import Port
+from vessel import Vessel
+from shipment import Shipment
+from shipmentreporter import Reporter
+
+# Named feed sizes for --shipments; plain numbers work as well
+SIZES = {"10k": 10_000, "1M": 1_000_000, "10M": 10_000_000}
+
+# Number of entities sampled for the get_* lookups
+LOOKUP_SAMPLE = 1000
+
+
+def measure_allocation(build) -> int:
+    """Return the number of bytes still allocated by the objects ``build()`` returns."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del objects
+    return after - before
+
+
+def dict_backed(cls):
+    """Return a plain __dict__ class with the attributes of the slotted entity ``cls``, as a baseline."""
+    fields = cls.__slots__
+
+    def __init__(self, *values):
+        for name, value in zip(fields, values):
+            setattr(self, name, value)
+    return type(f"Dict{cls.__name__}", (), {"__init__": __init__})
+
+
+def entity_memory(rows: list, cls) -> dict:
+    """Compare the per-object memory of a slotted entity with that of its dict-backed equivalent."""
+    # Both variants share the row values, so only the objects themselves are measured
+    baseline = dict_backed(cls)
+    dict_bytes = measure_allocation(lambda: [baseline(*row) for row in rows])
+    slotted_bytes = measure_allocation(lambda: [cls(*row) for row in rows])
+    count = max(len(rows), 1)
+    return {
+        "objects": len(rows),
+        "dict_bytes_per_object": dict_bytes / count,
+        "slotted_bytes_per_object": slotted_bytes / count,
+        "saving": 1 - slotted_bytes / dict_bytes if dict_bytes else 0.0,
+    }
+
+
+def benchmark_entity_memory(copies: int = 1) -> dict:
+    """Measure the memory the slotted entities save on the rows of the current database."""
+    cursor = database.get_connection().cursor()
+    tables = {
+        "ports": ("SELECT * FROM ports", Port),
+        "vessels": ("SELECT * FROM vessels", Vessel),
+        "shipments": (f"SELECT {shipmentapp.SHIPMENT_COLUMNS} FROM shipments", Shipment),
+    }
+
+    results = {}
+    for table, (query, cls) in tables.items():
+        rows = cursor.execute(query).fetchall() * copies
+        results[table] = entity_memory(rows, cls)
+    return results
+
+
+def parse_size(size: str) -> int:
+    """Return the number of shipments for a size such as 10k, 1M or 2500."""
+    if size in SIZES:
+        return SIZES[size]
+    multipliers = {"k": 1_000, "M": 1_000_000}
+    if size[-1:] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+
+def timed(results: list, name: str, function, repeat: int = 1):
+    """Run ``function`` ``repeat`` times, record the best time under ``name`` and return its result."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+
+    rows = len(result) if isinstance(result, (tuple, list)) else getattr(result, "rows", 1)
+    results.append({"name": name, "seconds": best, "rows": rows})
+    return result
+
+
+def benchmark_ingest(results: list, feed_path: str, database_path: str):
+    """Time a full load of the feed into a new database."""
+    database.configure(path=database_path)
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        shipmentapp.create_tables(cursor)
+        stats = timed(results, "ingest.populate_database", lambda: shipmentapp.populate_database(cursor, feed_path))
+    results[-1]["rows"] = stats.shipments
+
+
+def benchmark_parallel_ingest(results: list, feed_path: str, database_path: str, workers: int = ingest.PARSE_WORKERS):
+    """Time a full load of the feed with parsing and validation spread over ``workers`` processes."""
+    database.configure(path=database_path)
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        shipmentapp.create_tables(cursor)
+        stats = timed(results, f"ingest.load_feed[{workers}]",
+                      lambda: shipmentapp.populate_database(cursor, feed_path, workers=workers))
+    results[-1]["rows"] = stats.shipments
+
+
+def benchmark_reporter(results: list, database_path: str, repeat: int):
+    """Time every Reporter method once the caches are warm, without the result cache."""
+    reporter = Reporter(database_path)
+    port = reporter.ports_with_most_shipments()[0]
+    country = reporter.conn.execute("SELECT country FROM vessels GROUP BY country ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+    vessel_type = reporter.conn.execute("SELECT type FROM vessels GROUP BY type ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+    start, end = date(2022, 1, 1), date(2022, 12, 31)
+
+    calls = {
+        "total_amount_of_vessels": lambda: reporter.total_amount_of_vessels(),
+        "longest_shipment": lambda: reporter.longest_shipment(),
+        "longest_and_shortest_vessels": lambda: reporter.longest_and_shortest_vessels(),
+        "widest_and_smallest_vessels": lambda: reporter.widest_and_smallest_vessels(),
+        "vessels_with_the_most_shipments": lambda: reporter.vessels_with_the_most_shipments(),
+        "ports_with_most_shipments": lambda: reporter.ports_with_most_shipments(),
+        "ports_with_first_shipment": lambda: reporter.ports_with_first_shipment(),
+        "ports_with_first_shipment[type]": lambda: reporter.ports_with_first_shipment(vessel_type),
+        "ports_with_latest_shipment": lambda: reporter.ports_with_latest_shipment(),
+        "ports_with_latest_shipment[type]": lambda: reporter.ports_with_latest_shipment(vessel_type),
+        "vessels_that_docked_port_between": lambda: reporter.vessels_that_docked_port_between(port, start, end),
+        "vessels_in_port_at": lambda: reporter.vessels_in_port_at(port, datetime(2022, 7, 1, 12)),
+        "port_occupancy": lambda: reporter.port_occupancy(port, start, end),
+        "port_traffic": lambda: reporter.port_traffic(port, start, end),
+        "time_series[port]": lambda: reporter.time_series("port", start, end, port),
+        "time_series[vessel_type.week]": lambda: reporter.time_series("vessel_type", start, end, grain="week"),
+        "ports_in_country": lambda: reporter.ports_in_country(port.country),
+        "search_ports": lambda: reporter.search_ports(port.name[:6]),
+        "search_ports[typo]": lambda: reporter.search_ports("provnce " + port.province.split()[-1]),
+        "search_vessels[typo]": lambda: reporter.search_vessels("synthetc 12"),
+        "vessels_from_country": lambda: reporter.vessels_from_country(country),
+        "top_n[vessel.length]": lambda: reporter.top_n("vessel", "length", 50),
+        "top_n[shipment.distance_naut]": lambda: reporter.top_n("shipment", "distance_naut", 50),
+    }
+    for name, call in calls.items():
+        timed(results, f"reporter.{name}", call, repeat)
+
+    # Exports are written to the null device so only the query and CSV encoding are measured
+    with open(os.devnull, "wb") as sink:
+        exports = {
+            "vessels_that_docked_port_between": lambda: reporter.vessels_that_docked_port_between(port, start, end, to_csv=True, output=sink),
+            "ports_in_country": lambda: reporter.ports_in_country(port.country, to_csv=True, output=sink),
+            "vessels_from_country": lambda: reporter.vessels_from_country(country, to_csv=True, output=sink),
+        }
+        for name, export in exports.items():
+            timed(results, f"export.{name}", lambda: (export(), reporter.last_export)[1], repeat)
+    reporter.close()
+
+
+def benchmark_lookups(results: list, database_path: str, sample: int = LOOKUP_SAMPLE):
+    """Time the entity get_* lookups for a fixed sample of shipments, vessels and ports, starting cold."""
+    database.configure(path=database_path)
+    cursor = database.get_connection().cursor()
+    shipments = [Shipment(*row) for row in cursor.execute(
+        f"SELECT {shipmentapp.SHIPMENT_COLUMNS} FROM shipments ORDER BY id LIMIT ?", (sample,))]
+    vessels = [Vessel(*row) for row in cursor.execute("SELECT * FROM vessels ORDER BY imo LIMIT ?", (sample,))]
+    ports = [Port(*row) for row in cursor.execute("SELECT * FROM ports ORDER BY id LIMIT ?", (sample,))]
+
+    with identitymap.session():
+        timed(results, "lookup.Shipment.get_ports", lambda: [shipment.get_ports() for shipment in shipments])
+        timed(results, "lookup.Shipment.get_vessel", lambda: [shipment.get_vessel() for shipment in shipments])
+    timed(results, "lookup.Vessel.get_shipments", lambda: [vessel.get_shipments() for vessel in vessels])
+    timed(results, "lookup.Port.get_shipments", lambda: [port.get_shipments() for port in ports])
+
+
+def benchmark_routes(results: list, database_path: str):
+    """Time building the route graph and the busiest-lane query on it."""
+    conn = database.connect(database_path)
+    graph = timed(results, "routes.RouteGraph.from_database", lambda: routes.RouteGraph.from_database(conn))
+    results[-1]["rows"] = len(graph)
+    timed(results, "routes.busiest_lanes", lambda: graph.busiest_lanes(50))
+    conn.close()
+
+
+def benchmark_snapshot(results: list, database_path: str, repeat: int):
+    """Time writing the columnar snapshot and a cold start from it against one from the database."""
+    snapshot_path = database_path + ".snapshot"
+    timed(results, "snapshot.write_snapshot", lambda: snapshot.write_snapshot(snapshot_path, database_path))
+
+    def from_snapshot():
+        with snapshot.open_snapshot(snapshot_path, database_path, rebuild=False) as mapped:
+            return len(frame.ShipmentFrame.from_snapshot(mapped))
+
+    conn = database.connect(database_path)
+    for name, load in (("from_database", lambda: len(frame.ShipmentFrame.from_database(conn))), ("from_snapshot", from_snapshot)):
+        rows = timed(results, f"frame.ShipmentFrame.{name}", load, repeat)
+        results[-1]["rows"] = rows
+    conn.close()
+
+
+def benchmark_scenarios(results: list, database_path: str, prices: int = 100):
+    """Time pricing every shipment under ``prices`` fuel prices, aggregated by every grouping."""
+    conn = database.connect(database_path)
+    engine = scenarios.FuelScenarios(frame.ShipmentFrame.from_database(conn), [1 + i / prices for i in range(prices)])
+    conn.close()
+    timed(results, "scenarios.FuelScenarios.aggregate", lambda: engine.aggregate(*scenarios.GROUPINGS))
+    results[-1]["rows"] = len(engine.base) * prices
+
+
+def git_commit() -> str:
+    """Return the commit the benchmark runs on, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(shipments: int, seed: int = 0, workdir: str = None, repeat: int = 3) -> dict:
+    """Generate a synthetic feed of ``shipments`` entries, load it and time the reporting paths."""
+    previous_path = database.get_database_path()
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        feed_path = os.path.join(tmp, "shipments.json")
+        database_path = os.path.join(tmp, "shipments.db")
+
+        results = []
+        timed(results, "synthetic.write_feed", lambda: synthetic.write_feed(feed_path, shipments, seed))
+        results[-1]["rows"] = shipments
+        try:
+            benchmark_parallel_ingest(results, feed_path, os.path.join(tmp, "parallel.db"))
+            benchmark_ingest(results, feed_path, database_path)
+            benchmark_reporter(results, database_path, repeat)
+            benchmark_lookups(results, database_path)
+            benchmark_routes(results, database_path)
+            benchmark_snapshot(results, database_path, repeat)
+            benchmark_scenarios(results, database_path)
+        finally:
+            database.configure(path=previous_path)
+
+    return {
+        "shipments": shipments,
+        "seed": seed,
+        "commit": git_commit(),
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict):
+    """Print the time of every benchmark against a baseline run of the same size."""
+    before = {result["name"]: result["seconds"] for result in baseline["results"]}
+    print(f"{'benchmark':<45} {'before':>10} {'after':>10} {'change':>8}")
+    for result in current["results"]:
+        old = before.get(result["name"])
+        change = f"{result['seconds'] / old - 1:>+8.1%}" if old else f"{'new':>8}"
+        old_text = f"{old:>10.4f}" if old is not None else f"{'-':>10}"
+        print(f"{result['name']:<45} {old_text} {result['seconds']:>10.4f} {change}")
+
+
+def print_suite(run: dict):
+    print(f"{run['shipments']:,} shipments, seed {run['seed']}, commit {run['commit']}")
+    print(f"{'benchmark':<45} {'seconds':>10} {'rows':>10}")
+    for result in run["results"]:
+        print(f"{result['name']:<45} {result['seconds']:>10.4f} {result['rows']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the shipments project.")
+    parser.add_argument("--copies", type=int, default=10, help="repeat the database rows to get stable numbers")
+    parser.add_argument("--shipments", nargs="+", help="run the suite on synthetic feeds of these sizes (10k, 1M, 10M or a number)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic feed")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per Reporter benchmark, the best one counts")
+    parser.add_argument("--workdir", default=None, help="directory for the generated feed and database")
+    parser.add_argument("--output", help="write the suite results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    if not args.shipments:
+        print(f"{'entity':<10} {'objects':>9} {'dict B/obj':>14} {'slotted B/obj':>14} {'saving':>7}")
+        for table, result in benchmark_entity_memory(args.copies).items():
+            print(f"{table:<10} {result['objects']:>9} {result['dict_bytes_per_object']:>14.1f} "
+                  f"{result['slotted_bytes_per_object']:>14.1f} {result['saving']:>7.1%}")
+        return
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = {run["shipments"]: run for run in json.load(file)["runs"]}
+
+    runs = []
+    for size in args.shipments:
+        run = run_suite(parse_size(size), args.seed, args.workdir, args.repeat)
+        runs.append(run)
+        if run["shipments"] in baseline:
+            compare(baseline[run["shipments"]], run)
+        else:
+            print_suite(run)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"runs": runs}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import pathlib
+import sqlite3
+import threading
+import instrumentation
+
+# Default database used by the entities, the fetch helpers and the reporter
+DATABASE_PATH = "shipments.db"
+
+# Number of compiled statements each connection keeps; every query in the
+# project is a module-level constant, so it is only prepared once per connection
+CACHED_STATEMENTS = 256
+
+# Default number of rows fetched per round trip by the streaming iterators
+CHUNK_SIZE = 1000
+
+# Per-connection settings for concurrent readers: map up to 256 MiB of the
+# file, keep 64 MiB of pages per connection, and only sync on checkpoints
+PRAGMAS = {"mmap_size": 256 * 1024 * 1024, "cache_size": -64 * 1024, "synchronous": "NORMAL"}
+
+_lock = threading.Lock()
+_local = threading.local()
+_settings = {"path": DATABASE_PATH, "generation": 0}
+
+
+def configure(path: str = None):
+    """Point every entity and helper at another database.
+
+    Thread-local connections are reopened lazily on their next use.
+    """
+    with _lock:
+        if path is not None:
+            _settings["path"] = path
+        _settings["generation"] += 1
+    close()
+
+
+def get_database_path() -> str:
+    """Return the path of the configured database."""
+    return _settings["path"]
+
+
+def connect(path: str = None, **kwargs) -> sqlite3.Connection:
+    """Open a new connection to the configured database (or to ``path``)."""
+    kwargs.setdefault("cached_statements", CACHED_STATEMENTS)
+    if instrumentation.is_enabled():
+        kwargs.setdefault("factory", instrumentation.InstrumentedConnection)
+    return sqlite3.connect(path or get_database_path(), **kwargs)
+
+
+def connect_readonly(path: str = None, **kwargs) -> sqlite3.Connection:
+    """Open a connection that can only read the configured database (or ``path``)."""
+    uri = pathlib.Path(path or get_database_path()).absolute().as_uri() + "?mode=ro"
+    return connect(uri, uri=True, **kwargs)
+
+
+def enable_wal(conn: sqlite3.Connection) -> str:
+    """Switch the database to write-ahead logging, so readers no longer wait for a writer.
+
+    The journal mode is stored in the database file and applies to every
+    connection from then on. Returns the resulting mode.
+    """
+    return conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+
+
+def tune(conn: sqlite3.Connection, pragmas: dict = None) -> sqlite3.Connection:
+    """Apply per-connection pragmas (PRAGMAS by default) and return the connection."""
+    for name, value in (PRAGMAS if pragmas is None else pragmas).items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's connection to the configured database, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.generation == _settings["generation"]:
+        return conn
+
+    if conn is not None:
+        conn.close()
+    _local.conn = connect()
+    _local.generation = _settings["generation"]
+    return _local.conn
+
+
+def close():
+    """Close this thread's connection, if it has one."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def keyset_query(select: str, key: str, after=None, limit: int = None, where: str = None, params=()):
+    """Extend ``select`` to return rows ordered by ``key``, starting after the key value ``after``.
+
+    Returns the query and its parameters. ``where`` is an extra condition
+    that is combined with the keyset condition.
+    """
+    conditions = [where] if where else []
+    params = list(params)
+    if after is not None:
+        conditions.append(f"{key} > ?")
+        params.append(after)
+
+    query = select
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {key}"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return query, tuple(params)
+
+
+def iter_rows(cursor, query: str, params=(), chunk_size: int = CHUNK_SIZE):
+    """Execute a query and yield its rows, fetching ``chunk_size`` rows at a time."""
+    cursor.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
@@ -0,0 +1,51 @@
+import re
+from datetime import date as _date
+
+# Feed dates are "DD-MM-YYYY", though some feeds drop the leading zeros
+FEED_DATE = re.compile(r"(\d+)-(\d+)-(\d{4})$")
+
+
+def parse_date(value) -> _date:
+    """Parse a "DD-MM-YYYY" feed date (zero padding optional), or raise ValueError saying why it is not one."""
+    match = FEED_DATE.match(value) if isinstance(value, str) else None
+    if not match:
+        raise ValueError(f"date is not DD-MM-YYYY: {value!r}")
+    day, month, year = map(int, match.groups())
+    try:
+        return _date(year, month, day)
+    except ValueError:
+        raise ValueError(f"date does not exist: {value!r}") from None
+
+
+def iso_date(date: str) -> str:
+    """Convert a "DD-MM-YYYY" feed date (zero padding optional) to "YYYY-MM-DD", or None when it is not a date."""
+    try:
+        return parse_date(date).isoformat()
+    except ValueError:
+        return None
+
+
+def _iso_date_sql(column: str) -> str:
+    # Split at the dashes, pad the parts, and keep the result only if date arithmetic leaves it
+    # unchanged: that rolls a day past the end of its month over into the next one
+    first = f"instr({column}, '-')"
+    rest = f"substr({column}, {first} + 1)"
+    second = f"instr({rest}, '-')"
+    year = f"substr({rest}, {second} + 1)"
+    iso = f"printf('%04d-%02d-%02d', {year}, substr({rest}, 1, {second} - 1), substr({column}, 1, {first} - 1))"
+    return (f"CASE WHEN {column} NOT GLOB '*[^0-9-]*' AND {first} > 1 AND {second} > 1 AND length({year}) = 4 "
+            f"AND date({iso}, '+0 days') IS {iso} THEN {iso} END")
+
+
+# SQL equivalent of iso_date for rows that are already in the database
+ISO_DATE_SQL = _iso_date_sql("{0}")
+
+
+def row_date_sql(row: str) -> str:
+    """SQL for the ISO date of the shipment ``row`` (NEW, OLD or a table name), computed if date_iso is not set yet."""
+    # The date_iso trigger may not have run yet when the triggers of the derived tables see a row
+    return f"COALESCE({row}.date_iso, {ISO_DATE_SQL.format(row + '.date')})"
+
+# Update trigger condition on shipments that only skips date_iso being filled in for an unchanged
+# date, which the insert triggers already counted under that same date
+NOT_FILLING_IN_SQL = "OLD.date_iso IS NOT NULL OR NEW.date_iso IS NULL OR OLD.date IS NOT NEW.date"
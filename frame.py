@@ -0,0 +1,152 @@
+import numpy as np
+import database
+from shipment import SPEED_CONVERSIONS, DISTANCE_CONVERSIONS
+from vessel import EFFICIENCY_VALUES, DEFAULT_EFFICIENCY
+
+# Rows pulled from the cursor at a time while loading
+FETCH_SIZE = 50000
+
+FRAME_QUERY = """
+    SELECT shipments.id, shipments.date, shipments.date_iso, shipments.cargo_weight, shipments.distance_naut,
+           shipments.duration_hours, shipments.average_speed, shipments.origin,
+           shipments.destination, shipments.vessel, vessels.type, vessels.gross, vessels.netto
+    FROM shipments
+    JOIN vessels ON shipments.vessel = vessels.imo
+    ORDER BY shipments.rowid
+"""
+
+COLUMNS = ("id", "date", "date_iso", "cargo_weight", "distance_naut", "duration_hours", "average_speed",
+           "origin", "destination", "vessel", "vessel_type", "gross", "netto")
+
+# cargo_weight is a float column, so that a NULL weight can be NaN
+DTYPES = {
+    "cargo_weight": np.float64,
+    "distance_naut": np.float64,
+    "duration_hours": np.float64,
+    "average_speed": np.float64,
+    "vessel": np.int64,
+    "gross": np.float64,
+    "netto": np.float64,
+}
+
+
+def round_half_even(values: np.ndarray, digits: int) -> np.ndarray:
+    """Round like Python's round(), element by element.
+
+    np.round scales by 10**digits first, which can land on the wrong side
+    of a tie; the few values that close to a tie are rounded in Python.
+    """
+    rounded = np.round(values, digits)
+    scaled = values * 10.0 ** digits
+    distance_to_tie = np.abs(scaled - np.floor(scaled) - 0.5)
+    for i in np.nonzero(distance_to_tie <= np.abs(scaled) * 1e-12 + 1e-9)[0]:
+        rounded[i] = round(float(values[i]), digits)
+    return rounded
+
+
+class ShipmentFrame:
+    def __init__(self, **columns):
+        # One NumPy array per column, all of the same length
+        for name in COLUMNS:
+            values = columns[name]
+            dtype = DTYPES.get(name, object)
+            setattr(self, name, values if isinstance(values, np.ndarray) else np.array(values, dtype=dtype))
+
+    @classmethod
+    def from_database(cls, conn=None, fetch_size: int = FETCH_SIZE) -> "ShipmentFrame":
+        """Load every shipment together with its vessel's type and tonnage."""
+        cursor = (conn or database.get_connection()).cursor()
+        cursor.execute(FRAME_QUERY)
+
+        columns = {name: [] for name in COLUMNS}
+        lists = [columns[name] for name in COLUMNS]
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for target, values in zip(lists, zip(*rows)):
+                target.extend(values)
+        return cls(**columns)
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> "ShipmentFrame":
+        """Build the frame from a snapshot.Snapshot instead of the database.
+
+        Like FRAME_QUERY, only shipments whose vessel is known are kept. When
+        that is all of them, the float columns are views into the snapshot.
+        """
+        imos = snapshot.column("vessels", "imo")
+        vessels = snapshot.column("shipments", "vessel")
+        positions = np.minimum(np.searchsorted(imos, vessels), max(len(imos) - 1, 0))
+        known = imos[positions] == vessels if len(imos) else np.zeros(len(vessels), dtype=bool)
+        missing = snapshot.nulls("shipments", "vessel")
+        if missing is not None:
+            known &= ~missing
+        keep = slice(None) if known.all() else known
+        positions = positions[keep]
+
+        def numbers(table, name, rows):
+            # Integer columns keep their NULLs in a mask; as floats they become NaN
+            values = snapshot.column(table, name).astype(np.float64)
+            nulls = snapshot.nulls(table, name)
+            if nulls is not None:
+                values[nulls] = np.nan
+            return values[rows]
+
+        columns = {name: snapshot.column("shipments", name)[keep] for name in DTYPES if name not in ("cargo_weight", "gross", "netto")}
+        for name in ("id", "date", "date_iso", "origin", "destination"):
+            columns[name] = snapshot.strings("shipments", name)[keep]
+        columns["cargo_weight"] = numbers("shipments", "cargo_weight", keep)
+        columns["vessel_type"] = snapshot.strings("vessels", "type")[positions]
+        columns["gross"] = numbers("vessels", "gross", positions)
+        columns["netto"] = numbers("vessels", "netto", positions)
+        return cls(**columns)
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def convert_speed(self, to_format: str) -> np.ndarray:
+        """Vectorized Shipment.convert_speed."""
+        if to_format not in SPEED_CONVERSIONS:
+            raise ValueError("Unsupported speed format")
+        return round_half_even(self.average_speed * SPEED_CONVERSIONS[to_format], 6)
+
+    def convert_distance(self, to_format: str) -> np.ndarray:
+        """Vectorized Shipment.convert_distance."""
+        if to_format not in DISTANCE_CONVERSIONS:
+            raise ValueError("Unsupported distance format")
+        return round_half_even(self.distance_naut * DISTANCE_CONVERSIONS[to_format], 6)
+
+    def convert_duration(self, to_format: str) -> np.ndarray:
+        """Vectorized Shipment.convert_duration, as an array of strings."""
+        if to_format == "%D:%H":
+            days = (self.duration_hours // 24).astype(np.int64)
+            hours = (self.duration_hours % 24).astype(np.int64)
+            return np.array([f"{d} days : {h} hours" for d, h in zip(days.tolist(), hours.tolist())], dtype=object)
+        elif to_format == "%H":
+            return np.array([f"{h} hours" for h in self.duration_hours.astype(np.int64).tolist()], dtype=object)
+        elif to_format == "%M":
+            minutes = (self.duration_hours * 60).astype(np.int64)
+            return np.array([f"{m} minutes" for m in minutes.tolist()], dtype=object)
+        else:
+            raise ValueError("Unsupported duration format")
+
+    def efficiency(self, efficiency_values: dict = None) -> np.ndarray:
+        """Efficiency of each shipment's vessel, looked up once per distinct vessel type."""
+        efficiency_values = EFFICIENCY_VALUES if efficiency_values is None else efficiency_values
+        types, inverse = np.unique(self.vessel_type.astype(str), return_inverse=True)
+        lookup = np.array([efficiency_values.get(t, DEFAULT_EFFICIENCY) for t in types.tolist()], dtype=np.float64)
+        return lookup[inverse]
+
+    def fuel_consumption(self, efficiency_values: dict = None) -> np.ndarray:
+        """Vectorized Vessel.get_fuel_consumption over each shipment's distance."""
+        consumption = self.efficiency(efficiency_values) * (self.gross / self.netto) * self.distance_naut
+        return round_half_even(consumption, 5)
+
+    def fuel_costs(self, price_per_liter: float, efficiency_values: dict = None) -> np.ndarray:
+        """Vectorized Shipment.calculate_fuel_costs for every shipment."""
+        costs = self.duration_hours * self.fuel_consumption(efficiency_values) * price_per_liter
+        return round_half_even(costs, 3)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(shipments={len(self)})"
@@ -0,0 +1,111 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import database
+from port import Port
+from vessel import Vessel
+
+# Default number of ports and vessels kept per session
+MAXSIZE = 10000
+
+PORT_QUERY = "SELECT * FROM ports WHERE id = ?"
+VESSEL_QUERY = "SELECT * FROM vessels WHERE imo = ?"
+
+_local = threading.local()
+
+
+class IdentityMap:
+    def __init__(self, maxsize: int = MAXSIZE, cursor=None):
+        # Least recently used entries are evicted first once maxsize is reached
+        self.maxsize = maxsize
+        self.cursor = cursor
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, kind: str, key):
+        """Return the cached object for (kind, key), or None."""
+        with self._lock:
+            obj = self._entries.get((kind, key))
+            if obj is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((kind, key))
+            self.hits += 1
+            return obj
+
+    def add(self, kind: str, key, obj):
+        """Cache an object, evicting the least recently used one when full."""
+        with self._lock:
+            self._entries[(kind, key)] = obj
+            self._entries.move_to_end((kind, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return obj
+
+    def invalidate(self, kind: str = None, key=None):
+        """Drop one entry, every entry of a kind, or everything."""
+        with self._lock:
+            if kind is None:
+                self._entries.clear()
+            elif key is None:
+                for cached in [cached for cached in self._entries if cached[0] == kind]:
+                    del self._entries[cached]
+            else:
+                self._entries.pop((kind, key), None)
+
+    def _load(self, kind: str, key, query: str, cls):
+        obj = self.get(kind, key)
+        if obj is not None:
+            return obj
+
+        # A callable cursor gives each thread its own, see Reporter(concurrent=True)
+        cursor = self.cursor() if callable(self.cursor) else self.cursor or database.get_connection().cursor()
+        cursor.execute(query, (key,))
+        row = cursor.fetchone()
+        return self.add(kind, key, cls(*row)) if row else None
+
+    def get_port(self, port_id: str) -> Port:
+        """Return the Port with this id, querying SQLite only on a cache miss."""
+        return self._load("port", port_id, PORT_QUERY, Port)
+
+    def get_vessel(self, imo: int) -> Vessel:
+        """Return the Vessel with this IMO, querying SQLite only on a cache miss."""
+        return self._load("vessel", imo, VESSEL_QUERY, Vessel)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{key}={value}' for key, value in self.stats().items())})"
+
+
+def current() -> IdentityMap:
+    """Return the active session of this thread for the configured database."""
+    stack = getattr(_local, "stack", None)
+    if stack:
+        return stack[-1]
+
+    # The default session is dropped when the database is reconfigured
+    path = database.get_database_path()
+    if getattr(_local, "path", None) != path:
+        _local.default = IdentityMap()
+        _local.path = path
+    return _local.default
+
+
+@contextmanager
+def session(maxsize: int = MAXSIZE):
+    """Use a fresh identity map for the duration of a ``with`` block."""
+    identity_map = IdentityMap(maxsize)
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    _local.stack.append(identity_map)
+    try:
+        yield identity_map
+    finally:
+        _local.stack.pop()
@@ -0,0 +1,650 @@
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from collections import deque
+from collections.abc import Hashable
+from concurrent.futures import ProcessPoolExecutor
+from dates import iso_date, parse_date
+
+# Number of shipments buffered before they are flushed to the database
+BATCH_SIZE = 10000
+
+# Number of characters read from the feed at a time
+READ_SIZE = 1 << 16
+
+# Characters of feed text handed to a parse worker at a time
+CHUNK_SIZE = 1 << 22
+
+# Processes parsing and validating the feed for load_feed
+PARSE_WORKERS = os.cpu_count() or 1
+
+# End of one object of the top-level array and start of the next: a closing brace, a comma
+# and an opening brace followed by a key. Inside a string the quote would have to be escaped.
+ELEMENT_BOUNDARY = re.compile(r'\}\s*,\s*(?=\{\s*")')
+
+VESSEL_SIZE = re.compile(r"(\d+)\s*/\s*(\d+)$")
+
+# Plausible years for a vessel's build
+BUILD_YEARS = (1850, 2100)
+
+PORT_INSERT = """
+    INSERT OR IGNORE INTO ports (id, code, name, city, province, country)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+VESSEL_INSERT = """
+    INSERT OR IGNORE INTO vessels (imo, mmsi, name, country, type, build, gross, netto, length, beam)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SHIPMENT_INSERT = """
+    INSERT INTO shipments (id, date, cargo_weight, distance_naut, duration_hours, average_speed, origin, destination, vessel, date_iso)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Delta loads update reference data in place and skip tracking numbers that are already loaded
+PORT_UPSERT = """
+    INSERT INTO ports (id, code, name, city, province, country)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        code = excluded.code, name = excluded.name, city = excluded.city,
+        province = excluded.province, country = excluded.country
+    WHERE ports.code IS NOT excluded.code OR ports.name IS NOT excluded.name
+        OR ports.city IS NOT excluded.city OR ports.province IS NOT excluded.province
+        OR ports.country IS NOT excluded.country
+"""
+
+VESSEL_UPSERT = """
+    INSERT INTO vessels (imo, mmsi, name, country, type, build, gross, netto, length, beam)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (imo) DO UPDATE SET
+        mmsi = excluded.mmsi, name = excluded.name, country = excluded.country, type = excluded.type,
+        build = excluded.build, gross = excluded.gross, netto = excluded.netto,
+        length = excluded.length, beam = excluded.beam
+    WHERE vessels.mmsi IS NOT excluded.mmsi OR vessels.name IS NOT excluded.name
+        OR vessels.country IS NOT excluded.country OR vessels.type IS NOT excluded.type
+        OR vessels.build IS NOT excluded.build OR vessels.gross IS NOT excluded.gross
+        OR vessels.netto IS NOT excluded.netto OR vessels.length IS NOT excluded.length
+        OR vessels.beam IS NOT excluded.beam
+"""
+
+SHIPMENT_INSERT_NEW = SHIPMENT_INSERT.replace("INSERT INTO", "INSERT OR IGNORE INTO")
+
+MANIFEST_LOOKUP = """
+    SELECT checksum FROM load_manifest WHERE path = ? AND size = ? AND mtime = ?
+"""
+
+MANIFEST_INSERT = """
+    INSERT OR REPLACE INTO load_manifest (checksum, path, size, mtime, shipments, loaded_at)
+    VALUES (?, ?, ?, ?, ?, datetime('now'))
+"""
+
+
+class LoadStats:
+    def __init__(self):
+        self.shipments = 0
+        self.ports = 0
+        self.vessels = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self.skipped_files = 0
+        self.rejected = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        # Throughput in shipments per second, 0 when nothing was timed
+        return self.shipments / self.seconds if self.seconds else 0.0
+
+    def __repr__(self) -> str:
+        attributes = ", ".join(f"{key}={value!s}" for key, value in self.__dict__.items())
+        return f"{type(self).__name__}({attributes})"
+
+
+def iter_json_array(file, read_size: int = READ_SIZE):
+    """Yield the elements of a top-level JSON array one at a time.
+
+    Only a window of roughly ``read_size`` characters is held in memory,
+    so the size of the feed does not matter.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    started = False
+
+    def fill():
+        # Drop the consumed prefix and append the next chunk of the file
+        nonlocal buffer, pos, eof
+        chunk = file.read(read_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    while True:
+        # Skip whitespace and separators between elements
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            fill()
+
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of JSON input")
+
+        char = buffer[pos]
+        if not started:
+            if char != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if char == "]":
+            return
+        if char == ",":
+            pos += 1
+            continue
+
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+
+        # A value touching the end of the buffer may have been cut short
+        if end == len(buffer) and not eof:
+            fill()
+            continue
+
+        pos = end
+        yield element
+
+
+def port_row(port: dict) -> tuple:
+    return (port["id"], port["code"], port["name"], port["city"], port["province"], port["country"])
+
+
+def vessel_row(vessel: dict) -> tuple:
+    length, beam = map(int, vessel["size"].split(" / "))
+    return (vessel["imo"], vessel["mmsi"], vessel["name"], vessel["country"], vessel["type"],
+            vessel["build"], vessel["gross"], vessel["netto"], length, beam)
+
+
+def shipment_row(entry: dict) -> tuple:
+    return (entry["tracking_number"], entry["date"], entry["cargo_weight"], entry["distance_naut"],
+            entry["duration_hours"], entry["average_speed"], entry["origin"]["id"],
+            entry["destination"]["id"], entry["vessel"]["imo"], iso_date(entry["date"]))
+
+
+def write_batch(cursor, ports: list, vessels: list, shipments: list, delta: bool = False) -> int:
+    """Write one batch of rows inside a single explicit transaction.
+
+    Inside a transaction the caller already has open, the batch goes into a
+    savepoint instead, so a failure undoes only the batch and the caller
+    decides when to commit. Returns the number of shipments that were
+    actually inserted.
+    """
+    conn = cursor.connection
+    nested = conn.in_transaction
+    cursor.execute("SAVEPOINT write_batch" if nested else "BEGIN")
+    try:
+        cursor.executemany(PORT_UPSERT if delta else PORT_INSERT, ports)
+        cursor.executemany(VESSEL_UPSERT if delta else VESSEL_INSERT, vessels)
+        cursor.executemany(SHIPMENT_INSERT_NEW if delta else SHIPMENT_INSERT, shipments)
+        inserted = cursor.rowcount if shipments else 0
+    except Exception:
+        if nested:
+            cursor.execute("ROLLBACK TO write_batch")
+            cursor.execute("RELEASE write_batch")
+        else:
+            conn.rollback()
+        raise
+    if nested:
+        cursor.execute("RELEASE write_batch")
+    else:
+        conn.commit()
+    return inserted
+
+
+def load_shipments(cursor, entries, batch_size: int = BATCH_SIZE, delta: bool = False) -> LoadStats:
+    """Insert an iterable of shipments.json entries in bounded batches.
+
+    Ports and vessels are deduplicated in memory. A full load only sends
+    each one to SQLite the first time it is seen; a delta load also sends
+    it again whenever its attributes change, and skips shipments whose
+    tracking number is already in the database.
+    """
+    stats = LoadStats()
+    known_ports = {}
+    known_vessels = {}
+    ports, vessels, shipments = [], [], []
+    started = time.perf_counter()
+
+    def flush():
+        stats.shipments += write_batch(cursor, ports, vessels, shipments, delta)
+        stats.ports += len(ports)
+        stats.vessels += len(vessels)
+        stats.batches += 1
+        ports.clear()
+        vessels.clear()
+        shipments.clear()
+
+    for entry in entries:
+        for port in (entry["origin"], entry["destination"]):
+            known = known_ports.get(port["id"])
+            if known is None or (delta and known != port_row(port)):
+                known_ports[port["id"]] = row = port_row(port)
+                ports.append(row)
+
+        vessel = entry["vessel"]
+        known = known_vessels.get(vessel["imo"])
+        if known is None or (delta and known != vessel_row(vessel)):
+            known_vessels[vessel["imo"]] = row = vessel_row(vessel)
+            vessels.append(row)
+
+        shipments.append(shipment_row(entry))
+        if len(shipments) >= batch_size:
+            flush()
+
+    if shipments or ports or vessels:
+        flush()
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def load_rows(cursor, groups, batch_size: int = BATCH_SIZE, delta: bool = False, keep=None) -> LoadStats:
+    """Insert an iterable of (ports, vessels, shipments) row lists in bounded batches, like load_shipments.
+
+    ``keep``, when given, is called with the shipments of every batch just
+    before it is written and returns the ones to write.
+    """
+    stats = LoadStats()
+    known_ports = {}
+    known_vessels = {}
+    ports, vessels, shipments = [], [], []
+    started = time.perf_counter()
+
+    def flush():
+        if keep is not None:
+            shipments[:] = keep(shipments)
+        stats.shipments += write_batch(cursor, ports, vessels, shipments, delta)
+        stats.ports += len(ports)
+        stats.vessels += len(vessels)
+        stats.batches += 1
+        ports.clear()
+        vessels.clear()
+        shipments.clear()
+
+    for port_rows, vessel_rows, shipment_rows in groups:
+        for known_rows, rows, pending in ((known_ports, port_rows, ports), (known_vessels, vessel_rows, vessels)):
+            for row in rows:
+                known = known_rows.get(row[0])
+                if known is None or (delta and known != row):
+                    known_rows[row[0]] = row
+                    pending.append(row)
+
+        shipments.extend(shipment_rows)
+        if len(shipments) >= batch_size:
+            flush()
+
+    if shipments or ports or vessels:
+        flush()
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def iter_feed_chunks(file, chunk_size: int = CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array of objects as text, about ``chunk_size`` characters at a time.
+
+    Nothing is decoded: chunks are cut at ELEMENT_BOUNDARY, so each one is a
+    comma-separated run of whole elements that a worker can decode on its own.
+    """
+    buffer = file.read(chunk_size).lstrip("\ufeff \t\r\n")
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    buffer = buffer[1:]
+
+    while True:
+        data = file.read(chunk_size)
+        if not data:
+            break
+        buffer += data
+        # Only the text just read can hold a boundary after the last cut
+        last = None
+        for last in ELEMENT_BOUNDARY.finditer(buffer, max(0, len(buffer) - len(data) - 1)):
+            pass
+        if last is not None:
+            yield buffer[:last.start() + 1]
+            buffer = buffer[last.end():]
+
+    buffer = buffer.rstrip()
+    if not buffer.endswith("]"):
+        raise ValueError("Unexpected end of JSON input")
+    if buffer[:-1].strip():
+        yield buffer[:-1]
+
+
+def _decode_chunk(text: str) -> list:
+    """Return (element, error) per element of a chunk; a malformed element is returned as its text with the error."""
+    try:
+        return [(element, None) for element in json.loads(f"[{text}]")]
+    except json.JSONDecodeError:
+        pass
+
+    # Decode element by element and skip a malformed one up to the next boundary
+    decoder = json.JSONDecoder()
+    elements = []
+    pos = 0
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text):
+            return elements
+        try:
+            element, pos = decoder.raw_decode(text, pos)
+            elements.append((element, None))
+        except json.JSONDecodeError as error:
+            boundary = ELEMENT_BOUNDARY.search(text, pos)
+            end = boundary.end() if boundary else len(text)
+            elements.append((text[pos:end].rstrip(" \t\r\n,"), f"malformed JSON: {error.msg}"))
+            pos = end
+
+
+def _field(record: dict, name: str, kind: str):
+    if not isinstance(record, dict):
+        raise ValueError(f"{kind} is not an object")
+    if name not in record:
+        raise ValueError(f"{kind} has no {name}")
+    return record[name]
+
+
+def _number(value, name: str, integer: bool = False, optional: bool = False, minimum: float = 0):
+    """Return ``value`` as a finite number of at least ``minimum`` (any, for None); numeric strings are converted."""
+    if value is None and optional:
+        return None
+    if isinstance(value, str):
+        try:
+            value = float(value) if not integer or "." in value or "e" in value.lower() else int(value)
+        except ValueError:
+            raise ValueError(f"{name} is not a number: {value!r}") from None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{name} is not a number: {value!r}")
+    if not math.isfinite(value) or (minimum is not None and value < minimum):
+        raise ValueError(f"{name} is out of range: {value!r}")
+    if integer:
+        if value != int(value):
+            raise ValueError(f"{name} is not a whole number: {value!r}")
+        value = int(value)
+    return value
+
+
+def _text(value, name: str, optional: bool = True):
+    if value is None and optional:
+        return None
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{name} is not a non-empty string: {value!r}")
+    return value.strip()
+
+
+def validate_port(port: dict, kind: str) -> tuple:
+    """Return the row of a port, normalized, or raise ValueError naming the first problem."""
+    return (_text(_field(port, "id", kind), f"{kind} id", optional=False),
+            _number(port.get("code"), f"{kind} code", integer=True, optional=True),
+            _text(port.get("name"), f"{kind} name"), _text(port.get("city"), f"{kind} city"),
+            _text(port.get("province"), f"{kind} province"), _text(port.get("country"), f"{kind} country"))
+
+
+def validate_vessel(vessel: dict) -> tuple:
+    """Return the row of a vessel, normalized, or raise ValueError naming the first problem."""
+    imo = _number(_field(vessel, "imo", "vessel"), "vessel imo", integer=True, minimum=1)
+    size = _field(vessel, "size", "vessel")
+    match = VESSEL_SIZE.match(size.strip()) if isinstance(size, str) else None
+    if not match:
+        raise ValueError(f"vessel size is not LENGTH / BEAM: {size!r}")
+    build = _number(vessel.get("build"), "vessel build", integer=True, optional=True, minimum=BUILD_YEARS[0])
+    if build is not None and build > BUILD_YEARS[1]:
+        raise ValueError(f"vessel build is out of range: {build!r}")
+    return (imo, _number(vessel.get("mmsi"), "vessel mmsi", integer=True, optional=True),
+            _text(vessel.get("name"), "vessel name"), _text(vessel.get("country"), "vessel country"),
+            _text(vessel.get("type"), "vessel type"), build,
+            _number(vessel.get("gross"), "vessel gross", integer=True, optional=True),
+            _number(vessel.get("netto"), "vessel netto", integer=True, optional=True),
+            int(match.group(1)), int(match.group(2)))
+
+
+def _validate_cached(seen: dict, validate, record, key: str, *args) -> tuple:
+    # Ports and vessels repeat across entries; an exact copy of one validated before is not checked again.
+    # A key that cannot be hashed is not a valid id, so the record goes straight to validate to be rejected
+    if not isinstance(record, dict) or not isinstance(record.get(key), Hashable):
+        return validate(record, *args)
+    cached = seen.get((validate, record.get(key)))
+    if cached is not None and cached[0] == record:
+        return cached[1]
+    row = validate(record, *args)
+    seen[validate, record.get(key)] = (record, row)
+    return row
+
+
+def validate_entry(entry: dict, seen: dict = None) -> tuple:
+    """Return the (ports, vessels, shipments) rows of a feed entry, normalized, or raise ValueError with the reason.
+
+    Checks that every field the tables need is there and of the right kind,
+    that dates exist, that weights, distances and durations are not negative,
+    and that the origin, destination and vessel the shipment refers to are
+    complete records. ``seen`` caches the ports and vessels already validated.
+    """
+    seen = {} if seen is None else seen
+    origin = _validate_cached(seen, validate_port, _field(entry, "origin", "entry"), "id", "origin")
+    destination = _validate_cached(seen, validate_port, _field(entry, "destination", "entry"), "id", "destination")
+    vessel = _validate_cached(seen, validate_vessel, _field(entry, "vessel", "entry"), "imo")
+    # Stored zero-padded, whatever padding the feed used
+    value = _field(entry, "date", "entry")
+    day = parse_date(value.strip() if isinstance(value, str) else value)
+    shipment = (_text(_field(entry, "tracking_number", "entry"), "tracking_number", optional=False),
+                f"{day.day:02d}-{day.month:02d}-{day.year:04d}",
+                _number(_field(entry, "cargo_weight", "entry"), "cargo_weight", integer=True),
+                _number(_field(entry, "distance_naut", "entry"), "distance_naut"),
+                _number(_field(entry, "duration_hours", "entry"), "duration_hours"),
+                _number(_field(entry, "average_speed", "entry"), "average_speed", minimum=None),
+                origin[0], destination[0], vessel[0], day.isoformat())
+    return (origin, destination), (vessel,), (shipment,)
+
+
+def parse_chunk(text: str, delta: bool = False) -> tuple:
+    """Decode and validate one chunk from iter_feed_chunks; runs in a parse worker.
+
+    Returns (elements, ports, vessels, shipments, positions, rejects). Ports
+    and vessels are deduplicated within the chunk the way load_rows does
+    across chunks, positions holds the index in the chunk of every shipment,
+    and rejects are (index in the chunk, reason, entry) tuples.
+    """
+    ports, vessels, shipments, positions, rejects = {}, {}, [], [], []
+    seen = {}
+    elements = _decode_chunk(text)
+    for index, (entry, error) in enumerate(elements):
+        if error is None:
+            try:
+                port_rows, vessel_rows, shipment_rows = validate_entry(entry, seen)
+            except ValueError as invalid:
+                error = str(invalid)
+        if error is not None:
+            rejects.append((index, error, entry))
+            continue
+
+        for known, rows in ((ports, port_rows), (vessels, vessel_rows)):
+            for row in rows:
+                if delta or row[0] not in known:
+                    known[row[0]] = row
+        shipments.extend(shipment_rows)
+        positions.extend([index] * len(shipment_rows))
+    return len(elements), list(ports.values()), list(vessels.values()), shipments, positions, rejects
+
+
+def parse_feed(file, workers: int = PARSE_WORKERS, chunk_size: int = CHUNK_SIZE, delta: bool = False):
+    """Yield the parse_chunk results of a feed in order, parsed across ``workers`` processes.
+
+    At most two chunks per worker are in flight, so memory use does not grow with the feed.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for text in iter_feed_chunks(file, chunk_size):
+            pending.append(executor.submit(parse_chunk, text, delta))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class RejectLog:
+    def __init__(self, path: str = None):
+        # One JSON line per rejected entry: its feed file, index in the feed, reason and content;
+        # without a path rejects are only counted. The file is created on the first reject.
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def write(self, feed_path: str, index: int, reason: str, entry):
+        self.count += 1
+        if self.path is None:
+            return
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps({"file": feed_path, "index": index, "reason": reason, "entry": entry}) + "\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(path={self.path}, count={self.count})"
+
+
+def load_feed(cursor, path: str, workers: int = PARSE_WORKERS, batch_size: int = BATCH_SIZE, delta: bool = False,
+              rejects: RejectLog = None, chunk_size: int = CHUNK_SIZE) -> LoadStats:
+    """Load a feed file with parsing and validation spread over a process pool.
+
+    This process stays the only writer and only sees clean rows; entries that
+    do not decode or validate go to ``rejects`` with the reason instead of
+    aborting the load. So does a tracking number seen before in the feed:
+    the first one is kept and a repeat is logged with its tracking number.
+    """
+    rejects = rejects or RejectLog()
+    rejected_before = rejects.count
+    # Shipments this feed writes get rowids past the ones already loaded
+    loaded_before = cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM shipments").fetchone()[0]
+    # Index in the feed of every shipment handed on and not written yet, in order
+    pending = deque()
+
+    def groups(file):
+        first = 0
+        for elements, ports, vessels, shipments, positions, chunk_rejects in parse_feed(file, workers, chunk_size, delta):
+            for index, reason, entry in chunk_rejects:
+                rejects.write(path, first + index, reason, entry)
+            pending.extend(first + position for position in positions)
+            first += elements
+            yield ports, vessels, shipments
+
+    def keep(batch):
+        # Repeats of earlier batches are found through the primary key, so memory stays bounded by the batch
+        cursor.execute("SELECT id FROM shipments WHERE rowid > ? AND id IN (SELECT value FROM json_each(?))",
+                       (loaded_before, json.dumps([row[0] for row in batch])))
+        seen = {tracking_number for tracking_number, in cursor}
+        unique = []
+        for row in batch:
+            index = pending.popleft()
+            if row[0] in seen:
+                rejects.write(path, index, "duplicate tracking number", {"tracking_number": row[0]})
+            else:
+                seen.add(row[0])
+                unique.append(row)
+        return unique
+
+    with open(path, "r", encoding="utf-8") as file:
+        stats = load_rows(cursor, groups(file), batch_size, delta, keep)
+    stats.rejected = rejects.count - rejected_before
+    return stats
+
+
+def file_checksum(path: str) -> str:
+    """Return the SHA-256 of a file, read in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def feed_files(path: str) -> list:
+    """Return the JSON feed files at ``path``, which may be a file or a directory."""
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json"))
+    return [path]
+
+
+def is_loaded(cursor, path: str):
+    """Return the checksum of ``path`` and whether the manifest already lists it.
+
+    Files whose path, size and modification time match a manifest entry are
+    skipped without being read; anything else is hashed and looked up by checksum.
+    """
+    info = os.stat(path)
+    cursor.execute(MANIFEST_LOOKUP, (os.path.abspath(path), info.st_size, info.st_mtime))
+    row = cursor.fetchone()
+    if row:
+        return row[0], True
+
+    checksum = file_checksum(path)
+    cursor.execute("SELECT 1 FROM load_manifest WHERE checksum = ?", (checksum,))
+    return checksum, cursor.fetchone() is not None
+
+
+def record_loaded(cursor, path: str, checksum: str, shipments: int):
+    """Add a loaded file to the manifest."""
+    info = os.stat(path)
+    cursor.execute(MANIFEST_INSERT, (checksum, os.path.abspath(path), info.st_size, info.st_mtime, shipments))
+    cursor.connection.commit()
+
+
+def load_delta(cursor, path: str, batch_size: int = BATCH_SIZE, workers: int = 0, rejects_path: str = None) -> LoadStats:
+    """Load every feed file at ``path`` that is not yet in the manifest.
+
+    Only unseen tracking numbers are inserted and changed ports and vessels
+    are updated in place, so reloading the same data is a no-op. With
+    ``workers`` the files go through load_feed, invalid entries are appended
+    to ``rejects_path`` and a file counts as loaded despite them; without,
+    the first invalid entry aborts the load.
+    """
+    total = LoadStats()
+    rejects = RejectLog(rejects_path)
+    try:
+        for file_path in feed_files(path):
+            checksum, loaded = is_loaded(cursor, file_path)
+            if loaded:
+                total.skipped_files += 1
+                continue
+
+            if workers:
+                stats = load_feed(cursor, file_path, workers, batch_size, delta=True, rejects=rejects)
+            else:
+                with open(file_path, "r") as file:
+                    stats = load_shipments(cursor, iter_json_array(file), batch_size, delta=True)
+            record_loaded(cursor, file_path, checksum, stats.shipments)
+
+            total.shipments += stats.shipments
+            total.ports += stats.ports
+            total.vessels += stats.vessels
+            total.batches += stats.batches
+            total.seconds += stats.seconds
+            total.rejected += stats.rejected
+    finally:
+        rejects.close()
+    return total
@@ -0,0 +1,264 @@
+import bisect
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+# Upper bounds of the latency histogram buckets, in milliseconds; the last bucket is open
+BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+# Executions at least this slow end up in the slow-query log
+SLOW_QUERY_SECONDS = 0.1
+
+# Number of slow executions kept
+SLOW_LOG_SIZE = 100
+
+# Setting this environment variable to a threshold in seconds turns instrumentation on at import
+ENVIRONMENT_VARIABLE = "SHIPMENTS_QUERY_STATS"
+
+_lock = threading.Lock()
+_settings = {"enabled": False, "slow_query_seconds": SLOW_QUERY_SECONDS}
+_queries = {}
+_slow = deque(maxlen=SLOW_LOG_SIZE)
+_dumper = None
+
+
+def normalize(sql: str) -> str:
+    """Collapse whitespace and variable-length placeholder lists so equivalent queries share one entry."""
+    sql = " ".join(sql.split())
+    return re.sub(r"\?(?:\s*,\s*\?)+", "?, ...", sql)
+
+
+class QueryStats:
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.count = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+
+    def record(self, seconds: float, rows: int):
+        self.count += 1
+        self.rows += rows
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.histogram[bisect.bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+
+    def as_dict(self) -> dict:
+        return {"sql": self.sql, "count": self.count, "rows": self.rows, "seconds": self.seconds,
+                "mean_seconds": self.seconds / self.count if self.count else 0.0, "max_seconds": self.max_seconds,
+                "histogram": dict(zip([f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"], self.histogram))}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(count={self.count}, rows={self.rows}, seconds={self.seconds:.6f}, sql={self.sql})"
+
+
+def record(sql: str, seconds: float, rows: int, params=None):
+    """Count one finished execution of ``sql``."""
+    key = normalize(sql)
+    with _lock:
+        stats = _queries.get(key)
+        if stats is None:
+            stats = _queries[key] = QueryStats(key)
+        stats.record(seconds, rows)
+        if seconds >= _settings["slow_query_seconds"]:
+            _slow.append({"sql": key, "params": repr(params) if params is not None else None,
+                          "seconds": seconds, "rows": rows, "at": time.time()})
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # Times each execution from execute() until its last row is fetched
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sql = None
+
+    def _start(self, sql: str, params):
+        self._finish()
+        self._sql, self._params, self._rows, self._elapsed = sql, params, 0, 0.0
+
+    def _finish(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            record(sql, self._elapsed, self._rows, self._params)
+
+    def _timed(self, function, *args):
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            if self._sql is not None:
+                self._elapsed += time.perf_counter() - started
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        try:
+            return self._timed(super().execute, sql, parameters)
+        except Exception:
+            self._finish()
+            raise
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, None)
+        try:
+            return self._timed(super().executemany, sql, seq_of_parameters)
+        finally:
+            self._finish()
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        elif self._sql is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._timed(super().fetchmany, size)
+        if self._sql is not None:
+            self._rows += len(rows)
+            if len(rows) < size:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self._sql is not None:
+            self._rows += len(rows)
+            self._finish()
+        return rows
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Every cursor is instrumented; trigger programs are counted through the trace callback
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Held in a list rather than on the connection, so the callback does not keep it alive
+        callbacks = self._trace_callbacks = [None]
+
+        def trace(statement: str):
+            _trace(statement)
+            if callbacks[0] is not None:
+                callbacks[0](statement)
+        super().set_trace_callback(trace)
+
+    def set_trace_callback(self, trace_callback):
+        """Install a trace callback of the caller's own; it runs after the one counting trigger programs."""
+        self._trace_callbacks[0] = trace_callback
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _trace(statement: str):
+    # Statements run by triggers show up as "-- TRIGGER name"; they have no timing of their own
+    if statement.startswith("-- TRIGGER"):
+        record(statement, 0.0, 0)
+
+
+def enable(slow_query_seconds: float = None):
+    """Instrument every connection that database.connect opens from now on."""
+    with _lock:
+        _settings["enabled"] = True
+        if slow_query_seconds is not None:
+            _settings["slow_query_seconds"] = slow_query_seconds
+
+
+def disable():
+    """Stop instrumenting new connections; connections that are already open keep reporting."""
+    with _lock:
+        _settings["enabled"] = False
+
+
+def is_enabled() -> bool:
+    return _settings["enabled"]
+
+
+def reset():
+    """Forget every recorded query and slow execution."""
+    with _lock:
+        _queries.clear()
+        _slow.clear()
+
+
+def snapshot(top: int = None) -> dict:
+    """Return the recorded queries, most total time first, and the slow-query log."""
+    with _lock:
+        queries = sorted((stats.as_dict() for stats in _queries.values()), key=lambda stats: stats["seconds"], reverse=True)
+        slow = list(_slow)
+    return {"taken": time.time(), "slow_query_seconds": _settings["slow_query_seconds"],
+            "queries": queries[:top] if top else queries, "slow": slow}
+
+
+def report(top: int = 20, file=None):
+    """Print the queries that took the most total time."""
+    file = file or sys.stdout
+    print(f"{'count':>8} {'rows':>10} {'total s':>10} {'mean ms':>9} {'max ms':>9}  sql", file=file)
+    for stats in snapshot(top)["queries"]:
+        print(f"{stats['count']:>8} {stats['rows']:>10} {stats['seconds']:>10.4f} {stats['mean_seconds'] * 1000:>9.3f} "
+              f"{stats['max_seconds'] * 1000:>9.3f}  {stats['sql'][:100]}", file=file)
+
+
+class _Dumper(threading.Thread):
+    def __init__(self, path: str, interval: float):
+        super().__init__(name="query-stats-dump", daemon=True)
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def dump(self):
+        # Written next to the target and moved into place, so readers never see half a file
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(snapshot(), file, indent=2)
+        os.replace(temporary, self.path)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.dump()
+
+
+def start_dump(path: str, interval: float = 60.0):
+    """Write a snapshot to ``path`` as JSON every ``interval`` seconds until stop_dump is called."""
+    global _dumper
+    stop_dump()
+    _dumper = _Dumper(path, interval)
+    _dumper.start()
+
+
+def stop_dump():
+    """Stop the periodic dump, writing one last snapshot."""
+    global _dumper
+    dumper, _dumper = _dumper, None
+    if dumper is not None:
+        dumper.stopped.set()
+        dumper.join()
+        dumper.dump()
+
+
+if os.environ.get(ENVIRONMENT_VARIABLE):
+    enable(float(os.environ[ENVIRONMENT_VARIABLE]))
@@ -1,8 +1,13 @@
-import sqlite3
+import database
 
-database_path = 'shipments.db'
+SHIPMENTS_QUERY = """
+    SELECT id FROM shipments WHERE origin = ? OR destination = ?
+"""
 
 class Port:
+    # Slotted, so that bulk fetches do not pay for a __dict__ per port
+    __slots__ = ("id", "code", "name", "city", "province", "country")
+
     def __init__(self, id: str, code: int, name: str, city: str, province: str, country: str):
         # Initialize the attributes of the port
         self.id = id
@@ -13,19 +18,14 @@ class Port:
         self.country = country
 
     def get_shipments(self) -> tuple:
-        # Connect to the database
-        conn = sqlite3.connect(database_path)
-        cursor = conn.cursor()
+        # Use the shared connection for this thread
+        cursor = database.get_connection().cursor()
 
         # Execute a SQL query to find shipments where this port is the origin or destination
-        query = """
-            SELECT id FROM shipments WHERE origin = ? OR destination = ?
-        """
-        cursor.execute(query, (self.id, self.id))
+        cursor.execute(SHIPMENTS_QUERY, (self.id, self.id))
         
-        # Fetch all results and close the database connection
+        # Fetch all results
         shipments = cursor.fetchall()
-        conn.close()
 
         # Convert the results to a tuple of shipment IDs
         shipment_ids = tuple(shipment[0] for shipment in shipments)
@@ -33,5 +33,5 @@ class Port:
     
     def __repr__(self) -> str:
         # Return a string representation of the Port object for readable output
-        attributes = ", ".join([f"{key}={value!s}" for key, value in self.__dict__.items()])
-        return f"{type(self).__name__}({attributes})"
\ No newline at end of file
+        attributes = ", ".join([f"{key}={getattr(self, key)!s}" for key in self.__slots__])
+        return f"{type(self).__name__}({attributes})"
@@ -0,0 +1,212 @@
+import argparse
+import csv
+import inspect
+import io
+import itertools
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import database
+import schema
+from port import Port
+from shipmentreporter import Reporter, safe_filename
+
+# Reports in the daily bundle that take no arguments
+SUMMARY_REPORTS = [
+    "total_amount_of_vessels",
+    "longest_shipment",
+    "longest_and_shortest_vessels",
+    "widest_and_smallest_vessels",
+    "vessels_with_the_most_shipments",
+    "ports_with_most_shipments",
+    "ports_with_first_shipment",
+    "ports_with_latest_shipment",
+]
+
+# Reporter of the current worker process
+_reporter = None
+
+
+class JobResult:
+    def __init__(self, name: str, output: str, rows: int, seconds: float, error: str = None):
+        self.name = name
+        self.output = output
+        self.rows = rows
+        self.seconds = seconds
+        self.error = error
+
+    def __repr__(self) -> str:
+        attributes = ", ".join(f"{key}={value!s}" for key, value in self.__dict__.items())
+        return f"{type(self).__name__}({attributes})"
+
+
+def daily_jobs(database_path: str = None) -> list:
+    """Build the daily bundle: every summary report plus the CSV exports per country and per port.
+
+    A job is a dict with the output ``name``, the Reporter ``method``, its
+    ``args`` and ``kwargs`` as plain JSON values, and ``export`` for the
+    methods that stream a CSV file.
+    """
+    conn = database.connect_readonly(database_path)
+    try:
+        port_countries = [row[0] for row in conn.execute("SELECT DISTINCT country FROM ports WHERE country IS NOT NULL ORDER BY country")]
+        vessel_countries = [row[0] for row in conn.execute("SELECT DISTINCT country FROM vessels WHERE country IS NOT NULL ORDER BY country")]
+        ports = [row[0] for row in conn.execute("SELECT origin FROM shipments UNION SELECT destination FROM shipments ORDER BY 1")]
+        first, last = conn.execute("SELECT MIN(date_iso), MAX(date_iso) FROM shipments").fetchone()
+    finally:
+        conn.close()
+
+    jobs = [{"name": method, "method": method} for method in SUMMARY_REPORTS]
+    jobs += [{"name": f"ports_in_country_{country}", "method": "ports_in_country", "args": [country], "export": True}
+             for country in port_countries]
+    jobs += [{"name": f"vessels_from_country_{country}", "method": "vessels_from_country", "args": [country], "export": True}
+             for country in vessel_countries]
+    jobs += [{"name": f"vessels_docking_{port}", "method": "vessels_that_docked_port_between", "args": [port, first, last], "export": True}
+             for port in ports if port]
+    return jobs
+
+
+def load_jobs(path: str) -> list:
+    """Read a list of jobs (see daily_jobs) from a JSON file."""
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def resolve_arguments(reporter: Reporter, method, args: list, kwargs: dict):
+    """Turn the JSON values of a job into the Port and date arguments the method is annotated with."""
+    signature = inspect.signature(method)
+    bound = signature.bind(*args, **kwargs)
+    for name, value in bound.arguments.items():
+        annotation = signature.parameters[name].annotation
+        if annotation is Port and isinstance(value, str):
+            row = reporter.fetch_port_by_id(value)
+            if row is None:
+                raise ValueError(f"Port {value} does not exist")
+            bound.arguments[name] = Port(*row)
+        elif annotation is date and isinstance(value, str):
+            bound.arguments[name] = date.fromisoformat(value)
+    return bound.args, bound.kwargs
+
+
+def result_rows(result) -> "tuple[list, list]":
+    """Return the CSV header and rows for the result of a report."""
+    items = result if isinstance(result, tuple) else (result,)
+    items = [item for item in items if item is not None]
+    if not items:
+        return ["value"], []
+    if not hasattr(items[0], "__dict__") and not hasattr(items[0], "__slots__"):
+        return ["value"], [[item] for item in items]
+
+    fields = list(getattr(items[0], "__slots__", None) or vars(items[0]))
+    return fields, [[getattr(item, field) for field in fields] for item in items]
+
+
+def write_atomically(path: str, write):
+    """Call ``write`` with a binary file that replaces ``path`` only once it is complete."""
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temporary = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as file:
+            result = write(file)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return result
+
+
+def _init_worker(database_path: str):
+    global _reporter
+    _reporter = Reporter(database_path, read_only=True)
+
+
+def run_job(job: dict, output_dir: str, compress: bool = False) -> JobResult:
+    """Run one job on this process's reporter and write its CSV output."""
+    started = time.perf_counter()
+    export = job.get("export", False)
+    target = os.path.join(output_dir, safe_filename(job["name"], compress=compress and export))
+    try:
+        method = getattr(_reporter, job["method"])
+        args, kwargs = resolve_arguments(_reporter, method, job.get("args", []), job.get("kwargs", {}))
+
+        if export:
+            write_atomically(target, lambda file: method(*args, to_csv=True, output=file, compress=compress, **kwargs))
+            rows = _reporter.last_export.rows
+        else:
+            fields, data = result_rows(method(*args, **kwargs))
+
+            def write(file):
+                text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+                writer = csv.writer(text)
+                writer.writerow(fields)
+                writer.writerows(data)
+                text.flush()
+                text.detach()
+
+            write_atomically(target, write)
+            rows = len(data)
+        return JobResult(job["name"], target, rows, time.perf_counter() - started)
+    except Exception as error:
+        return JobResult(job["name"], None, 0, time.perf_counter() - started, f"{type(error).__name__}: {error}")
+
+
+def run_jobs(jobs: list, output_dir: str, database_path: str = None, workers: int = None, compress: bool = False) -> list:
+    """Run jobs across a pool of processes, each reading through its own read-only reporter.
+
+    The database has to be migrated already, see prepare. Returns the
+    JobResult of every job in the order of ``jobs``; a failing job is
+    reported in its result instead of stopping the batch.
+    """
+    database_path = database_path or database.get_database_path()
+    os.makedirs(output_dir, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    # Most jobs take milliseconds, so they are handed out in chunks to keep the pool busy
+    chunk_size = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(database_path,)) as executor:
+        return list(executor.map(run_job, jobs, itertools.repeat(output_dir), itertools.repeat(compress), chunksize=chunk_size))
+
+
+def prepare(database_path: str = None):
+    """Migrate the database once up front, as daily_jobs and the read-only workers cannot."""
+    conn = database.connect(database_path)
+    try:
+        schema.migrate(conn)
+    finally:
+        conn.close()
+
+
+def print_summary(results: list, seconds: float):
+    """Print the timing of every job, slowest first, and the totals."""
+    print(f"{'job':<50} {'rows':>8} {'seconds':>9}")
+    for result in sorted(results, key=lambda result: result.seconds, reverse=True):
+        status = f"  FAILED {result.error}" if result.error else ""
+        print(f"{result.name[:50]:<50} {result.rows:>8} {result.seconds:>9.3f}{status}")
+
+    busy = sum(result.seconds for result in results)
+    failed = sum(1 for result in results if result.error)
+    print(f"{len(results)} jobs, {failed} failed, {busy:.2f}s of work in {seconds:.2f}s wall time ({busy / seconds if seconds else 0:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a batch of reports in parallel.")
+    parser.add_argument("output_dir", help="directory the report files are written to")
+    parser.add_argument("--jobs", help="JSON file with the jobs to run, instead of the daily bundle")
+    parser.add_argument("--database", default=None, help="database to report on")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--compress", action="store_true", help="gzip the CSV exports")
+    args = parser.parse_args()
+
+    prepare(args.database)
+    jobs = load_jobs(args.jobs) if args.jobs else daily_jobs(args.database)
+    started = time.perf_counter()
+    results = run_jobs(jobs, args.output_dir, args.database, args.workers, args.compress)
+    print_summary(results, time.perf_counter() - started)
+    if any(result.error for result in results):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import threading
+from contextlib import contextmanager
+import database
+import identitymap
+from port import Port
+from vessel import Vessel
+
+# Key sets up to this size are sent as a single IN-list, larger ones through a temp table
+MAX_IN_LIST = 500
+
+_local = threading.local()
+
+
+def _fetch_rows(cursor, table: str, key: str, keys: list) -> list:
+    # One query per call, whatever the number of keys
+    if len(keys) <= MAX_IN_LIST:
+        placeholders = ", ".join("?" * len(keys))
+        cursor.execute(f"SELECT * FROM {table} WHERE {key} IN ({placeholders})", keys)
+        return cursor.fetchall()
+
+    conn = cursor.connection
+    started = not conn.in_transaction
+    try:
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS resolver_keys (key PRIMARY KEY)")
+        cursor.execute("DELETE FROM resolver_keys")
+        cursor.executemany("INSERT OR IGNORE INTO resolver_keys (key) VALUES (?)", ((k,) for k in keys))
+        cursor.execute(f"SELECT {table}.* FROM resolver_keys JOIN {table} ON {table}.{key} = resolver_keys.key")
+        return cursor.fetchall()
+    finally:
+        # Don't hold the read lock of an implicit transaction we opened
+        if started and conn.in_transaction:
+            conn.commit()
+
+
+def _fetch_objects(kind: str, table: str, key: str, cls, keys, cursor) -> dict:
+    # Objects already in the session's identity map are reused, the rest are loaded in one query
+    cache = identitymap.current()
+    found = {}
+    missing = []
+    for k in set(keys):
+        obj = cache.get(kind, k)
+        if obj is None:
+            missing.append(k)
+        else:
+            found[k] = obj
+
+    if missing:
+        cursor = cursor or database.get_connection().cursor()
+        for row in _fetch_rows(cursor, table, key, missing):
+            found[row[0]] = cache.add(kind, row[0], cls(*row))
+    return found
+
+
+def fetch_ports(port_ids, cursor=None) -> dict:
+    """Return a dict of Port objects keyed by id for every id that exists."""
+    return _fetch_objects("port", "ports", "id", Port, port_ids, cursor)
+
+
+def fetch_vessels(imos, cursor=None) -> dict:
+    """Return a dict of Vessel objects keyed by IMO for every IMO that exists."""
+    return _fetch_objects("vessel", "vessels", "imo", Vessel, imos, cursor)
+
+
+class Batch:
+    def __init__(self, ports: dict, vessels: dict):
+        self.ports = ports
+        self.vessels = vessels
+
+    def ports_for(self, shipment) -> dict:
+        """Return the origin and destination ports of a shipment, like Shipment.get_ports."""
+        missing = {shipment.origin, shipment.destination} - self.ports.keys()
+        if missing:
+            self.ports.update(fetch_ports(missing))
+
+        if shipment.origin not in self.ports:
+            raise ValueError(f"No port found with ID {shipment.origin}")
+        if shipment.destination not in self.ports:
+            raise ValueError(f"No port found with ID {shipment.destination}")
+        return {"origin": self.ports[shipment.origin], "destination": self.ports[shipment.destination]}
+
+    def vessel_for(self, shipment) -> Vessel:
+        """Return the vessel of a shipment, like Shipment.get_vessel."""
+        if shipment.vessel not in self.vessels:
+            self.vessels.update(fetch_vessels([shipment.vessel]))
+        if shipment.vessel not in self.vessels:
+            raise ValueError(f"No vessel found with IMO {shipment.vessel}")
+        return self.vessels[shipment.vessel]
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(ports={len(self.ports)}, vessels={len(self.vessels)})"
+
+
+def resolve(shipments) -> Batch:
+    """Load the ports and vessels of many shipments with one query per table."""
+    port_ids = set()
+    imos = set()
+    for shipment in shipments:
+        port_ids.add(shipment.origin)
+        port_ids.add(shipment.destination)
+        imos.add(shipment.vessel)
+
+    cursor = database.get_connection().cursor()
+    return Batch(fetch_ports(port_ids, cursor), fetch_vessels(imos, cursor))
+
+
+def current_batch():
+    """Return the innermost active batch of this thread, or None."""
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def batch(shipments):
+    """Preload relations so Shipment.get_ports and get_vessel don't query per object.
+
+    Example:
+        with resolver.batch(shipments):
+            for shipment in shipments:
+                ports = shipment.get_ports()
+    """
+    loaded = resolve(shipments)
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    _local.stack.append(loaded)
+    try:
+        yield loaded
+    finally:
+        _local.stack.pop()
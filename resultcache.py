@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+
+# Default number of results kept per reporter
+MAXSIZE = 256
+
+
+class ResultCache:
+    def __init__(self, conn, maxsize: int = MAXSIZE):
+        # Results are only valid for the database state they were computed on
+        self.conn = conn
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._token = None
+        self._lock = threading.RLock()
+
+    def _current_token(self) -> tuple:
+        # data_version moves when another connection commits, total_changes when this one writes,
+        # and schema_version on every schema change, including migrations
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        schema_version = self.conn.execute("PRAGMA schema_version").fetchone()[0]
+        return (data_version, schema_version, self.conn.total_changes)
+
+    def validate(self):
+        """Drop every result if the database changed since they were computed."""
+        with self._lock:
+            # Under the lock, as a concurrent reporter shares this connection between threads
+            token = self._current_token()
+            if token != self._token:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._token = token
+
+    def get_or_compute(self, key, compute):
+        """Return the cached result for ``key``, computing and storing it on a miss."""
+        self.validate()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        result = compute()
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                "size": len(self._entries), "maxsize": self.maxsize}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{key}={value}' for key, value in self.stats().items())})"
@@ -0,0 +1,179 @@
+from datetime import date, timedelta
+from dates import NOT_FILLING_IN_SQL, row_date_sql
+from vessel import EFFICIENCY_VALUES, DEFAULT_EFFICIENCY
+
+# Shipment count, cargo weight, distance and fuel per time bucket at day, week
+# and month grain, keyed by port, vessel type and vessel country. A shipment
+# counts at the date it leaves, under both its origin and its destination port.
+# Buckets are the first day of the period as "YYYY-MM-DD"; weeks start on
+# Monday. Triggers on shipments and vessels keep the table current.
+
+TRIGGERS = ("rollups_shipments_insert", "rollups_shipments_delete", "rollups_shipments_update",
+            "rollups_vessels_insert", "rollups_vessels_delete", "rollups_vessels_update")
+
+MEASURES = ("cargo_weight", "distance_naut", "fuel")
+
+# Bucket of a "YYYY-MM-DD" day per grain
+GRAINS = {
+    "day": "date({0})",
+    "week": "date({0}, '-6 days', 'weekday 1')",
+    "month": "date({0}, 'start of month')",
+}
+
+# Per dimension the key of a shipment; a round trip counts once at its port
+KEYS = (
+    ("port", "f.origin"),
+    ("port", "CASE WHEN f.destination IS NOT f.origin THEN f.destination END"),
+    ("vessel_type", "f.type"),
+    ("vessel_country", "f.country"),
+)
+
+DIMENSIONS = tuple(dict.fromkeys(dimension for dimension, _ in KEYS))
+
+# Vessel.get_fuel_consumption over the distance of a shipment
+FUEL_SQL = "ROUND(CASE f.type {cases} ELSE {default} END * (CAST(f.gross AS REAL) / f.netto) * f.distance_naut, 5)".format(
+    cases=" ".join(f"WHEN '{vessel_type}' THEN {efficiency}" for vessel_type, efficiency in EFFICIENCY_VALUES.items()),
+    default=DEFAULT_EFFICIENCY,
+)
+
+
+def _shipment_facts(row: str) -> str:
+    """One-row query of the shipment referenced as ``row`` (NEW or OLD) with its vessel's attributes."""
+    return f"""
+        SELECT {row_date_sql(row)} AS day, {row}.origin AS origin,
+               {row}.destination AS destination, {row}.cargo_weight AS cargo_weight, {row}.distance_naut AS distance_naut,
+               v.type AS type, v.country AS country, v.gross AS gross, v.netto AS netto
+        FROM (SELECT 1) LEFT JOIN vessels v ON v.imo = {row}.vessel
+    """
+
+
+def _vessel_facts(imo: str, row: str = None) -> str:
+    """Query of the shipments of vessel ``imo`` with the attributes of the vessel row ``row``, or NULL without one."""
+    attributes = ", ".join(f"{f'{row}.{name}' if row else 'NULL'} AS {name}" for name in ("type", "country", "gross", "netto"))
+    return f"""
+        SELECT {row_date_sql('shipments')} AS day, origin, destination, cargo_weight, distance_naut, {attributes}
+        FROM shipments WHERE vessel = {imo}
+    """
+
+
+def _upsert_sql(facts: str, sign: int = 1) -> str:
+    """Statement that adds (or with ``sign`` -1 subtracts) the rollup contributions of the shipments in ``facts``."""
+    buckets = " ".join(f"WHEN '{grain}' THEN {bucket.format('f.day')}" for grain, bucket in GRAINS.items())
+    keys = " ".join(f"WHEN {position} THEN {key}" for position, (_, key) in enumerate(KEYS))
+    grains = " UNION ALL ".join(f"SELECT '{grain}' AS grain" for grain in GRAINS)
+    dimensions = " UNION ALL ".join(f"SELECT {position} AS position, '{dimension}' AS dimension"
+                                    for position, (dimension, _) in enumerate(KEYS))
+    updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in ("shipments",) + MEASURES)
+    return f"""
+        INSERT INTO shipment_rollups (grain, dimension, key, bucket, shipments, {', '.join(MEASURES)})
+        SELECT grain, dimension, key, bucket, {sign} * COUNT(*),
+               {sign} * TOTAL(cargo_weight), {sign} * TOTAL(distance_naut), {sign} * TOTAL(fuel)
+        FROM (
+            SELECT g.grain, CASE g.grain {buckets} END AS bucket, k.dimension, CASE k.position {keys} END AS key,
+                   f.cargo_weight, f.distance_naut, {FUEL_SQL} AS fuel
+            FROM ({facts}) f, ({grains}) g, ({dimensions}) k
+        )
+        WHERE key IS NOT NULL AND bucket IS NOT NULL
+        GROUP BY grain, dimension, key, bucket
+        ON CONFLICT (grain, dimension, key, bucket) DO UPDATE SET {updates};
+    """
+
+
+# Buckets left without shipments; the partial index keeps this a lookup
+DELETE_EMPTY_SQL = "DELETE FROM shipment_rollups WHERE shipments <= 0;"
+
+
+def create_rollup_table(cursor):
+    """Version 7: day, week and month rollups per port, vessel type and vessel country, kept current by triggers."""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS shipment_rollups (
+            grain TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            shipments INTEGER NOT NULL,
+            {', '.join(f'{measure} REAL NOT NULL' for measure in MEASURES)},
+            PRIMARY KEY (grain, dimension, key, bucket)
+        ) WITHOUT ROWID
+    """)
+
+    # A range for one key is a primary key range; a range over every key of a dimension needs this one
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shipment_rollups_bucket ON shipment_rollups (grain, dimension, bucket)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shipment_rollups_empty ON shipment_rollups (shipments) WHERE shipments <= 0")
+
+    rebuild(cursor)
+    create_triggers(cursor)
+
+
+def rebuild(cursor):
+    """Recompute every rollup from the shipments with one GROUP BY per grain and dimension."""
+    cursor.execute("DELETE FROM shipment_rollups")
+    facts = """
+        SELECT s.date_iso AS day, s.origin, s.destination, s.cargo_weight, s.distance_naut, v.type, v.country, v.gross, v.netto
+        FROM shipments s LEFT JOIN vessels v ON v.imo = s.vessel
+    """
+    for grain, bucket in GRAINS.items():
+        for dimension in DIMENSIONS:
+            # The port dimension keys every shipment twice, once per end
+            keyed = " UNION ALL ".join(f"""
+                SELECT {bucket.format('f.day')} AS bucket, {key} AS key, f.cargo_weight, f.distance_naut, {FUEL_SQL} AS fuel
+                FROM ({facts}) f
+            """ for key_dimension, key in KEYS if key_dimension == dimension)
+            cursor.execute(f"""
+                INSERT INTO shipment_rollups (grain, dimension, key, bucket, shipments, {', '.join(MEASURES)})
+                SELECT '{grain}', '{dimension}', key, bucket, COUNT(*), TOTAL(cargo_weight), TOTAL(distance_naut), TOTAL(fuel)
+                FROM ({keyed})
+                WHERE key IS NOT NULL AND bucket IS NOT NULL
+                GROUP BY key, bucket
+            """)
+
+
+def create_triggers(cursor):
+    """Create the triggers that keep the rollups current."""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rollups_shipments_insert AFTER INSERT ON shipments
+        BEGIN {_upsert_sql(_shipment_facts("NEW"))} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rollups_shipments_delete AFTER DELETE ON shipments
+        BEGIN {_upsert_sql(_shipment_facts("OLD"), -1)} {DELETE_EMPTY_SQL} END
+    """)
+
+    # Filling in a missing date_iso does not move any shipment between buckets
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rollups_shipments_update
+        AFTER UPDATE OF date, date_iso, origin, destination, vessel, cargo_weight, distance_naut ON shipments
+        WHEN {NOT_FILLING_IN_SQL}
+        BEGIN {_upsert_sql(_shipment_facts("OLD"), -1)} {_upsert_sql(_shipment_facts("NEW"))} {DELETE_EMPTY_SQL} END
+    """)
+
+    # The vessel decides the type and country keys and the fuel of all its shipments
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rollups_vessels_insert AFTER INSERT ON vessels
+        BEGIN {_upsert_sql(_vessel_facts("NEW.imo"), -1)} {_upsert_sql(_vessel_facts("NEW.imo", "NEW"))} {DELETE_EMPTY_SQL} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rollups_vessels_delete AFTER DELETE ON vessels
+        BEGIN {_upsert_sql(_vessel_facts("OLD.imo", "OLD"), -1)} {_upsert_sql(_vessel_facts("OLD.imo"))} {DELETE_EMPTY_SQL} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rollups_vessels_update AFTER UPDATE OF type, country, gross, netto ON vessels
+        BEGIN {_upsert_sql(_vessel_facts("NEW.imo", "OLD"), -1)} {_upsert_sql(_vessel_facts("NEW.imo", "NEW"))} {DELETE_EMPTY_SQL} END
+    """)
+
+
+def drop_triggers(cursor):
+    """Drop the maintenance triggers; see schema.bulk_load."""
+    for trigger in TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+
+def bucket_of(day: date, grain: str) -> date:
+    """Return the first day of the ``grain`` bucket that contains ``day``."""
+    if grain == "day":
+        return day
+    elif grain == "week":
+        return day - timedelta(days=day.weekday())
+    elif grain == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unsupported grain {grain!r}, expected one of {', '.join(GRAINS)}")
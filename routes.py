@@ -0,0 +1,270 @@
+import heapq
+import database
+
+# Per origin-destination lane: the number of trips, and per shipment measure its
+# sum and the number of trips that have it, so means stay exact under inserts and
+# deletes and skip missing values. Triggers on shipments keep the table current;
+# RouteGraph holds it in memory as an adjacency map.
+
+TRIGGERS = ("lane_stats_insert", "lane_stats_delete", "lane_stats_update")
+
+MEASURES = ("cargo_weight", "distance_naut", "duration_hours", "average_speed")
+
+# Per measure the column counting the trips with a value for it
+COUNTS = tuple(f"{measure}_trips" for measure in MEASURES)
+
+COLUMNS = ", ".join(("trips",) + MEASURES + COUNTS)
+
+LANES_QUERY = f"SELECT origin, destination, {COLUMNS} FROM lane_stats"
+
+# Shipments loaded after a graph was built, found through the rowid
+NEW_SHIPMENTS_QUERY = f"""
+    SELECT rowid, origin, destination, {', '.join(MEASURES)} FROM shipments
+    WHERE rowid > ? AND origin IS NOT NULL AND destination IS NOT NULL
+    ORDER BY rowid
+"""
+
+# Edge weights for shortest_path, as the mean of the lane
+WEIGHTS = {"distance": "mean_distance", "duration": "mean_duration"}
+
+
+def _add_sql(row: str) -> str:
+    """Statement that counts one trip of the shipment referenced as ``row`` (NEW or OLD)."""
+    values = ", ".join([f"COALESCE({row}.{measure}, 0)" for measure in MEASURES] +
+                       [f"{row}.{measure} IS NOT NULL" for measure in MEASURES])
+    updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in MEASURES + COUNTS)
+    return f"""
+        INSERT INTO lane_stats (origin, destination, {COLUMNS})
+        SELECT {row}.origin, {row}.destination, 1, {values}
+        WHERE {row}.origin IS NOT NULL AND {row}.destination IS NOT NULL
+        ON CONFLICT (origin, destination) DO UPDATE SET trips = trips + 1, {updates};
+    """
+
+
+def _remove_sql(row: str) -> str:
+    """Statements that uncount one trip of the shipment referenced as ``row``."""
+    updates = ", ".join([f"{measure} = {measure} - COALESCE({row}.{measure}, 0)" for measure in MEASURES] +
+                        [f"{count} = {count} - ({row}.{measure} IS NOT NULL)" for measure, count in zip(MEASURES, COUNTS)])
+    return f"""
+        UPDATE lane_stats SET trips = trips - 1, {updates}
+        WHERE origin = {row}.origin AND destination = {row}.destination;
+        DELETE FROM lane_stats WHERE origin = {row}.origin AND destination = {row}.destination AND trips <= 0;
+    """
+
+
+def create_lane_table(cursor):
+    """Version 6: per-lane aggregates for the route graph, backfilled and kept current by triggers."""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS lane_stats (
+            origin TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            trips INTEGER NOT NULL,
+            {', '.join(f'{measure} REAL NOT NULL' for measure in MEASURES)},
+            {', '.join(f'{count} INTEGER NOT NULL' for count in COUNTS)},
+            PRIMARY KEY (origin, destination)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_lane_stats_destination ON lane_stats (destination)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_lane_stats_trips ON lane_stats (trips)")
+
+    rebuild(cursor)
+    create_triggers(cursor)
+
+
+def count_measures(cursor):
+    """Version 10: count the trips that have each measure, so missing values no longer drag the lane means down."""
+    drop_triggers(cursor)
+    cursor.execute("DROP TABLE IF EXISTS lane_stats")
+    create_lane_table(cursor)
+
+
+def rebuild(cursor):
+    """Recompute every lane from the shipments in one pass."""
+    cursor.execute("DELETE FROM lane_stats")
+    cursor.execute(f"""
+        INSERT INTO lane_stats (origin, destination, {COLUMNS})
+        SELECT origin, destination, COUNT(*), {', '.join(f'TOTAL({measure})' for measure in MEASURES)},
+            {', '.join(f'COUNT({measure})' for measure in MEASURES)}
+        FROM shipments
+        WHERE origin IS NOT NULL AND destination IS NOT NULL
+        GROUP BY origin, destination
+    """)
+
+
+def create_triggers(cursor):
+    """Create the triggers that keep the lanes current."""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS lane_stats_insert AFTER INSERT ON shipments
+        BEGIN {_add_sql("NEW")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS lane_stats_delete AFTER DELETE ON shipments
+        BEGIN {_remove_sql("OLD")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS lane_stats_update AFTER UPDATE OF origin, destination, {', '.join(MEASURES)} ON shipments
+        BEGIN {_remove_sql("OLD")} {_add_sql("NEW")} END
+    """)
+
+
+def drop_triggers(cursor):
+    """Drop the maintenance triggers; see schema.bulk_load."""
+    for trigger in TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+
+def _mean(total: float, count: int) -> float:
+    """Mean over the trips that have the measure, None when none do."""
+    return total / count if count else None
+
+
+class Lane:
+    def __init__(self, origin: str, destination: str, trips: int = 0, cargo_weight: float = 0.0,
+                 distance_naut: float = 0.0, duration_hours: float = 0.0, average_speed: float = 0.0,
+                 cargo_weight_trips: int = 0, distance_naut_trips: int = 0, duration_hours_trips: int = 0,
+                 average_speed_trips: int = 0):
+        # The measures are sums over the trips that have them, the *_trips how many those are
+        self.origin = origin
+        self.destination = destination
+        self.trips = trips
+        self.cargo_weight = cargo_weight
+        self.distance_naut = distance_naut
+        self.duration_hours = duration_hours
+        self.average_speed = average_speed
+        self.cargo_weight_trips = cargo_weight_trips
+        self.distance_naut_trips = distance_naut_trips
+        self.duration_hours_trips = duration_hours_trips
+        self.average_speed_trips = average_speed_trips
+
+    def add(self, cargo_weight, distance_naut, duration_hours, average_speed):
+        self.trips += 1
+        for measure, value in zip(MEASURES, (cargo_weight, distance_naut, duration_hours, average_speed)):
+            if value is not None:
+                setattr(self, measure, getattr(self, measure) + value)
+                setattr(self, f"{measure}_trips", getattr(self, f"{measure}_trips") + 1)
+
+    @property
+    def mean_distance(self) -> float:
+        return _mean(self.distance_naut, self.distance_naut_trips)
+
+    @property
+    def mean_duration(self) -> float:
+        return _mean(self.duration_hours, self.duration_hours_trips)
+
+    @property
+    def mean_speed(self) -> float:
+        return _mean(self.average_speed, self.average_speed_trips)
+
+    def __repr__(self) -> str:
+        means = ", ".join(f"{name}={None if value is None else round(value, 3)}" for name, value in
+                          (("mean_distance", self.mean_distance), ("mean_duration", self.mean_duration), ("mean_speed", self.mean_speed)))
+        return (f"{type(self).__name__}(origin={self.origin}, destination={self.destination}, trips={self.trips}, "
+                f"cargo_weight={self.cargo_weight}, {means})")
+
+
+class RouteGraph:
+    def __init__(self):
+        # origin -> destination -> Lane, plus the reverse direction for inbound lookups
+        self.outbound = {}
+        self.inbound = {}
+        self.last_rowid = 0
+
+    @classmethod
+    def from_database(cls, conn=None) -> "RouteGraph":
+        """Build the graph from the lane aggregates in one pass over lane_stats."""
+        conn = conn or database.get_connection()
+        graph = cls()
+        # Read both in one transaction, so the watermark matches the lanes
+        opened = not conn.in_transaction
+        if opened:
+            conn.execute("BEGIN")
+        try:
+            graph.last_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM shipments").fetchone()[0]
+            for origin, destination, *values in conn.execute(LANES_QUERY):
+                graph._insert(Lane(origin, destination, *values))
+        finally:
+            if opened:
+                conn.commit()
+        return graph
+
+    def _insert(self, lane: Lane):
+        self.outbound.setdefault(lane.origin, {})[lane.destination] = lane
+        self.inbound.setdefault(lane.destination, {})[lane.origin] = lane
+
+    def add_shipment(self, origin: str, destination: str, cargo_weight=None, distance_naut=None, duration_hours=None, average_speed=None):
+        """Count one trip on the lane from origin to destination."""
+        lane = self.outbound.get(origin, {}).get(destination)
+        if lane is None:
+            lane = Lane(origin, destination)
+            self._insert(lane)
+        lane.add(cargo_weight, distance_naut, duration_hours, average_speed)
+
+    def update(self, conn=None) -> int:
+        """Add the shipments loaded since the graph was built or last updated; returns how many.
+
+        Deleted or changed shipments are not seen; build a new graph for those.
+        """
+        conn = conn or database.get_connection()
+        added = 0
+        for rowid, origin, destination, *values in database.iter_rows(conn.cursor(), NEW_SHIPMENTS_QUERY, (self.last_rowid,)):
+            self.add_shipment(origin, destination, *values)
+            self.last_rowid = rowid
+            added += 1
+        return added
+
+    def lanes(self):
+        """Yield every lane."""
+        for destinations in self.outbound.values():
+            yield from destinations.values()
+
+    def lane(self, origin: str, destination: str) -> Lane:
+        return self.outbound.get(origin, {}).get(destination)
+
+    def busiest_lanes(self, n: int = 10, by: str = "trips") -> "list[Lane]":
+        """Return the ``n`` lanes with the most trips (or the highest total of another measure, such as cargo_weight)."""
+        return heapq.nlargest(n, self.lanes(), key=lambda lane: (getattr(lane, by), lane.origin, lane.destination))
+
+    def neighbors(self, port: str, direction: str = "out") -> "list[Lane]":
+        """Return the lanes leaving the port ("out"), arriving at it ("in") or both, busiest first."""
+        lanes = []
+        if direction in ("out", "both"):
+            lanes += self.outbound.get(port, {}).values()
+        if direction in ("in", "both"):
+            lanes += self.inbound.get(port, {}).values()
+        return sorted(lanes, key=lambda lane: (-lane.trips, lane.origin, lane.destination))
+
+    def shortest_path(self, source: str, target: str, weight: str = "distance"):
+        """Return (total, ports) for the cheapest route by mean lane distance or duration, or None without a route.
+
+        Lanes without a single trip that has the measure are left out.
+        """
+        attribute = WEIGHTS[weight]
+        best = {source: 0.0}
+        previous = {}
+        queue = [(0.0, source)]
+        while queue:
+            cost, port = heapq.heappop(queue)
+            if port == target:
+                path = [port]
+                while path[-1] != source:
+                    path.append(previous[path[-1]])
+                return cost, path[::-1]
+            if cost > best.get(port, float("inf")):
+                continue
+            for destination, lane in self.outbound.get(port, {}).items():
+                mean = getattr(lane, attribute)
+                if mean is None:
+                    continue
+                candidate = cost + mean
+                if candidate < best.get(destination, float("inf")):
+                    best[destination] = candidate
+                    previous[destination] = port
+                    heapq.heappush(queue, (candidate, destination))
+        return None
+
+    def __len__(self) -> int:
+        return sum(len(destinations) for destinations in self.outbound.values())
+
+    def __repr__(self) -> str:
+        ports = len(self.outbound.keys() | self.inbound.keys())
+        return f"{type(self).__name__}(ports={ports}, lanes={len(self)}, last_rowid={self.last_rowid})"
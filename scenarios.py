@@ -0,0 +1,100 @@
+import numpy as np
+from frame import ShipmentFrame, round_half_even
+from vessel import EFFICIENCY_VALUES
+
+# Upper bound on the size of one block of the cost matrix; the number of
+# shipments per block follows from the number of scenarios
+CHUNK_BYTES = 32 * 1024 * 1024
+
+# Groupings for FuelScenarios.aggregate
+GROUPINGS = ("vessel", "vessel_type", "lane", "month")
+
+
+def _codes(values) -> tuple:
+    """Return (keys, codes) so that keys[codes[i]] == values[i]; keys keep first-seen order and may hold None."""
+    index = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=np.int64, count=len(values))
+    return list(index), codes
+
+
+class FuelScenarios:
+    def __init__(self, frame: ShipmentFrame, prices, efficiency_values: dict = None, chunk_size: int = None):
+        # The per-shipment part of Shipment.calculate_fuel_costs, duration times consumption, does not depend
+        # on the price, so it is computed once and every scenario is a column of base * price.
+        # efficiency_values only needs the vessel types whose efficiency differs from EFFICIENCY_VALUES.
+        self.frame = frame
+        self.prices = np.asarray(prices, dtype=np.float64).ravel()
+        self.efficiency_values = {**EFFICIENCY_VALUES, **(efficiency_values or {})}
+        self.chunk_size = chunk_size or max(1, CHUNK_BYTES // (8 * max(len(self.prices), 1)))
+        self.base = frame.duration_hours * frame.fuel_consumption(self.efficiency_values)
+        self._groups = {}
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def iter_chunks(self):
+        """Yield (start, costs) per block of shipments, costs being a shipments x scenarios array.
+
+        Every cost is rounded like Shipment.calculate_fuel_costs; NULL measures give NaN.
+        """
+        for start in range(0, len(self.base), self.chunk_size):
+            block = self.base[start:start + self.chunk_size, np.newaxis] * self.prices
+            yield start, round_half_even(block.ravel(), 3).reshape(block.shape)
+
+    def matrix(self) -> np.ndarray:
+        """The full shipments x scenarios cost matrix; prefer iter_chunks or aggregate for the whole history."""
+        costs = np.empty((len(self.base), len(self.prices)))
+        for start, block in self.iter_chunks():
+            costs[start:start + len(block)] = block
+        return costs
+
+    def _grouping(self, by: str) -> tuple:
+        # (keys, codes) per grouping, computed once per engine
+        if by not in self._groups:
+            if by == "vessel":
+                keys, codes = _codes(self.frame.vessel.tolist())
+            elif by == "vessel_type":
+                keys, codes = _codes(self.frame.vessel_type.tolist())
+            elif by == "lane":
+                keys, codes = _codes(list(zip(self.frame.origin.tolist(), self.frame.destination.tolist())))
+            elif by == "month":
+                # ISO dates start with the month; there are far fewer distinct dates than shipments
+                dates, date_codes = _codes(self.frame.date_iso.tolist())
+                keys, month_codes = _codes([value[:7] if value else None for value in dates])
+                codes = month_codes[date_codes]
+            else:
+                raise ValueError(f"Unsupported grouping {by!r}, expected one of {', '.join(GROUPINGS)}")
+            self._groups[by] = (keys, codes)
+        return self._groups[by]
+
+    def aggregate(self, *by: str) -> dict:
+        """Total cost per scenario for every group, in a single pass over the cost matrix.
+
+        Returns {grouping: {key: array of totals, one per scenario}}, grouping
+        being one of GROUPINGS; lanes are (origin, destination) keys and months
+        "YYYY-MM". Shipments whose cost is NaN count as zero.
+        """
+        groupings = {name: self._grouping(name) for name in by}
+        totals = {name: np.zeros((len(keys), len(self.prices))) for name, (keys, _) in groupings.items()}
+
+        for start, block in self.iter_chunks():
+            block = np.nan_to_num(block, copy=False, nan=0.0)
+            for name, (_, codes) in groupings.items():
+                # Sorting the block by group lets reduceat sum every group's rows at once
+                chunk_codes = codes[start:start + len(block)]
+                order = np.argsort(chunk_codes, kind="stable")
+                sorted_codes = chunk_codes[order]
+                starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+                totals[name][sorted_codes[starts]] += np.add.reduceat(block[order], starts, axis=0)
+
+        return {name: dict(zip(keys, totals[name])) for name, (keys, _) in groupings.items()}
+
+    def totals(self) -> np.ndarray:
+        """Total cost of all shipments per scenario."""
+        totals = np.zeros(len(self.prices))
+        for _, block in self.iter_chunks():
+            totals += np.nansum(block, axis=0)
+        return totals
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(shipments={len(self.base)}, scenarios={len(self.prices)}, chunk_size={self.chunk_size})"
@@ -0,0 +1,162 @@
+from contextlib import contextmanager
+from dates import ISO_DATE_SQL
+import rollups
+import routes
+import search
+import summary
+import visits
+
+
+def create_date_iso_trigger(cursor):
+    # Writers that do not fill in date_iso themselves still get one
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS shipments_date_iso AFTER INSERT ON shipments
+        WHEN NEW.date_iso IS NULL
+        BEGIN
+            UPDATE shipments SET date_iso = {ISO_DATE_SQL.format('NEW.date')} WHERE rowid = NEW.rowid;
+        END
+    """)
+    # A changed date moves the shipment; the derived tables follow through their date_iso triggers
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS shipments_date_iso_update AFTER UPDATE OF date ON shipments
+        BEGIN
+            UPDATE shipments SET date_iso = {ISO_DATE_SQL.format('NEW.date')} WHERE rowid = NEW.rowid;
+        END
+    """)
+
+
+def drop_date_iso_triggers(cursor):
+    cursor.execute("DROP TRIGGER IF EXISTS shipments_date_iso")
+    cursor.execute("DROP TRIGGER IF EXISTS shipments_date_iso_update")
+
+
+def add_iso_dates_and_indexes(cursor):
+    """Version 1: ISO date column plus indexes for the port, vessel and date access patterns."""
+    cursor.execute("ALTER TABLE shipments ADD COLUMN date_iso TEXT")
+    cursor.execute(f"UPDATE shipments SET date_iso = {ISO_DATE_SQL.format('date')}")
+
+    create_date_iso_trigger(cursor)
+
+    # The trailing columns make the port and vessel lookups covering
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shipments_origin ON shipments (origin, date_iso, vessel, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shipments_destination ON shipments (destination, date_iso, vessel, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shipments_vessel ON shipments (vessel, date_iso, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shipments_date ON shipments (date_iso)")
+
+
+def add_country_indexes(cursor):
+    """Version 2: indexes for the per-country lookups, ordered by primary key for keyset pagination."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ports_country ON ports (country, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vessels_country ON vessels (country, imo)")
+
+
+def add_ranking_indexes(cursor):
+    """Version 4: indexes for the length, beam and distance rankings, so a top-N read is an index walk."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vessels_length ON vessels (length)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vessels_beam ON vessels (beam)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_shipments_distance ON shipments (distance_naut)")
+
+
+def fix_unpadded_dates(cursor):
+    """Version 9: recompute ISO dates that were sliced out of unpadded feed dates, and follow date updates."""
+    # Recreated first so that rows whose date did not parse are no longer skipped on update;
+    # the derived tables then follow the corrected dates through them
+    for module in (summary, visits, rollups):
+        module.drop_triggers(cursor)
+        module.create_triggers(cursor)
+    cursor.execute(f"UPDATE shipments SET date_iso = {ISO_DATE_SQL.format('date')} WHERE date_iso IS NOT {ISO_DATE_SQL.format('date')}")
+    create_date_iso_trigger(cursor)
+
+
+# Ordered list of migrations; the schema version is the number that has been applied
+MIGRATIONS = [
+    add_iso_dates_and_indexes,
+    add_country_indexes,
+    summary.create_summary_tables,
+    add_ranking_indexes,
+    visits.create_visit_table,
+    routes.create_lane_table,
+    rollups.create_rollup_table,
+    search.create_search_indexes,
+    fix_unpadded_dates,
+    routes.count_measures,
+    search.recreate_triggers,
+    summary.keep_dates_past_nulls,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_version(cursor) -> int:
+    """Return the schema version of the database, 0 for one that predates versioning."""
+    cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    version = cursor.fetchone()[0]
+    return version or 0
+
+
+def migrate(conn) -> int:
+    """Upgrade the database in place to the latest schema version.
+
+    Each migration runs in its own transaction together with the version
+    bump, so an interrupted upgrade resumes where it stopped.
+    """
+    cursor = conn.cursor()
+    if conn.in_transaction:
+        conn.commit()
+
+    version = get_version(cursor)
+    conn.commit()
+    while version < SCHEMA_VERSION:
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have upgraded the database in the meantime
+            version = get_version(cursor)
+            if version < SCHEMA_VERSION:
+                MIGRATIONS[version](cursor)
+                version += 1
+                cursor.execute("DELETE FROM schema_version")
+                cursor.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+    return version
+
+
+@contextmanager
+def bulk_load(conn):
+    """Turn off per-row trigger maintenance for a bulk load and catch up in one pass afterwards.
+
+    Meant for the initial full load: the ingest path fills in date_iso itself,
+    and rebuilding the derived tables once is far cheaper than firing every
+    trigger for each inserted shipment.
+    """
+    cursor = conn.cursor()
+    if conn.in_transaction:
+        conn.commit()
+    drop_date_iso_triggers(cursor)
+    summary.drop_triggers(cursor)
+    visits.drop_triggers(cursor)
+    routes.drop_triggers(cursor)
+    rollups.drop_triggers(cursor)
+    search.drop_triggers(cursor)
+    try:
+        yield
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        cursor.execute("BEGIN")
+        cursor.execute(f"UPDATE shipments SET date_iso = {ISO_DATE_SQL.format('date')} WHERE date_iso IS NULL")
+        create_date_iso_trigger(cursor)
+        summary.rebuild(cursor)
+        summary.create_triggers(cursor)
+        visits.rebuild(cursor)
+        visits.create_triggers(cursor)
+        routes.rebuild(cursor)
+        routes.create_triggers(cursor)
+        rollups.rebuild(cursor)
+        rollups.create_triggers(cursor)
+        search.rebuild(cursor)
+        search.create_triggers(cursor)
+        conn.commit()
@@ -0,0 +1,241 @@
+import re
+import unicodedata
+
+# Full-text indexes over port id, name, city and province and over vessel name
+# and MMSI, kept current by triggers. Vessels index their IMO number as the
+# rowid, so the index reads the text from vessels itself; port ids are text,
+# and the rowid of a table without an integer key may change on VACUUM, so the
+# port index keeps its own copy keyed by id. Queries match every word as a
+# prefix; when that finds too few rows, each word that is not a prefix of any
+# indexed term is widened to the terms within a small edit distance of it.
+
+TRIGGERS = ("ports_search_insert", "ports_search_delete", "ports_search_update",
+            "vessels_search_insert", "vessels_search_delete", "vessels_search_update")
+
+TOKENIZE = "unicode61 remove_diacritics 2"
+
+# Prefix lengths with their own index entries, so short type-ahead prefixes stay lookups
+PREFIXES = "2 3 4"
+
+# Per entity the index, its vocabulary, the query returning the matching rows, the bm25 column
+# weights and the positions of the indexed columns in those rows
+INDEXES = {
+    "port": {
+        "table": "port_search",
+        "terms": "port_search_terms",
+        "query": "SELECT ports.* FROM port_search JOIN ports ON ports.id = port_search.id",
+        "weights": (10.0, 5.0, 2.0, 1.0),
+        "fields": (0, 2, 3, 4),
+    },
+    "vessel": {
+        "table": "vessel_search",
+        "terms": "vessel_search_terms",
+        "query": "SELECT vessels.* FROM vessel_search JOIN vessels ON vessels.imo = vessel_search.rowid",
+        "weights": (5.0, 3.0),
+        "fields": (2, 1),
+    },
+}
+
+# Longest edit distance accepted for a word of at least this many characters
+TYPOS = ((8, 2), (4, 1))
+
+# Rows fetched per requested row by the typo-tolerant search, to be reranked by edit distance
+FUZZY_POOL = 5
+
+
+def create_search_indexes(cursor):
+    """Version 8: full-text indexes for port and vessel search, backfilled and kept current by triggers."""
+    options = f"tokenize = '{TOKENIZE}', prefix = '{PREFIXES}'"
+    cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS port_search USING fts5(id, name, city, province, {options})")
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS vessel_search
+        USING fts5(name, mmsi, content = 'vessels', content_rowid = 'imo', {options})
+    """)
+    for index in INDEXES.values():
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {index['terms']} USING fts5vocab({index['table']}, 'row')")
+
+    rebuild(cursor)
+    create_triggers(cursor)
+
+
+def rebuild(cursor):
+    """Reindex every port and vessel."""
+    cursor.execute("DELETE FROM port_search")
+    cursor.execute("INSERT INTO port_search (id, name, city, province) SELECT id, name, city, province FROM ports")
+    cursor.execute("INSERT INTO vessel_search (vessel_search) VALUES ('rebuild')")
+
+
+def recreate_triggers(cursor):
+    """Version 11: find the index entry of a changed or deleted port through the index instead of a scan."""
+    drop_triggers(cursor)
+    create_triggers(cursor)
+
+
+def _port_insert_sql(row: str) -> str:
+    return f"INSERT INTO port_search (id, name, city, province) VALUES ({row}.id, {row}.name, {row}.city, {row}.province);"
+
+
+def _port_delete_sql(row: str) -> str:
+    # A phrase match on the id column finds the entry; an id without letters or digits has no
+    # tokens to match, so only then the index is scanned (the condition on it is checked once)
+    phrase = f"""'id : "' || replace({row}.id, '"', '""') || '"'"""
+    return f"""
+        DELETE FROM port_search WHERE port_search MATCH {phrase} AND id = {row}.id;
+        DELETE FROM port_search WHERE {row}.id NOT GLOB '*[0-9A-Za-z]*' AND id = {row}.id;
+    """
+
+
+def _vessel_sql(row: str, command: str = None) -> str:
+    # The index reads vessels itself, so removing a row means handing it the old values
+    if command:
+        return f"INSERT INTO vessel_search (vessel_search, rowid, name, mmsi) VALUES ('{command}', {row}.imo, {row}.name, {row}.mmsi);"
+    return f"INSERT INTO vessel_search (rowid, name, mmsi) VALUES ({row}.imo, {row}.name, {row}.mmsi);"
+
+
+def create_triggers(cursor):
+    """Create the triggers that keep the indexes current."""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS ports_search_insert AFTER INSERT ON ports
+        BEGIN {_port_insert_sql("NEW")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS ports_search_delete AFTER DELETE ON ports
+        BEGIN {_port_delete_sql("OLD")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS ports_search_update AFTER UPDATE OF id, name, city, province ON ports
+        BEGIN {_port_delete_sql("OLD")} {_port_insert_sql("NEW")} END
+    """)
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS vessels_search_insert AFTER INSERT ON vessels
+        BEGIN {_vessel_sql("NEW")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS vessels_search_delete AFTER DELETE ON vessels
+        BEGIN {_vessel_sql("OLD", "delete")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS vessels_search_update AFTER UPDATE OF imo, name, mmsi ON vessels
+        BEGIN {_vessel_sql("OLD", "delete")} {_vessel_sql("NEW")} END
+    """)
+
+
+def drop_triggers(cursor):
+    """Drop the maintenance triggers; see schema.bulk_load."""
+    for trigger in TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+
+def tokens(text: str) -> list:
+    """Split a query into lowercase words without diacritics, the way the index tokenizes text."""
+    folded = "".join(c for c in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(c))
+    return re.findall(r"\w+", folded)
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance between two words, or ``limit + 1`` as soon as it is known to exceed ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _allowed_typos(word: str) -> int:
+    return next((typos for length, typos in TYPOS if len(word) >= length), 0)
+
+
+def _prefix_distance(word: str, term: str, limit: int) -> int:
+    # Distance to the term or to its prefixes about as long as the word
+    return min(edit_distance(word, term[:length], limit) for length in {len(word) - 1, len(word), len(word) + 1, len(term)})
+
+
+def has_prefix_match(cursor, entity: str, word: str) -> bool:
+    """Return whether ``word`` is a prefix of an indexed term."""
+    cursor.execute(f"SELECT 1 FROM {INDEXES[entity]['terms']} WHERE term >= ? AND term < ? LIMIT 1", (word, word + chr(0x10FFFF)))
+    return cursor.fetchone() is not None
+
+
+def similar_terms(cursor, entity: str, word: str) -> list:
+    """Return the indexed terms within the allowed edit distance of ``word``, closest first.
+
+    A term also counts when one of its prefixes is that close, so a word that
+    is still being typed finds completions a few letters longer. Only terms
+    with the same first letter and within the allowed typos of the word's
+    length are compared, and numbers are never widened.
+    """
+    limit = _allowed_typos(word)
+    if not limit or word.isdigit():
+        return []
+    cursor.execute(f"""
+        SELECT term FROM {INDEXES[entity]['terms']}
+        WHERE term >= ? AND term < ? AND length(term) BETWEEN ? AND ?
+    """, (word[0], chr(ord(word[0]) + 1), len(word) - limit, len(word) + limit))
+    matches = []
+    for (term,) in cursor.fetchall():
+        distance = _prefix_distance(word, term, limit)
+        if distance <= limit:
+            matches.append((distance, term))
+    return [term for _, term in sorted(matches)]
+
+
+def _match(words) -> str:
+    """FTS5 query requiring every group of alternatives, each alternative quoted and matched as a prefix."""
+    return " AND ".join("(" + " OR ".join('"' + word.replace('"', '""') + '"*' for word in group) + ")" for group in words)
+
+
+def search(cursor, entity: str, text: str, limit: int = 10, fuzzy: bool = True) -> list:
+    """Return the rows of the ports or vessels (``entity``) best matching ``text``, at most ``limit``.
+
+    Every word matches as a prefix; rows found that way rank first, by bm25.
+    With ``fuzzy``, a search finding fewer than ``limit`` rows is repeated with
+    the words that match no indexed term widened to the terms a typo or two
+    away, and those extra rows rank by their total distance to the words
+    before bm25.
+    """
+    if entity not in INDEXES:
+        raise ValueError(f"Unsupported entity {entity!r}, expected one of {', '.join(INDEXES)}")
+    words = tokens(text)
+    if not words or limit <= 0:
+        return []
+
+    index = INDEXES[entity]
+    query = f"""
+        {index['query']}
+        WHERE {index['table']} MATCH ?
+        ORDER BY bm25({index['table']}, {', '.join(map(str, index['weights']))})
+        LIMIT ?
+    """
+    rows = cursor.execute(query, (_match([word] for word in words), limit)).fetchall()
+    if fuzzy and len(rows) < limit:
+        groups = [[word] + ([] if has_prefix_match(cursor, entity, word) else similar_terms(cursor, entity, word))
+                  for word in words]
+        if any(len(group) > 1 for group in groups):
+            seen = {row[0] for row in rows}
+            candidates = [row for row in cursor.execute(query, (_match(groups), limit * FUZZY_POOL)).fetchall() if row[0] not in seen]
+            # sorted() is stable, so rows at the same distance keep their bm25 order
+            rows += sorted(candidates, key=lambda row: _distance(words, row, index["fields"]))[:limit - len(rows)]
+    return rows
+
+
+def _distance(words: list, row: tuple, fields: tuple) -> tuple:
+    """Distance of ``row`` to the words: per word the closest term in the indexed columns, summed.
+
+    Distances to term prefixes count first, to whole terms second, so among
+    completions that are equally close the one that is already complete wins.
+    """
+    terms = tokens(" ".join(str(row[field]) for field in fields if row[field] is not None))
+    prefix, whole = 0, 0
+    for word in words:
+        best = min(((_prefix_distance(word, term, len(word)), edit_distance(word, term, len(word) + len(term)))
+                    for term in terms), default=(len(word), len(word)))
+        prefix += best[0]
+        whole += best[1]
+    return prefix, whole
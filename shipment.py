@@ -1,10 +1,17 @@
-import sqlite3
-from port import Port
-from vessel import Vessel
+import identitymap
+import resolver
 
-database_path = 'shipments.db'
+# Columns that map onto the Shipment constructor, in order
+COLUMNS = "id, date, cargo_weight, distance_naut, duration_hours, average_speed, origin, destination, vessel"
+
+# Conversion factors from knots and nautical miles
+SPEED_CONVERSIONS = {"Knts": 1.0, "Mph": 1.15078, "Kmph": 1.852}
+DISTANCE_CONVERSIONS = {"NM": 1.0, "M": 1852, "KM": 1.852, "MI": 1.15078, "YD": 2025.3718}
 
 class Shipment:
+    # Slotted, so that loading the shipment history does not pay for a __dict__ per shipment
+    __slots__ = ("id", "date", "cargo_weight", "distance_naut", "duration_hours", "average_speed", "origin", "destination", "vessel")
+
     def __init__(self, id, date, cargo_weight, distance_naut, duration_hours, average_speed, origin, destination, vessel):
         self.id = id
         self.date = date
@@ -17,34 +24,35 @@ class Shipment:
         self.vessel = vessel
 
     def get_ports(self):
-        with sqlite3.connect(database_path) as conn:
-            cursor = conn.cursor()
-            
-            # Fetch origin port details
-            cursor.execute("SELECT * FROM ports WHERE id = ?", (self.origin,))
-            origin_port_data = cursor.fetchone()
-            if not origin_port_data:
-                raise ValueError(f"No port found with ID {self.origin}")
-            origin_port = Port(*origin_port_data)
-            
-            # Fetch destination port details
-            cursor.execute("SELECT * FROM ports WHERE id = ?", (self.destination,))
-            dest_port_data = cursor.fetchone()
-            if not dest_port_data:
-                raise ValueError(f"No port found with ID {self.destination}")
-            dest_port = Port(*dest_port_data)
+        # Inside resolver.batch() the ports are already loaded
+        batch = resolver.current_batch()
+        if batch is not None:
+            return batch.ports_for(self)
+
+        # Ports are shared through the identity map of the current session
+        ports = identitymap.current()
+
+        # Fetch origin port details
+        origin_port = ports.get_port(self.origin)
+        if not origin_port:
+            raise ValueError(f"No port found with ID {self.origin}")
+
+        # Fetch destination port details
+        dest_port = ports.get_port(self.destination)
+        if not dest_port:
+            raise ValueError(f"No port found with ID {self.destination}")
 
         return {"origin": origin_port, "destination": dest_port}
 
     def get_vessel(self):
-        with sqlite3.connect(database_path) as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM vessels WHERE imo = ?", (self.vessel,))
-            vessel_data = cursor.fetchone()
-            if not vessel_data:
-                raise ValueError(f"No vessel found with IMO {self.vessel}")
-            return Vessel(*vessel_data)
+        batch = resolver.current_batch()
+        if batch is not None:
+            return batch.vessel_for(self)
+
+        vessel = identitymap.current().get_vessel(self.vessel)
+        if not vessel:
+            raise ValueError(f"No vessel found with IMO {self.vessel}")
+        return vessel
 
     def calculate_fuel_costs(self, price_per_liter, vessel):
         fuel_consumption = vessel.get_fuel_consumption(self.distance_naut)
@@ -52,18 +60,16 @@ class Shipment:
         return round(total_cost, 3)
 
     def convert_speed(self, to_format):
-        conversions = {"Knts": 1.0, "Mph": 1.15078, "Kmph": 1.852}
-        if to_format not in conversions:
+        if to_format not in SPEED_CONVERSIONS:
             raise ValueError("Unsupported speed format")
 
-        return round(self.average_speed * conversions[to_format], 6)
+        return round(self.average_speed * SPEED_CONVERSIONS[to_format], 6)
 
     def convert_distance(self, to_format):
-        conversions = {"NM": 1.0, "M": 1852, "KM": 1.852, "MI": 1.15078, "YD": 2025.3718}
-        if to_format not in conversions:
+        if to_format not in DISTANCE_CONVERSIONS:
             raise ValueError("Unsupported distance format")
 
-        return round(self.distance_naut * conversions[to_format], 6)
+        return round(self.distance_naut * DISTANCE_CONVERSIONS[to_format], 6)
 
     def convert_duration(self, to_format):
         if to_format == "%D:%H":
@@ -79,5 +85,5 @@ class Shipment:
             raise ValueError("Unsupported duration format")
 
     def __repr__(self):
-        attrs = ", ".join(f"{k}={v}" for k, v in self.__dict__.items())
-        return f"{type(self).__name__}({attrs})"
\ No newline at end of file
+        attrs = ", ".join(f"{k}={getattr(self, k)}" for k in self.__slots__)
+        return f"{type(self).__name__}({attrs})"
@@ -1,16 +1,26 @@
+import argparse
 import os
-import sqlite3
-import json
+import time
+import database
+import identitymap
+import ingest
+import instrumentation
+import schema
+import snapshot
 from vessel import Vessel
 from port import Port
-from shipment import Shipment
+from shipment import Shipment, COLUMNS as SHIPMENT_COLUMNS
 
-# Constants for database and JSON file paths
-DATABASE_PATH = "shipments.db"
+# Default JSON feed; the database path is configured in database.py
 JSON_FILE_PATH = "shipments.json"
 
-def initialize_database():
-    with sqlite3.connect(DATABASE_PATH) as conn:
+SHIPMENT_QUERY = f"SELECT {SHIPMENT_COLUMNS} FROM shipments WHERE id = ?"
+
+# Default number of rows returned per page by the fetch_*_page helpers
+PAGE_SIZE = 1000
+
+def initialize_database(workers=0, rejects_path=None):
+    with database.get_connection() as conn:
         cursor = conn.cursor()
 
         # Create tables if they don't exist
@@ -22,7 +32,7 @@ def initialize_database():
 
         if any(empty_tables.values()):
             print("Populating the database with JSON data...")
-            populate_database(cursor)
+            populate_database(cursor, workers=workers, rejects_path=rejects_path)
         else:
             print("Database is already populated.")
 
@@ -75,99 +85,162 @@ def create_tables(cursor):
         )
     ''')
 
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS load_manifest (
+            checksum TEXT PRIMARY KEY,
+            path TEXT,
+            size INTEGER,
+            mtime REAL,
+            shipments INTEGER,
+            loaded_at TEXT
+        )
+    ''')
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_load_manifest_path ON load_manifest (path)")
+
+    # Bring the tables up to the current schema version
+    schema.migrate(cursor.connection)
+
 def is_table_empty(cursor, table_name):
     cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
     count = cursor.fetchone()[0]
     return count == 0
 
-def populate_database(cursor):
-    with open(JSON_FILE_PATH, 'r') as file:
-        json_data = json.load(file)
-
-    for entry in json_data:
-        origin = entry["origin"]
-        destination = entry["destination"]
-
-        # Insert origin port data
-        cursor.execute("""
-            INSERT OR IGNORE INTO ports (id, code, name, city, province, country)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (origin["id"], origin["code"], origin["name"], origin["city"], origin["province"], origin["country"]))
-
-        # Insert destination port data
-        cursor.execute("""
-            INSERT OR IGNORE INTO ports (id, code, name, city, province, country)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (destination["id"], destination["code"], destination["name"], destination["city"], destination["province"], destination["country"]))
-
-        vessel = entry["vessel"]
-        length, beam = map(int, vessel["size"].split(" / "))
-
-        # Insert vessel data
-        cursor.execute("""
-            INSERT OR IGNORE INTO vessels (imo, mmsi, name, country, type, build, gross, netto, length, beam)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (vessel["imo"], vessel["mmsi"], vessel["name"], vessel["country"], vessel["type"], vessel["build"], vessel["gross"], vessel["netto"], length, beam))
-
-        # Insert shipment data
-        cursor.execute("""
-            INSERT INTO shipments (id, date, cargo_weight, distance_naut, duration_hours, average_speed, origin, destination, vessel)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (entry["tracking_number"], entry["date"], entry["cargo_weight"], entry["distance_naut"], entry["duration_hours"], entry["average_speed"], origin["id"], destination["id"], vessel["imo"]))
+def populate_database(cursor, json_path=JSON_FILE_PATH, batch_size=ingest.BATCH_SIZE, workers=0, rejects_path=None):
+    """
+    Stream the JSON feed into the database in batches and report the throughput.
+    With workers, parsing and validation run in that many processes and invalid entries go to rejects_path.
+    """
+    # A full load rebuilds the derived tables once instead of maintaining them per row
+    started = time.perf_counter()
+    with schema.bulk_load(cursor.connection):
+        if workers:
+            rejects = ingest.RejectLog(rejects_path)
+            try:
+                stats = ingest.load_feed(cursor, json_path, workers, batch_size, rejects=rejects)
+            finally:
+                rejects.close()
+        else:
+            with open(json_path, 'r') as file:
+                stats = ingest.load_shipments(cursor, ingest.iter_json_array(file), batch_size)
+    # The throughput covers the rebuild on leaving bulk_load, not just the inserts
+    inserting = stats.seconds
+    stats.seconds = time.perf_counter() - started
+    ingest.record_loaded(cursor, json_path, ingest.file_checksum(json_path), stats.shipments)
 
-def fetch_all_ports():
-    with sqlite3.connect(DATABASE_PATH) as conn:
+    print(f"Inserted {stats.shipments} shipments, {stats.ports} ports and {stats.vessels} vessels "
+          f"in {stats.seconds:.2f}s, {stats.seconds - inserting:.2f}s of it rebuilding the derived tables "
+          f"({stats.rows_per_second:,.0f} rows/s)")
+    if stats.rejected:
+        print(f"Rejected {stats.rejected} invalid entries" + (f", see {rejects_path}" if rejects_path else ""))
+    return stats
+
+def load_delta(path, batch_size=ingest.BATCH_SIZE, workers=0, rejects_path=None):
+    """
+    Load new shipments from a JSON file or a directory of JSON files into the existing database.
+    """
+    with database.get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM ports")
-        ports = cursor.fetchall()
+        create_tables(cursor)
+        stats = ingest.load_delta(cursor, path, batch_size, workers, rejects_path)
+
+    # Cached ports and vessels may have been updated by the load
+    identitymap.current().invalidate()
+
+    print(f"Inserted {stats.shipments} new shipments, upserted {stats.ports} ports and {stats.vessels} vessels, "
+          f"skipped {stats.skipped_files} already loaded files ({stats.rows_per_second:,.0f} rows/s)")
+    if stats.rejected:
+        print(f"Rejected {stats.rejected} invalid entries" + (f", see {rejects_path}" if rejects_path else ""))
+    return stats
+
+def fetch_all_ports():
+    cursor = database.get_connection().cursor()
+    cursor.execute("SELECT * FROM ports")
+    ports = cursor.fetchall()
 
     return [Port(*port) for port in ports]
 
 def fetch_all_vessels():
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM vessels")
-        vessels = cursor.fetchall()
+    cursor = database.get_connection().cursor()
+    cursor.execute("SELECT * FROM vessels")
+    vessels = cursor.fetchall()
 
     return [Vessel(*vessel) for vessel in vessels]
 
 def fetch_all_shipments():
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM shipments")
-        shipments = cursor.fetchall()
+    cursor = database.get_connection().cursor()
+    cursor.execute(f"SELECT {SHIPMENT_COLUMNS} FROM shipments")
+    shipments = cursor.fetchall()
 
     return [Shipment(*shipment) for shipment in shipments]
 
+def iter_ports(chunk_size=database.CHUNK_SIZE, after=None):
+    """
+    Yield every port ordered by id, fetching chunk_size rows at a time and starting after the id `after`.
+    """
+    query, params = database.keyset_query("SELECT * FROM ports", "id", after)
+    for row in database.iter_rows(database.get_connection().cursor(), query, params, chunk_size):
+        yield Port(*row)
+
+def iter_vessels(chunk_size=database.CHUNK_SIZE, after=None):
+    """
+    Yield every vessel ordered by IMO, fetching chunk_size rows at a time and starting after the IMO `after`.
+    """
+    query, params = database.keyset_query("SELECT * FROM vessels", "imo", after)
+    for row in database.iter_rows(database.get_connection().cursor(), query, params, chunk_size):
+        yield Vessel(*row)
+
+def iter_shipments(chunk_size=database.CHUNK_SIZE, after=None):
+    """
+    Yield every shipment ordered by id, fetching chunk_size rows at a time and starting after the id `after`.
+    """
+    query, params = database.keyset_query(f"SELECT {SHIPMENT_COLUMNS} FROM shipments", "id", after)
+    for row in database.iter_rows(database.get_connection().cursor(), query, params, chunk_size):
+        yield Shipment(*row)
+
+def fetch_ports_page(after=None, limit=PAGE_SIZE):
+    """
+    Return up to `limit` ports ordered by id after the id `after`; pass the last id to get the next page.
+    """
+    query, params = database.keyset_query("SELECT * FROM ports", "id", after, limit)
+    return [Port(*port) for port in database.get_connection().execute(query, params)]
+
+def fetch_vessels_page(after=None, limit=PAGE_SIZE):
+    """
+    Return up to `limit` vessels ordered by IMO after the IMO `after`; pass the last IMO to get the next page.
+    """
+    query, params = database.keyset_query("SELECT * FROM vessels", "imo", after, limit)
+    return [Vessel(*vessel) for vessel in database.get_connection().execute(query, params)]
+
+def fetch_shipments_page(after=None, limit=PAGE_SIZE):
+    """
+    Return up to `limit` shipments ordered by id after the id `after`; pass the last id to get the next page.
+    """
+    query, params = database.keyset_query(f"SELECT {SHIPMENT_COLUMNS} FROM shipments", "id", after, limit)
+    return [Shipment(*shipment) for shipment in database.get_connection().execute(query, params)]
+
 def fetch_port_details(port_id):
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM ports WHERE id = ?", (port_id,))
-        port_data = cursor.fetchone()
+    port = identitymap.current().get_port(port_id)
 
-    if port_data:
-        return Port(*port_data)
+    if port:
+        return port
     else:
         print(f"Port with ID {port_id} not found.")
         return None
 
 def fetch_vessel_details(imo):
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM vessels WHERE imo = ?", (imo,))
-        vessel_data = cursor.fetchone()
+    vessel = identitymap.current().get_vessel(imo)
 
-    if vessel_data:
-        return Vessel(*vessel_data)
+    if vessel:
+        return vessel
     else:
         print(f"Vessel with IMO {imo} not found.")
         return None
 
 def fetch_shipment_details(shipment_id):
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM shipments WHERE id = ?", (shipment_id,))
-        shipment_data = cursor.fetchone()
+    cursor = database.get_connection().cursor()
+    cursor.execute(SHIPMENT_QUERY, (shipment_id,))
+    shipment_data = cursor.fetchone()
 
     if shipment_data:
         return Shipment(*shipment_data)
@@ -176,8 +249,29 @@ def fetch_shipment_details(shipment_id):
         return None
 
 def main():
+    parser = argparse.ArgumentParser(description="Build and update the shipments database.")
+    parser.add_argument("--delta", metavar="PATH", help="load new shipments from a JSON file or directory")
+    parser.add_argument("--query-stats", action="store_true", help="print the slowest queries when done")
+    parser.add_argument("--workers", type=int, default=0, metavar="N",
+                        help="parse and validate the feed in N processes, setting invalid entries aside (default: serial)")
+    parser.add_argument("--rejects", metavar="PATH", help="append invalid entries with the reason to this JSON lines file")
+    parser.add_argument("--snapshot", metavar="PATH", help="write a columnar snapshot of the database when done")
+    args = parser.parse_args()
+
+    if args.query_stats:
+        instrumentation.enable()
+
     # Initialize the database
-    initialize_database()
+    initialize_database(args.workers, args.rejects)
+
+    if args.delta:
+        load_delta(args.delta, workers=args.workers, rejects_path=args.rejects)
+
+    if args.snapshot:
+        snapshot.write_snapshot(args.snapshot)
+
+    if args.query_stats:
+        instrumentation.report()
 
 if __name__ == "__main__":
     main()
@@ -1,199 +1,639 @@
-import sqlite3
 import csv
-from datetime import date
+import functools
+import gzip
+import hashlib
+import heapq
+import inspect
+import io
+import itertools
+import os
+import re
+import threading
+import time
+import database
+import identitymap
+import resultcache
+import rollups
+import schema
+import search
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 from vessel import Vessel
 from port import Port
-from shipment import Shipment
+from shipment import Shipment, COLUMNS as SHIPMENT_COLUMNS
+
+PORT_FIELDS = ["id", "code", "name", "city", "province", "country"]
+VESSEL_FIELDS = ["imo", "mmsi", "name", "country", "type", "build", "gross", "netto", "length", "beam"]
+
+# Rows written to a CSV export per chunk
+EXPORT_CHUNK_SIZE = 5000
+
+# Default number of threads a concurrent reporter runs report calls on
+WORKERS = 8
+
+# Vessels in a port at a moment with the time they arrived: those whose latest
+# departure or arrival up to the moment is an arrival at the port
+IN_PORT_QUERY = """
+    SELECT latest.vessel, latest.time FROM (
+        SELECT imo AS vessel, (SELECT MAX(time) FROM port_visits WHERE vessel = imo AND time <= ?) AS time
+        FROM vessels
+    ) AS latest
+    CROSS JOIN port_visits AS arrival ON arrival.vessel = latest.vessel AND arrival.time = latest.time
+    WHERE arrival.port = ? AND arrival.kind = 'arrival'
+"""
+
+# What top_n can rank: per entity the table, its key, the row class, the
+# named metrics (expression plus the join it needs) and the filterable columns.
+# Metrics on stats tables only rank entities that have shipments.
+RANKINGS = {
+    "vessel": {
+        "table": "vessels",
+        "key": "vessels.imo",
+        "columns": "vessels.*",
+        "class": Vessel,
+        "metrics": {
+            "length": ("vessels.length", ""),
+            "beam": ("vessels.beam", ""),
+            "gross": ("vessels.gross", ""),
+            "netto": ("vessels.netto", ""),
+            "build": ("vessels.build", ""),
+            "shipments": ("vessel_shipment_stats.shipments",
+                          "JOIN vessel_shipment_stats ON vessel_shipment_stats.vessel = vessels.imo"),
+        },
+        "filters": ("country", "type", "build"),
+    },
+    "port": {
+        "table": "ports",
+        "key": "ports.id",
+        "columns": "ports.*",
+        "class": Port,
+        "metrics": {
+            "shipments": ("port_shipment_stats.shipments", "JOIN port_shipment_stats ON port_shipment_stats.origin = ports.id"),
+            "first_shipment": ("port_shipment_stats.first_date", "JOIN port_shipment_stats ON port_shipment_stats.origin = ports.id"),
+            "latest_shipment": ("port_shipment_stats.last_date", "JOIN port_shipment_stats ON port_shipment_stats.origin = ports.id"),
+        },
+        "filters": ("country", "province", "city"),
+    },
+    "shipment": {
+        "table": "shipments",
+        "key": "shipments.id",
+        "columns": ", ".join(f"shipments.{column}" for column in SHIPMENT_COLUMNS.split(", ")),
+        "class": Shipment,
+        "metrics": {
+            "distance_naut": ("shipments.distance_naut", ""),
+            "cargo_weight": ("shipments.cargo_weight", ""),
+            "duration_hours": ("shipments.duration_hours", ""),
+            "average_speed": ("shipments.average_speed", ""),
+            "date": ("shipments.date_iso", ""),
+        },
+        "filters": ("origin", "destination", "vessel"),
+    },
+}
+
+
+class ExportStats:
+    def __init__(self, target, rows: int, bytes: int, seconds: float):
+        self.target = target
+        self.rows = rows
+        self.bytes = bytes
+        self.seconds = seconds
+
+    def __repr__(self) -> str:
+        attributes = ", ".join(f"{key}={value!s}" for key, value in self.__dict__.items())
+        return f"{type(self).__name__}({attributes})"
+
+
+class _CountingWriter(io.RawIOBase):
+    # Binary sink that counts the bytes passed on to the real target
+    def __init__(self, target):
+        self.target = target
+        self.bytes = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        size = data.nbytes if isinstance(data, memoryview) else len(data)
+        self.target.write(data)
+        self.bytes += size
+        return size
+
+
+class _CountingTextWriter:
+    # Text sink that counts the UTF-8 bytes passed on to a text target
+    def __init__(self, target):
+        self.target = target
+        self.bytes = 0
+
+    def write(self, text: str) -> int:
+        self.bytes += len(text.encode("utf-8"))
+        return self.target.write(text)
+
+
+def _safe_part(part) -> str:
+    text = str(part)
+    cleaned = re.sub(r"[^\w.-]+", "_", text).strip("._-")
+    if cleaned == text:
+        return cleaned
+    # Values that clean up to the same text, or to nothing, are told apart by a digest of the original
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+    return f"{cleaned}-{digest}" if cleaned else digest
+
+
+def safe_filename(*parts: str, compress: bool = False) -> str:
+    """Build a CSV filename from free-text parts, keeping letters and digits of any script, dashes and dots.
+
+    A part that had to be changed gets a short digest of its original text,
+    so two exports never share a file.
+    """
+    name = "_".join(_safe_part(part) for part in parts)
+    return f"{name}.csv.gz" if compress else f"{name}.csv"
+
+
+class _Inverted:
+    # Heap entry ordered in reverse, so that a min-heap keeps its largest entry on top
+    __slots__ = ("entry",)
+
+    def __init__(self, entry):
+        self.entry = entry
+
+    def __lt__(self, other) -> bool:
+        return other.entry < self.entry
+
+
+def cached_result(method):
+    """Serve a Reporter method from the reporter's result cache, when it has one.
+
+    Calls are keyed on the method name and its bound arguments; CSV exports
+    always run, and so do calls with a function argument, as a function's
+    repr is only unique while it is alive.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.result_cache is None:
+            return method(self, *args, **kwargs)
 
-DATABASE_PATH = "shipments.db"
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = list(bound.arguments.items())[1:]
+        if bound.arguments.get("to_csv") or any(callable(value) for _, value in arguments):
+            return method(self, *args, **kwargs)
+
+        key = (method.__name__, repr(arguments))
+        return self.result_cache.get_or_compute(key, lambda: method(self, *args, **kwargs))
+
+    return wrapper
 
-class Reporter:
-    def __init__(self):
-        self.conn = sqlite3.connect(DATABASE_PATH)
-        self.cursor = self.conn.cursor()
 
+class Reporter:
+    def __init__(self, database_path: str = None, cache: bool = False, cache_size: int = resultcache.MAXSIZE,
+                 concurrent: bool = False, workers: int = WORKERS, read_only: bool = False):
+        """Open a reporter on the configured database (or ``database_path``).
+
+        With ``concurrent`` the database is switched to WAL journaling and
+        every thread that uses the reporter reads through its own read-only
+        connection, so reports run in parallel (see run_parallel) and
+        alongside a loading writer. With ``read_only`` the reporter never
+        writes, which needs a database that is already migrated.
+        """
+        # Set before connecting, so that close() also works on a reporter whose connection failed
+        self._conn = None
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._executor = None
+
+        self.database_path = database_path or database.get_database_path()
+        self.concurrent = concurrent
+        self.workers = workers
+        self.read_only = read_only
+        connect = database.connect_readonly if read_only else database.connect
+        self._conn = connect(self.database_path, check_same_thread=not concurrent)
+        self._cursor = self._conn.cursor()
+
+        # Opt-in cache of query results, dropped whenever the database changes
+        self.result_cache = resultcache.ResultCache(self._conn, cache_size) if cache else None
+
+        # Ports and vessels looked up by this reporter are cached per instance
+        self.identity_map = identitymap.IdentityMap(cursor=(lambda: self.cursor) if concurrent else self._cursor)
+
+        # Upgrade older databases in place so the ISO dates and indexes exist
+        if read_only:
+            if schema.get_version(self._cursor) < schema.SCHEMA_VERSION:
+                raise RuntimeError(f"{self.database_path} needs migrating, open it once without read_only")
+        else:
+            schema.migrate(self._conn)
+            if concurrent:
+                database.enable_wal(database.tune(self._conn))
+
+    @property
+    def conn(self):
+        """The connection of the calling thread; the reporter's own one unless it is concurrent."""
+        if not self.concurrent:
+            return self._conn
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Only used by this thread, but closed by whichever thread calls close()
+            conn = database.tune(database.connect_readonly(self.database_path, check_same_thread=False))
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @property
+    def cursor(self):
+        """The cursor of the calling thread, see conn."""
+        if not self.concurrent:
+            return self._cursor
+        self.conn
+        return self._local.cursor
+
+    def run_parallel(self, calls) -> list:
+        """Run a batch of report calls on the reporter's thread pool and return their results in order.
+
+        Each call is a method name, or a tuple of a method name, a tuple of
+        positional arguments and a dict of keyword arguments, such as
+        ``("top_n", ("vessel", "length"), {"n": 50})``. The first failing
+        call's exception is raised.
+        """
+        if not self.concurrent:
+            raise RuntimeError("run_parallel needs a Reporter created with concurrent=True")
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reporter")
+            executor = self._executor
+
+        futures = []
+        for call in calls:
+            if isinstance(call, str):
+                call = (call,)
+            name, args, kwargs = call[0], call[1] if len(call) > 1 else (), call[2] if len(call) > 2 else {}
+            futures.append(executor.submit(getattr(self, name), *args, **kwargs))
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Stop the thread pool and close every connection of the reporter."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            connections, self._connections = self._connections, []
+        if executor is not None:
+            executor.shutdown(wait=True)
+        for conn in connections:
+            conn.close()
+        if self._conn is not None:
+            self._conn.close()
+
+    @cached_result
     def total_amount_of_vessels(self) -> int:
         """Return the total number of vessels in the database."""
         self.cursor.execute("SELECT COUNT(*) FROM vessels")
         result = self.cursor.fetchone()
         return result[0] if result else 0
 
+    @cached_result
+    def top_n(self, entity: str, metric, n: int = 10, ascending: bool = False,
+              filters: dict = None, with_ties: bool = False) -> tuple:
+        """Return the ``n`` vessels, ports or shipments ranking highest (or lowest) on a metric.
+
+        ``metric`` is a name from RANKINGS, answered by SQLite through an index
+        where one exists, or a function of the entity object, answered with a
+        bounded heap over one streaming pass. ``filters`` maps columns to a
+        value or a list of values. Ties are broken by ascending key; with
+        ``with_ties`` every row tied with the n-th is returned as well.
+        """
+        if entity not in RANKINGS:
+            raise ValueError(f"Cannot rank {entity!r}, expected one of {', '.join(RANKINGS)}")
+        spec = RANKINGS[entity]
+        if not callable(metric) and metric not in spec["metrics"]:
+            raise ValueError(f"Unknown {entity} metric {metric!r}, expected one of {', '.join(spec['metrics'])}")
+        if n <= 0:
+            return tuple()
+
+        conditions, params = self._ranking_filters(entity, filters or {})
+        if callable(metric):
+            return self._top_n_streamed(spec, metric, n, ascending, conditions, params, with_ties)
+
+        expression, join = spec["metrics"][metric]
+        conditions.append(f"{expression} IS NOT NULL")
+        source = f"FROM {spec['table']} {join} WHERE {' AND '.join(conditions)}"
+        direction = "ASC" if ascending else "DESC"
+
+        if with_ties:
+            # The n-th value bounds the result; fewer than n rows bound it by the last one
+            boundary = f"(SELECT {'MAX' if ascending else 'MIN'}(value) FROM (SELECT {expression} AS value {source} ORDER BY value {direction} LIMIT ?))"
+            query = f"SELECT {spec['columns']} {source} AND {expression} {'<=' if ascending else '>='} {boundary} ORDER BY {expression} {direction}, {spec['key']}"
+            params = params + params + [n]
+        else:
+            query = f"SELECT {spec['columns']} {source} ORDER BY {expression} {direction}, {spec['key']} LIMIT ?"
+            params = params + [n]
+
+        self.cursor.execute(query, params)
+        return tuple(self._ranked(entity, spec, data) for data in self.cursor.fetchall())
+
+    def _ranking_filters(self, entity: str, filters: dict):
+        """Helper method to turn top_n filters into SQL conditions and parameters."""
+        spec = RANKINGS[entity]
+        conditions, params = [], []
+        for column, value in filters.items():
+            if column not in spec["filters"]:
+                raise ValueError(f"Cannot filter {entity} rankings on {column!r}, expected one of {', '.join(spec['filters'])}")
+            if isinstance(value, (list, tuple, set, frozenset)):
+                conditions.append(f"{spec['table']}.{column} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                conditions.append(f"{spec['table']}.{column} = ?")
+                params.append(value)
+        return conditions or ["1"], params
+
+    def _top_n_streamed(self, spec: dict, metric, n: int, ascending: bool, conditions: list, params: list, with_ties: bool) -> tuple:
+        """Helper method to rank on a computed metric in one pass, keeping the best ``n`` rows in a heap and the rows tied with the n-th beside it."""
+        # Rows arrive in key order, so their position breaks ties by ascending key
+        query = f"SELECT {spec['columns']} FROM {spec['table']} WHERE {' AND '.join(conditions)} ORDER BY {spec['key']}"
+
+        # The heap keeps the worst of the best n on top; ranking ascending that is the largest
+        wrap, unwrap = (_Inverted, lambda wrapped: wrapped.entry) if ascending else (lambda entry: entry, lambda entry: entry)
+        heap, ties = [], []
+        for position, data in enumerate(database.iter_rows(self.conn.cursor(), query, params)):
+            item = spec["class"](*data)
+            value = metric(item)
+            if value is None:
+                continue
+            entry = wrap((value, position if ascending else -position, item))
+            if len(heap) < n:
+                heapq.heappush(heap, entry)
+                continue
+            if heap[0] < entry:
+                entry = heapq.heapreplace(heap, entry)
+            if with_ties:
+                # The n-th value only improves, so earlier ties stop counting once it moves
+                boundary = unwrap(heap[0])[0]
+                if ties and unwrap(ties[0])[0] != boundary:
+                    ties.clear()
+                if unwrap(entry)[0] == boundary:
+                    ties.append(entry)
+
+        best = sorted((unwrap(entry) for entry in heap + ties), reverse=not ascending)
+        return tuple(item for _, _, item in best)
+
+    def _ranked(self, entity: str, spec: dict, data: tuple):
+        """Helper method to build a ranked object, sharing ports and vessels through the identity map."""
+        if entity == "shipment":
+            return Shipment(*data)
+        return self._cached(entity, spec["class"], data)
+
+    @cached_result
     def longest_shipment(self) -> Shipment:
         """Find and return the shipment with the longest distance."""
-        self.cursor.execute("SELECT * FROM shipments ORDER BY distance_naut DESC LIMIT 1")
-        shipment_data = self.cursor.fetchone()
-        return Shipment(*shipment_data) if shipment_data else None
+        shipments = self.top_n("shipment", "distance_naut", 1)
+        return shipments[0] if shipments else None
 
+    @cached_result
     def longest_and_shortest_vessels(self) -> "tuple[Vessel, Vessel]":
         """Return the longest and shortest vessels by length."""
-        self.cursor.execute("SELECT * FROM vessels ORDER BY length DESC LIMIT 1")
-        longest_vessel_data = self.cursor.fetchone()
-        
-        self.cursor.execute("SELECT * FROM vessels ORDER BY length ASC LIMIT 1")
-        shortest_vessel_data = self.cursor.fetchone()
-        
-        longest_vessel = Vessel(*longest_vessel_data) if longest_vessel_data else None
-        shortest_vessel = Vessel(*shortest_vessel_data) if shortest_vessel_data else None
-
-        return (longest_vessel, shortest_vessel)
+        return self._extremes("vessel", "length")
 
+    @cached_result
     def widest_and_smallest_vessels(self) -> "tuple[Vessel, Vessel]":
         """Return the widest and smallest vessels by beam."""
-        self.cursor.execute("SELECT * FROM vessels ORDER BY beam DESC LIMIT 1")
-        widest_vessel_data = self.cursor.fetchone()
-        
-        self.cursor.execute("SELECT * FROM vessels ORDER BY beam ASC LIMIT 1")
-        smallest_vessel_data = self.cursor.fetchone()
-        
-        widest_vessel = Vessel(*widest_vessel_data) if widest_vessel_data else None
-        smallest_vessel = Vessel(*smallest_vessel_data) if smallest_vessel_data else None
+        return self._extremes("vessel", "beam")
 
-        return (widest_vessel, smallest_vessel)
+    def _extremes(self, entity: str, metric: str) -> tuple:
+        """Helper method to return the highest and the lowest ranking object, both read from either end of an index."""
+        highest = self.top_n(entity, metric, 1)
+        lowest = self.top_n(entity, metric, 1, ascending=True)
+        return (highest[0] if highest else None, lowest[0] if lowest else None)
 
+    @cached_result
     def vessels_with_the_most_shipments(self) -> "tuple[Vessel, ...]":
         """Find and return the vessels with the most shipments."""
-        self.cursor.execute("""
-            SELECT vessel, COUNT(*) as shipment_count
-            FROM shipments
-            GROUP BY vessel
-            ORDER BY shipment_count DESC
-        """)
-        vessel_data = self.cursor.fetchall()
-
-        if not vessel_data:
-            return tuple()
-
-        max_shipments = vessel_data[0][1]
-        vessels = [Vessel(*self.fetch_vessel_by_imo(data[0])) for data in vessel_data if data[1] == max_shipments]
-        
-        return tuple(vessels)
+        return self.top_n("vessel", "shipments", 1, with_ties=True)
 
+    @cached_result
     def ports_with_most_shipments(self) -> "tuple[Port, ...]":
         """Return the ports with the most shipments."""
-        self.cursor.execute("""
-            SELECT origin, COUNT(*) as shipment_count
-            FROM shipments
-            GROUP BY origin
-            ORDER BY shipment_count DESC, origin ASC
-        """)
-        port_data = self.cursor.fetchall()
-
-        if not port_data:
-            return tuple()
-
-        max_shipments = port_data[0][1]
-        ports = [Port(*self.fetch_port_by_id(data[0])) for data in port_data if data[1] == max_shipments]
-        
-        return tuple(ports)
+        return self.top_n("port", "shipments", 1, with_ties=True)
 
+    @cached_result
     def ports_with_first_shipment(self, vessel_type: str = None) -> "tuple[Port, ...]":
         """Return the ports with the first shipment, optionally filtered by vessel type."""
-        if vessel_type:
-            self.cursor.execute("""
-                SELECT origin, MIN(date)
-                FROM shipments
-                JOIN vessels ON shipments.vessel = vessels.imo
-                WHERE vessels.type = ?
-                GROUP BY origin
-                ORDER BY date ASC
-            """, (vessel_type,))
-        else:
-            self.cursor.execute("""
-                SELECT origin, MIN(date)
-                FROM shipments
-                GROUP BY origin
-                ORDER BY date ASC
-            """)
-        
-        port_data = self.cursor.fetchall()
-
-        if not port_data:
-            return tuple()
-
-        earliest_date = port_data[0][1]
-        ports = [Port(*self.fetch_port_by_id(data[0])) for data in port_data if data[1] == earliest_date]
-        
-        return tuple(ports)
+        return self._ports_with_extreme_date("MIN", "first_date", vessel_type)
 
+    @cached_result
     def ports_with_latest_shipment(self, vessel_type: str = None) -> "tuple[Port, ...]":
         """Return the ports with the latest shipment, optionally filtered by vessel type."""
+        return self._ports_with_extreme_date("MAX", "last_date", vessel_type)
+
+    def _ports_with_extreme_date(self, aggregate: str, column: str, vessel_type: str = None) -> "tuple[Port, ...]":
+        """Helper method to find the ports whose first or last shipment date is the overall extreme."""
         if vessel_type:
-            self.cursor.execute("""
-                SELECT origin, MAX(date)
-                FROM shipments
-                JOIN vessels ON shipments.vessel = vessels.imo
-                WHERE vessels.type = ?
-                GROUP BY origin
-                ORDER BY date DESC
-            """, (vessel_type,))
+            self.cursor.execute(f"""
+                SELECT ports.*
+                FROM port_type_shipment_stats
+                JOIN ports ON ports.id = port_type_shipment_stats.origin
+                WHERE vessel_type = ?
+                AND {column} = (SELECT {aggregate}({column}) FROM port_type_shipment_stats WHERE vessel_type = ?)
+                ORDER BY origin ASC
+            """, (vessel_type, vessel_type))
         else:
-            self.cursor.execute("""
-                SELECT origin, MAX(date)
-                FROM shipments
-                GROUP BY origin
-                ORDER BY date DESC
+            self.cursor.execute(f"""
+                SELECT ports.*
+                FROM port_shipment_stats
+                JOIN ports ON ports.id = port_shipment_stats.origin
+                WHERE {column} = (SELECT {aggregate}({column}) FROM port_shipment_stats)
+                ORDER BY origin ASC
             """)
+        return tuple(self._cached("port", Port, data) for data in self.cursor.fetchall())
+
+    def _cached(self, kind: str, cls, data: tuple):
+        """Helper method to reuse the identity map's object for a fetched row, brought up to date with the row."""
+        obj = self.identity_map.get(kind, data[0])
+        if obj is None:
+            return self.identity_map.add(kind, data[0], cls(*data))
+        # The row may have changed since the object was cached
+        for field, value in zip(cls.__slots__, data):
+            setattr(obj, field, value)
+        return obj
+
+    @cached_result
+    def vessels_that_docked_port_between(self, port: Port, start: date, end: date, to_csv: bool = False,
+                                         output=None, output_dir: str = None, compress: bool = False) -> "tuple[Vessel, ...]":
+        """Find vessels that departed from or arrived at a port between two dates and optionally export to CSV.
+
+        Arrivals count on the day the voyage ends, date plus duration. The
+        export is streamed to ``output`` (a path or file-like object), or
+        to a generated file in ``output_dir``; its stats end up in ``last_export``.
+        """
+        query, params = self._docked_query(port, start, end)
 
-        port_data = self.cursor.fetchall()
-
-        if not port_data:
+        if to_csv:
+            filename = safe_filename("vessels_docking", port.id, start.isoformat(), end.isoformat(), compress=compress)
+            self.last_export = self.export_to_csv(self.conn.execute(query, params), output or filename, VESSEL_FIELDS, compress, output_dir)
             return tuple()
 
-        latest_date = port_data[0][1]
-        ports = [Port(*self.fetch_port_by_id(data[0])) for data in port_data if data[1] == latest_date]
-        
-        # Reverse the order to match the expected output order
-        ports.reverse()
-
-        return tuple(ports)
-
-    def vessels_that_docked_port_between(self, port: Port, start: date, end: date, to_csv: bool = False) -> "tuple[Vessel, ...]":
-        """Find vessels that docked at a specific port between two dates and optionally export to CSV."""
-        start_date = start.strftime("%Y-%m-%d")
-        end_date = end.strftime("%Y-%m-%d")
-
+        self.cursor.execute(query, params)
+        return tuple(Vessel(*vessel) for vessel in self.cursor.fetchall())
+
+    @cached_result
+    def vessels_in_port_at(self, port: Port, moment: datetime) -> "tuple[Vessel, ...]":
+        """Return the vessels whose last departure or arrival before ``moment`` was an arrival at the port.
+
+        One index seek per vessel finds its latest event, so the cost follows
+        the size of the fleet rather than the length of the port's history.
+        """
+        self.cursor.execute(f"""
+            SELECT * FROM vessels
+            WHERE imo IN (SELECT vessel FROM ({IN_PORT_QUERY}))
+            ORDER BY imo
+        """, (moment.strftime("%Y-%m-%d %H:%M:%S"), port.id))
+        return tuple(self._cached("vessel", Vessel, data) for data in self.cursor.fetchall())
+
+    @cached_result
+    def port_occupancy(self, port: Port, start: date, end: date) -> "tuple[tuple[str, int], ...]":
+        """Return (day, vessels) for every day between two dates: the number of vessels in port at some time that day.
+
+        A vessel is in port from its arrival until its next departure or
+        arrival anywhere, as in vessels_in_port_at.
+        """
+        window_start, window_end = self._window(start, end)
+        stays = set(self.conn.execute(f"""
+            SELECT vessel, time, (SELECT MIN(time) FROM port_visits WHERE vessel = in_port.vessel AND time > in_port.time)
+            FROM ({IN_PORT_QUERY}) AS in_port
+        """, (window_start, port.id)))
+        stays.update(self.conn.execute("""
+            SELECT vessel, time, (SELECT MIN(time) FROM port_visits AS later WHERE later.vessel = arrival.vessel AND later.time > arrival.time)
+            FROM port_visits AS arrival
+            WHERE port = ? AND kind = 'arrival' AND time >= ? AND time < ?
+        """, (port.id, window_start, window_end)))
+
+        days = (end - start).days + 1
+        vessels = [set() for _ in range(days)]
+        for vessel, arrival, left in stays:
+            first = max((date.fromisoformat(arrival[:10]) - start).days, 0)
+            if left is None or left >= window_end:
+                last = days - 1
+            else:
+                # A vessel leaving at midnight was not in port that day
+                last = (date.fromisoformat(left[:10]) - start).days - (left[11:] == "00:00:00")
+            for day in range(first, last + 1):
+                vessels[day].add(vessel)
+        return tuple(((start + timedelta(days=day)).isoformat(), len(in_port)) for day, in_port in enumerate(vessels))
+
+    @cached_result
+    def port_traffic(self, port: Port, start: date, end: date) -> "tuple[tuple[str, int, int], ...]":
+        """Return (day, arrivals, departures) for every day between two dates with traffic at the port."""
         self.cursor.execute("""
-            SELECT DISTINCT vessels.*
-            FROM shipments
-            JOIN vessels ON shipments.vessel = vessels.imo
-            WHERE (origin = ? OR destination = ?)
-            AND date BETWEEN ? AND ?
-            ORDER BY vessels.imo  -- Ensure ordering by IMO number
-        """, (port.id, port.id, start_date, end_date))
-        
-        vessels_data = self.cursor.fetchall()
+            SELECT substr(time, 1, 10) AS day, SUM(kind = 'arrival'), SUM(kind = 'departure')
+            FROM port_visits
+            WHERE port = ? AND time >= ? AND time < ?
+            GROUP BY day
+            ORDER BY day
+        """, (port.id, *self._window(start, end)))
+        return tuple(self.cursor.fetchall())
+
+    @cached_result
+    def time_series(self, dimension: str, start: date, end: date, key=None,
+                    grain: str = "month") -> "tuple[tuple[str, str, int, float, float, float], ...]":
+        """Return (bucket, key, shipments, cargo_weight, distance_naut, fuel) for every bucket between two dates.
+
+        Reads the rollups (see rollups.py) instead of the shipments. ``dimension``
+        is "port", "vessel_type" or "vessel_country"; ``key`` limits the series to
+        one port (a Port or its ID), type or country. The bucket holding ``start``
+        is included, so weeks and months are always whole.
+        """
+        if dimension not in rollups.DIMENSIONS:
+            raise ValueError(f"Unsupported dimension {dimension!r}, expected one of {', '.join(rollups.DIMENSIONS)}")
+        params = [grain, dimension, rollups.bucket_of(start, grain).isoformat(), end.isoformat()]
+        where = "grain = ? AND dimension = ? AND bucket >= ? AND bucket <= ?"
+        if key is not None:
+            where += " AND key = ?"
+            params.append(getattr(key, "id", key))
+        self.cursor.execute(f"""
+            SELECT bucket, key, shipments, {', '.join(rollups.MEASURES)}
+            FROM shipment_rollups
+            WHERE {where}
+            ORDER BY bucket, key
+        """, params)
+        return tuple(self.cursor.fetchall())
+
+    @cached_result
+    def search_ports(self, text: str, limit: int = 10, fuzzy: bool = True) -> "tuple[Port, ...]":
+        """Find ports by id, name, city or province for type-ahead search, best match first (see search.search)."""
+        return tuple(self._cached("port", Port, data) for data in search.search(self.cursor, "port", text, limit, fuzzy))
+
+    @cached_result
+    def search_vessels(self, text: str, limit: int = 10, fuzzy: bool = True) -> "tuple[Vessel, ...]":
+        """Find vessels by name or MMSI for type-ahead search, best match first (see search.search)."""
+        return tuple(self._cached("vessel", Vessel, data) for data in search.search(self.cursor, "vessel", text, limit, fuzzy))
+
+    @cached_result
+    def ports_in_country(self, country: str, to_csv: bool = False,
+                         output=None, output_dir: str = None, compress: bool = False) -> "tuple[Port, ...]":
+        """Find ports located in a specific country and optionally export to CSV (see vessels_that_docked_port_between)."""
+        query, params = self._ports_in_country_query(country)
 
         if to_csv:
-            csv_filename = f"Vessels docking Port {port.id} between {start_date} and {end_date}.csv"
-            self.export_to_csv(vessels_data, csv_filename, ["imo", "mmsi", "name", "country", "type", "build", "gross", "netto", "length", "beam"])
+            filename = safe_filename("ports_in_country", country, compress=compress)
+            self.last_export = self.export_to_csv(self.conn.execute(query, params), output or filename, PORT_FIELDS, compress, output_dir)
             return tuple()
 
-        return tuple(Vessel(*vessel) for vessel in vessels_data)
+        self.cursor.execute(query, params)
+        return tuple(Port(*port) for port in self.cursor.fetchall())
 
-    def ports_in_country(self, country: str, to_csv: bool = False) -> "tuple[Port, ...]":
-        """Find ports located in a specific country and optionally export to CSV."""
-        self.cursor.execute("SELECT * FROM ports WHERE country = ? ORDER BY id", (country,))
-        ports_data = self.cursor.fetchall()
+    @cached_result
+    def vessels_from_country(self, country: str, to_csv: bool = False,
+                             output=None, output_dir: str = None, compress: bool = False) -> "tuple[Vessel, ...]":
+        """Find vessels from a specific country and optionally export to CSV (see vessels_that_docked_port_between)."""
+        query, params = self._vessels_from_country_query(country)
 
         if to_csv:
-            csv_filename = f"Ports in country {country}.csv"
-            self.export_to_csv(ports_data, csv_filename, ["id", "code", "name", "city", "province", "country"])
+            filename = safe_filename("vessels_from_country", country, compress=compress)
+            self.last_export = self.export_to_csv(self.conn.execute(query, params), output or filename, VESSEL_FIELDS, compress, output_dir)
             return tuple()
 
-        return tuple(Port(*port) for port in ports_data)
-
-    def vessels_from_country(self, country: str, to_csv: bool = False) -> "tuple[Vessel, ...]":
-        """Find vessels from a specific country and optionally export to CSV."""
-        self.cursor.execute("SELECT * FROM vessels WHERE country = ?", (country,))
-        vessels_data = self.cursor.fetchall()
+        self.cursor.execute(query, params)
+        return tuple(Vessel(*vessel) for vessel in self.cursor.fetchall())
+
+    def iter_vessels_that_docked_port_between(self, port: Port, start: date, end: date, chunk_size: int = database.CHUNK_SIZE, after: int = None):
+        """Stream the vessels that docked at a port between two dates, ordered by IMO and starting after the IMO `after`."""
+        query, params = self._docked_query(port, start, end, after)
+        for vessel in database.iter_rows(self.conn.cursor(), query, params, chunk_size):
+            yield Vessel(*vessel)
+
+    def iter_ports_in_country(self, country: str, chunk_size: int = database.CHUNK_SIZE, after: str = None):
+        """Stream the ports in a country, ordered by id and starting after the id `after`."""
+        query, params = self._ports_in_country_query(country, after)
+        for port in database.iter_rows(self.conn.cursor(), query, params, chunk_size):
+            yield Port(*port)
+
+    def iter_vessels_from_country(self, country: str, chunk_size: int = database.CHUNK_SIZE, after: int = None):
+        """Stream the vessels from a country, ordered by IMO and starting after the IMO `after`."""
+        query, params = self._vessels_from_country_query(country, after)
+        for vessel in database.iter_rows(self.conn.cursor(), query, params, chunk_size):
+            yield Vessel(*vessel)
+
+    def _docked_query(self, port: Port, start: date, end: date, after: int = None, limit: int = None):
+        """Helper method to build the docking query on the port visit timeline, ordered by IMO number."""
+        return database.keyset_query("SELECT * FROM vessels", "imo", after, limit,
+            where="imo IN (SELECT vessel FROM port_visits WHERE port = ? AND time >= ? AND time < ?)",
+            params=(port.id, *self._window(start, end)))
+
+    def _window(self, start: date, end: date) -> "tuple[str, str]":
+        """Helper method to turn an inclusive range of days into bounds on the visit times."""
+        return start.strftime("%Y-%m-%d"), (end + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    def _ports_in_country_query(self, country: str, after: str = None, limit: int = None):
+        """Helper method to build the ports-in-country query, ordered by ID."""
+        return database.keyset_query("SELECT * FROM ports", "id", after, limit, where="country = ?", params=(country,))
+
+    def _vessels_from_country_query(self, country: str, after: int = None, limit: int = None):
+        """Helper method to build the vessels-from-country query, ordered by IMO number."""
+        return database.keyset_query("SELECT * FROM vessels", "imo", after, limit, where="country = ?", params=(country,))
 
-        if to_csv:
-            csv_filename = f"Vessels from country {country}.csv"
-            self.export_to_csv(vessels_data, csv_filename, ["imo", "mmsi", "name", "country", "type", "build", "gross", "netto", "length", "beam"])
-            return tuple()
-
-        return tuple(Vessel(*vessel) for vessel in vessels_data)
-    
     def fetch_vessel_by_imo(self, imo: int):
         """Helper method to fetch vessel details by IMO number."""
         self.cursor.execute("SELECT * FROM vessels WHERE imo = ?", (imo,))
@@ -204,14 +644,55 @@ class Reporter:
         self.cursor.execute("SELECT * FROM ports WHERE id = ?", (port_id,))
         return self.cursor.fetchone()
 
-    def export_to_csv(self, data: list, filename: str, fieldnames: list):
-        """Export data to a CSV file."""
-        with open(filename, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in data:
-                writer.writerow(dict(zip(fieldnames, row)))
+    def export_to_csv(self, data, filename, fieldnames: list, compress: bool = False,
+                      output_dir: str = None, chunk_size: int = EXPORT_CHUNK_SIZE) -> ExportStats:
+        """Stream rows to a CSV file and return how many rows and bytes were written.
+
+        ``data`` can be a cursor, which is read with fetchmany, or any iterable
+        of rows. ``filename`` is a path (joined to ``output_dir`` if given) or a
+        file-like object; with ``compress`` the output is gzipped, which needs
+        a binary file-like object.
+        """
+        started = time.perf_counter()
+        if hasattr(data, "fetchmany"):
+            chunks = iter(lambda: data.fetchmany(chunk_size), [])
+        else:
+            rows = iter(data)
+            chunks = iter(lambda: list(itertools.islice(rows, chunk_size)), [])
+
+        is_path = isinstance(filename, (str, os.PathLike))
+        if is_path and output_dir:
+            filename = os.path.join(output_dir, filename)
+        sink = open(filename, "wb") if is_path else filename
+
+        try:
+            if isinstance(sink, io.TextIOBase):
+                if compress:
+                    raise ValueError("Compressed CSV export needs a binary target")
+                counter = stream = _CountingTextWriter(sink)
+            else:
+                counter = _CountingWriter(sink)
+                binary = gzip.GzipFile(fileobj=counter, mode="wb") if compress else io.BufferedWriter(counter)
+                stream = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+
+            writer = csv.writer(stream)
+            writer.writerow(fieldnames)
+            row_count = 0
+            for chunk in chunks:
+                writer.writerows(chunk)
+                row_count += len(chunk)
+
+            if stream is not counter:
+                # Closing the wrappers flushes them without closing the target
+                stream.close()
+        finally:
+            if is_path:
+                sink.close()
+
+        return ExportStats(filename, row_count, counter.bytes, time.perf_counter() - started)
 
     def __del__(self):
-        """Ensure the database connection is closed."""
-        self.conn.close()
\ No newline at end of file
+        """Ensure the database connections are closed."""
+        # A subclass may fail before Reporter.__init__ ran at all
+        if hasattr(self, "_lock"):
+            self.close()
\ No newline at end of file
@@ -0,0 +1,268 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+import numpy as np
+import database
+
+# File layout: MAGIC, the header length as a little-endian uint64, the JSON
+# header, then every column block aligned to 8 bytes. Numbers are fixed-width
+# little-endian columns; strings are int32 codes into a per-column dictionary
+# stored as int64 offsets followed by the UTF-8 bytes.
+MAGIC = b"SHIPSNP1"
+ALIGNMENT = 8
+
+# Rows pulled from the cursor at a time while writing
+FETCH_SIZE = 50000
+
+# Per table the query, in a stable order, and the kind of every column
+TABLES = {
+    "ports": ("SELECT id, code, name, city, province, country FROM ports ORDER BY id", {
+        "id": "string", "code": "int", "name": "string", "city": "string", "province": "string", "country": "string",
+    }),
+    "vessels": ("SELECT imo, mmsi, name, country, type, build, gross, netto, length, beam FROM vessels ORDER BY imo", {
+        "imo": "int", "mmsi": "int", "name": "string", "country": "string", "type": "string",
+        "build": "int", "gross": "int", "netto": "int", "length": "int", "beam": "int",
+    }),
+    "shipments": ("""
+        SELECT id, date, date_iso, cargo_weight, distance_naut, duration_hours, average_speed, origin, destination, vessel
+        FROM shipments ORDER BY rowid""", {
+        "id": "string", "date": "string", "date_iso": "string", "cargo_weight": "int", "distance_naut": "float", "duration_hours": "float",
+        "average_speed": "float", "origin": "string", "destination": "string", "vessel": "int",
+    }),
+}
+
+DTYPES = {"int": "<i8", "float": "<f8", "string": "<i4"}
+
+
+def database_token(database_path: str = None) -> list:
+    """Fingerprint of the database files that changes with every committed write.
+
+    Combines the size and modification time of the database and its WAL file
+    with the change counter SQLite keeps in the database header.
+    """
+    path = database_path or database.get_database_path()
+    stat = os.stat(path)
+    with open(path, "rb") as file:
+        file.seek(24)
+        counter = struct.unpack(">I", file.read(4) or b"\0\0\0\0")[0]
+    try:
+        wal = os.stat(path + "-wal")
+        wal_state = [wal.st_size, wal.st_mtime_ns]
+    except FileNotFoundError:
+        wal_state = [0, 0]
+    return [stat.st_size, stat.st_mtime_ns, counter] + wal_state
+
+
+class _ColumnBuilder:
+    # Collects one column while the rows stream by
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.values = array("q") if kind == "int" else array("d") if kind == "float" else array("i")
+        self.nulls = bytearray()
+        self.has_nulls = False
+        self.dictionary = {}
+
+    def append(self, value):
+        if value is None:
+            self.has_nulls = True
+        if self.kind == "string":
+            code = -1 if value is None else self.dictionary.setdefault(value, len(self.dictionary))
+            self.values.append(code)
+        elif self.kind == "float":
+            self.values.append(float("nan") if value is None else value)
+        else:
+            self.nulls.append(value is None)
+            self.values.append(0 if value is None else value)
+
+    def blocks(self) -> dict:
+        """Return the byte blocks of the column by name: values, and nulls or the dictionary when needed."""
+        blocks = {"values": self.values.tobytes()}
+        if self.kind == "int" and self.has_nulls:
+            blocks["nulls"] = bytes(self.nulls)
+        if self.kind == "string":
+            encoded = [value.encode("utf-8") for value in self.dictionary]
+            offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            blocks["dictionary_offsets"] = offsets.tobytes()
+            blocks["dictionary_data"] = b"".join(encoded)
+        return blocks
+
+
+def write_snapshot(path: str, database_path: str = None, fetch_size: int = FETCH_SIZE) -> dict:
+    """Export the ports, vessels and shipments tables to a columnar snapshot file; returns its header."""
+    database_path = database_path or database.get_database_path()
+    # Taken before reading, so a write during the export leaves the snapshot stale rather than wrong
+    header = {"token": database_token(database_path), "tables": {}}
+    conn = database.connect_readonly(database_path)
+    blocks = []
+    try:
+        conn.execute("BEGIN")
+        for table, (query, kinds) in TABLES.items():
+            builders = {name: _ColumnBuilder(kind) for name, kind in kinds.items()}
+            ordered = list(builders.values())
+            cursor = conn.execute(query)
+            rows = 0
+            while True:
+                chunk = cursor.fetchmany(fetch_size)
+                if not chunk:
+                    break
+                rows += len(chunk)
+                for row in chunk:
+                    for builder, value in zip(ordered, row):
+                        builder.append(value)
+
+            columns = {}
+            for name, builder in builders.items():
+                columns[name] = {"kind": builder.kind, "blocks": {}}
+                for block, data in builder.blocks().items():
+                    columns[name]["blocks"][block] = len(blocks)
+                    blocks.append(data)
+                if builder.kind == "string":
+                    columns[name]["dictionary_size"] = len(builder.dictionary)
+            header["tables"][table] = {"rows": rows, "columns": columns}
+    finally:
+        conn.close()
+
+    # Block numbers become (offset, size) now that the header size is known
+    def layout(start: int) -> int:
+        offset = start
+        for table in header["tables"].values():
+            for column in table["columns"].values():
+                for block, index in list(column["blocks"].items()):
+                    number = index if isinstance(index, int) else index[2]
+                    column["blocks"][block] = [offset, len(blocks[number]), number]
+                    offset = _aligned(offset + len(blocks[number]))
+        return offset
+
+    header_size = 0
+    while True:
+        layout(_aligned(len(MAGIC) + 8 + header_size))
+        encoded = json.dumps(header).encode("utf-8")
+        if len(encoded) <= header_size:
+            break
+        header_size = _aligned(len(encoded) + 64)
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(MAGIC + struct.pack("<Q", header_size) + encoded.ljust(header_size, b" "))
+        for table in header["tables"].values():
+            for column in table["columns"].values():
+                for offset, size, number in column["blocks"].values():
+                    file.seek(offset)
+                    file.write(blocks[number])
+        file.truncate(_aligned(file.tell()))
+    os.replace(temporary, path)
+    return header
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class Snapshot:
+    def __init__(self, path: str):
+        # Column views point straight into the mapping; nothing is copied until a string column is decoded
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a shipments snapshot")
+        header_size = struct.unpack_from("<Q", self._mmap, len(MAGIC))[0]
+        start = len(MAGIC) + 8
+        self.header = json.loads(bytes(self._mmap[start:start + header_size]))
+        self.token = self.header["token"]
+        self._dictionaries = {}
+
+    def tables(self) -> list:
+        return list(self.header["tables"])
+
+    def rows(self, table: str) -> int:
+        return self.header["tables"][table]["rows"]
+
+    def columns(self, table: str) -> list:
+        return list(self.header["tables"][table]["columns"])
+
+    def _block(self, table: str, name: str, block: str, dtype, count: int = None) -> np.ndarray:
+        offset, size, _ = self.header["tables"][table]["columns"][name]["blocks"][block]
+        dtype = np.dtype(dtype)
+        return np.frombuffer(self._mmap, dtype=dtype, count=size // dtype.itemsize if count is None else count, offset=offset)
+
+    def column(self, table: str, name: str) -> np.ndarray:
+        """Zero-copy, read-only view of a column: the values of a number column, the codes of a string column."""
+        column = self.header["tables"][table]["columns"][name]
+        return self._block(table, name, "values", DTYPES[column["kind"]])
+
+    def nulls(self, table: str, name: str) -> np.ndarray:
+        """Boolean mask of the NULLs in a column, or None when it has none.
+
+        Float columns hold NULL as NaN and string columns as code -1.
+        """
+        column = self.header["tables"][table]["columns"][name]
+        if "nulls" in column["blocks"]:
+            return self._block(table, name, "nulls", np.bool_)
+        if column["kind"] == "string":
+            codes = self.column(table, name)
+            return codes < 0 if (codes < 0).any() else None
+        return None
+
+    def dictionary(self, table: str, name: str) -> np.ndarray:
+        """The distinct values of a string column as an object array, indexed by code."""
+        key = (table, name)
+        if key not in self._dictionaries:
+            offsets = self._block(table, name, "dictionary_offsets", "<i8")
+            data_offset, size, _ = self.header["tables"][table]["columns"][name]["blocks"]["dictionary_data"]
+            data = self._mmap[data_offset:data_offset + size]
+            values = np.empty(len(offsets) - 1, dtype=object)
+            values[:] = [data[start:end].decode("utf-8") for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+            self._dictionaries[key] = values
+        return self._dictionaries[key]
+
+    def strings(self, table: str, name: str) -> np.ndarray:
+        """Decode a string column to an object array, with None for NULL."""
+        # Code -1 picks the None appended after the last entry
+        lookup = np.append(self.dictionary(table, name), None)
+        return lookup[self.column(table, name)]
+
+    def is_current(self, database_path: str = None) -> bool:
+        """Whether the database is unchanged since the snapshot was written, with the columns TABLES has now."""
+        columns = {table: list(kinds) for table, (_, kinds) in TABLES.items()}
+        return columns == {table: self.columns(table) for table in self.tables()} and self.token == database_token(database_path)
+
+    def close(self):
+        """Release the mapping; views that are still referenced keep it alive until they are dropped."""
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self) -> str:
+        tables = ", ".join(f"{table}={self.rows(table)}" for table in self.tables())
+        return f"{type(self).__name__}(path={self.path}, {tables})"
+
+
+def open_snapshot(path: str, database_path: str = None, rebuild: bool = True) -> Snapshot:
+    """Map the snapshot at ``path``, first (re)writing it if it is missing or the database changed.
+
+    Without ``rebuild`` a missing or stale snapshot raises RuntimeError.
+    """
+    if os.path.exists(path):
+        snapshot = Snapshot(path)
+        if snapshot.is_current(database_path):
+            return snapshot
+        snapshot.close()
+        if not rebuild:
+            raise RuntimeError(f"Snapshot {path} is stale")
+    elif not rebuild:
+        raise RuntimeError(f"Snapshot {path} does not exist")
+
+    write_snapshot(path, database_path)
+    return Snapshot(path)
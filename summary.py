@@ -0,0 +1,172 @@
+from dates import NOT_FILLING_IN_SQL, row_date_sql
+
+# Per-vessel shipment counts, per-origin-port counts with first and last
+# shipment dates, and the same per origin port and vessel type. Triggers on
+# shipments and vessels keep them current for every writer.
+
+TABLES = ("vessel_shipment_stats", "port_shipment_stats", "port_type_shipment_stats")
+TRIGGERS = ("shipments_stats_insert", "shipments_stats_delete", "shipments_stats_update", "vessels_stats_type")
+
+
+def _extreme(function: str, column: str) -> str:
+    # The scalar MIN and MAX are NULL when either side is, unlike the aggregates rebuild uses
+    return f"COALESCE({function}({column}, excluded.{column}), {column}, excluded.{column})"
+
+
+def _add_sql(row: str) -> str:
+    """Statements that count one shipment, referenced as ``row`` (NEW or OLD)."""
+    date = row_date_sql(row)
+    return f"""
+        INSERT INTO vessel_shipment_stats (vessel, shipments) VALUES ({row}.vessel, 1)
+        ON CONFLICT (vessel) DO UPDATE SET shipments = shipments + 1;
+
+        INSERT INTO port_shipment_stats (origin, shipments, first_date, last_date)
+        VALUES ({row}.origin, 1, {date}, {date})
+        ON CONFLICT (origin) DO UPDATE SET
+            shipments = shipments + 1,
+            first_date = {_extreme("MIN", "first_date")},
+            last_date = {_extreme("MAX", "last_date")};
+
+        INSERT INTO port_type_shipment_stats (origin, vessel_type, shipments, first_date, last_date)
+        SELECT {row}.origin, type, 1, {date}, {date} FROM vessels WHERE imo = {row}.vessel AND type IS NOT NULL
+        ON CONFLICT (origin, vessel_type) DO UPDATE SET
+            shipments = shipments + 1,
+            first_date = {_extreme("MIN", "first_date")},
+            last_date = {_extreme("MAX", "last_date")};
+    """
+
+
+def _remove_sql(row: str) -> str:
+    """Statements that uncount one shipment; first and last dates are recomputed through the origin index."""
+    return f"""
+        UPDATE vessel_shipment_stats SET shipments = shipments - 1 WHERE vessel = {row}.vessel;
+        DELETE FROM vessel_shipment_stats WHERE vessel = {row}.vessel AND shipments <= 0;
+
+        UPDATE port_shipment_stats SET
+            shipments = shipments - 1,
+            first_date = (SELECT MIN(date_iso) FROM shipments WHERE origin = {row}.origin),
+            last_date = (SELECT MAX(date_iso) FROM shipments WHERE origin = {row}.origin)
+        WHERE origin = {row}.origin;
+        DELETE FROM port_shipment_stats WHERE origin = {row}.origin AND shipments <= 0;
+
+        UPDATE port_type_shipment_stats SET
+            shipments = shipments - 1,
+            first_date = (SELECT MIN(s.date_iso) FROM shipments s JOIN vessels v ON s.vessel = v.imo
+                          WHERE s.origin = {row}.origin AND v.type = port_type_shipment_stats.vessel_type),
+            last_date = (SELECT MAX(s.date_iso) FROM shipments s JOIN vessels v ON s.vessel = v.imo
+                         WHERE s.origin = {row}.origin AND v.type = port_type_shipment_stats.vessel_type)
+        WHERE origin = {row}.origin AND vessel_type = (SELECT type FROM vessels WHERE imo = {row}.vessel);
+        DELETE FROM port_type_shipment_stats WHERE origin = {row}.origin AND shipments <= 0;
+    """
+
+
+def _rebuild_port_types_sql(where: str) -> str:
+    """Statements that recompute the per-type stats of the (origin, vessel_type) pairs matching ``where``."""
+    return f"""
+        DELETE FROM port_type_shipment_stats WHERE {where.format(origin='origin', type='vessel_type')};
+        INSERT INTO port_type_shipment_stats (origin, vessel_type, shipments, first_date, last_date)
+        SELECT s.origin, v.type, COUNT(*), MIN(s.date_iso), MAX(s.date_iso)
+        FROM shipments s JOIN vessels v ON s.vessel = v.imo
+        WHERE v.type IS NOT NULL AND {where.format(origin='s.origin', type='v.type')}
+        GROUP BY s.origin, v.type;
+    """
+
+
+def create_summary_tables(cursor):
+    """Version 3: summary tables for the Reporter rankings, backfilled and kept current by triggers."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vessel_shipment_stats (
+            vessel INTEGER PRIMARY KEY,
+            shipments INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS port_shipment_stats (
+            origin TEXT PRIMARY KEY,
+            shipments INTEGER NOT NULL,
+            first_date TEXT,
+            last_date TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS port_type_shipment_stats (
+            origin TEXT NOT NULL,
+            vessel_type TEXT NOT NULL,
+            shipments INTEGER NOT NULL,
+            first_date TEXT,
+            last_date TEXT,
+            PRIMARY KEY (origin, vessel_type)
+        )
+    """)
+
+    # The rankings read the extreme value of each of these and then the rows equal to it
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vessel_shipment_stats_shipments ON vessel_shipment_stats (shipments)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_port_shipment_stats_shipments ON port_shipment_stats (shipments)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_port_shipment_stats_first ON port_shipment_stats (first_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_port_shipment_stats_last ON port_shipment_stats (last_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_port_type_shipment_stats_first ON port_type_shipment_stats (vessel_type, first_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_port_type_shipment_stats_last ON port_type_shipment_stats (vessel_type, last_date)")
+
+    rebuild(cursor)
+    create_triggers(cursor)
+
+
+def keep_dates_past_nulls(cursor):
+    """Version 12: keep the first and last dates when a shipment without a date is counted, and repair them."""
+    drop_triggers(cursor)
+    create_triggers(cursor)
+    rebuild(cursor)
+
+
+def rebuild(cursor):
+    """Recompute every summary table from the shipments in one pass each."""
+    for table in TABLES:
+        cursor.execute(f"DELETE FROM {table}")
+    cursor.execute("""
+        INSERT INTO vessel_shipment_stats (vessel, shipments)
+        SELECT vessel, COUNT(*) FROM shipments GROUP BY vessel
+    """)
+    cursor.execute("""
+        INSERT INTO port_shipment_stats (origin, shipments, first_date, last_date)
+        SELECT origin, COUNT(*), MIN(date_iso), MAX(date_iso) FROM shipments GROUP BY origin
+    """)
+    cursor.execute("""
+        INSERT INTO port_type_shipment_stats (origin, vessel_type, shipments, first_date, last_date)
+        SELECT s.origin, v.type, COUNT(*), MIN(s.date_iso), MAX(s.date_iso)
+        FROM shipments s JOIN vessels v ON s.vessel = v.imo
+        WHERE v.type IS NOT NULL
+        GROUP BY s.origin, v.type
+    """)
+
+
+def create_triggers(cursor):
+    """Create the triggers that keep the summary tables current."""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS shipments_stats_insert AFTER INSERT ON shipments
+        BEGIN {_add_sql("NEW")} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS shipments_stats_delete AFTER DELETE ON shipments
+        BEGIN {_remove_sql("OLD")} END
+    """)
+
+    # Filling in a missing date_iso is not a change the stats need to see
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS shipments_stats_update AFTER UPDATE OF origin, vessel, date, date_iso ON shipments
+        WHEN {NOT_FILLING_IN_SQL}
+        BEGIN {_remove_sql("OLD")} {_add_sql("NEW")} END
+    """)
+
+    # A vessel changing type moves its shipments between per-type rows
+    where = ("{type} IN (OLD.type, NEW.type) AND {origin} IN (SELECT origin FROM shipments WHERE vessel = NEW.imo)")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS vessels_stats_type AFTER UPDATE OF type ON vessels
+        WHEN OLD.type IS NOT NEW.type
+        BEGIN {_rebuild_port_types_sql(where)} END
+    """)
+
+
+def drop_triggers(cursor):
+    """Drop the maintenance triggers; see schema.bulk_load."""
+    for trigger in TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
@@ -0,0 +1,112 @@
+import json
+import random
+import uuid
+from datetime import date, timedelta
+from vessel import EFFICIENCY_VALUES
+
+# Port countries with the two-letter prefix of their port ids
+PORT_COUNTRIES = {
+    "China": "CN", "Netherlands": "NL", "Turkey": "TR", "Malaysia": "MY", "United States": "US",
+    "Brazil": "BR", "India": "IN", "Germany": "DE", "Spain": "ES", "Japan": "JP", "Egypt": "EG", "Australia": "AU",
+}
+
+# Flag states, the first ones far more common than the rest as in the real feed
+VESSEL_COUNTRIES = ["Panama", "Hong Kong", "Philippines", "Antigua & Barbuda", "Denmark", "India",
+                    "Tanzania", "Sweden", "Ireland", "Comoros", "Spain"]
+
+VESSEL_TYPES = sorted(EFFICIENCY_VALUES)
+
+# Shipment dates are spread evenly over these four years
+FIRST_DATE = date(2021, 1, 1)
+DAYS = 4 * 365 + 1
+
+ENTRY_FORMAT = ('{{"date": "{}", "tracking_number": "{}", "cargo_weight": {}, "distance_naut": {}, '
+                '"duration_hours": {}, "average_speed": {}, "origin": {}, "destination": {}, "vessel": {}}}')
+
+
+def _skewed(rng: random.Random, size: int) -> int:
+    # Low indexes are picked far more often, so some ports and vessels are busy and most are quiet
+    return int(size * rng.random() ** 2)
+
+
+def make_ports(rng: random.Random, count: int) -> list:
+    countries = list(PORT_COUNTRIES)
+    ports = []
+    for index in range(count):
+        country = countries[index % len(countries)]
+        number = index // len(countries)
+        letters = "".join(chr(65 + (number // 26 ** power) % 26) for power in (2, 1, 0))
+        name = f"Port {letters.title()} {index}"
+        ports.append({"id": PORT_COUNTRIES[country] + letters, "code": 10000 + index, "name": name, "alias": None,
+                      "city": name, "province": f"Province {index % 40}", "country": country})
+    return ports
+
+
+def make_vessels(rng: random.Random, count: int) -> list:
+    vessels = []
+    for index in range(count):
+        length = rng.randint(14, 400)
+        vessels.append({
+            "imo": 9000000 + index,
+            "mmsi": None if rng.random() < 0.15 else 200000000 + index,
+            "country": VESSEL_COUNTRIES[_skewed(rng, len(VESSEL_COUNTRIES))],
+            "name": f"SYNTHETIC {index}",
+            "type": rng.choice(VESSEL_TYPES),
+            "build": rng.randint(1990, 2024),
+            "gross": rng.randint(1000, 200000),
+            "netto": rng.randint(1000, 200000),
+            "size": f"{length} / {max(5, length // 7)}",
+        })
+    return vessels
+
+
+def generate(shipments: int, seed: int = 0):
+    """Return the ports, the vessels and an iterator of shipment records for a synthetic feed.
+
+    The same ``shipments`` and ``seed`` always give the same feed. Records are
+    tuples of the scalar shipment fields followed by the origin, destination
+    and vessel indexes into the ports and vessels lists.
+    """
+    rng = random.Random(seed)
+    ports = make_ports(rng, min(5000, max(50, shipments // 200)))
+    vessels = make_vessels(rng, min(50000, max(100, shipments // 20)))
+
+    def records():
+        for _ in range(shipments):
+            day = FIRST_DATE + timedelta(days=rng.randrange(DAYS))
+            distance = round(rng.uniform(50, 15000), 3)
+            speed = round(rng.uniform(5, 20), 1)
+            origin = _skewed(rng, len(ports))
+            destination = (origin + 1 + rng.randrange(len(ports) - 1)) % len(ports)
+            yield (day.strftime("%d-%m-%Y"), str(uuid.UUID(int=rng.getrandbits(128), version=4)).upper(),
+                   rng.randint(500, 200000), distance, round(distance / speed, 3), speed,
+                   origin, destination, _skewed(rng, len(vessels)))
+
+    return ports, vessels, records()
+
+
+def iter_entries(shipments: int, seed: int = 0):
+    """Yield the synthetic feed as entries shaped like those in shipments.json."""
+    ports, vessels, records = generate(shipments, seed)
+    for *fields, origin, destination, vessel in records:
+        entry = dict(zip(("date", "tracking_number", "cargo_weight", "distance_naut", "duration_hours", "average_speed"), fields))
+        entry.update(origin=ports[origin], destination=ports[destination], vessel=vessels[vessel])
+        yield entry
+
+
+def write_feed(path: str, shipments: int, seed: int = 0) -> int:
+    """Write the synthetic feed to ``path`` as one JSON array, without holding it in memory."""
+    ports, vessels, records = generate(shipments, seed)
+    # Ports and vessels repeat in every entry, so they are serialized once
+    port_json = [json.dumps(port) for port in ports]
+    vessel_json = [json.dumps(vessel) for vessel in vessels]
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("[")
+        for index, (day, tracking, cargo, distance, duration, speed, origin, destination, vessel) in enumerate(records):
+            if index:
+                file.write(",\n")
+            file.write(ENTRY_FORMAT.format(day, tracking, cargo, distance, duration, speed,
+                                           port_json[origin], port_json[destination], vessel_json[vessel]))
+        file.write("]\n")
+    return shipments
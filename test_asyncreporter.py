@@ -0,0 +1,49 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import database
+from asyncreporter import AsyncReporter
+from shipmentreporter import Reporter
+
+# Never finishes on its own
+ENDLESS_QUERY = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT COUNT(*) FROM n"
+
+
+class TestAsyncReporter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "shipments.db")
+        shutil.copy(database.DATABASE_PATH, self.path)
+        self.reporter = Reporter(self.path)
+
+    def tearDown(self):
+        self.reporter.close()
+        self.tmp.cleanup()
+
+    async def test_coroutines_and_streams_match_reporter(self):
+        """Test that the coroutines and async iterators return what the Reporter returns."""
+        async with AsyncReporter(self.path, workers=2) as reporter:
+            results = await asyncio.gather(reporter.longest_shipment(), reporter.vessels_from_country("Panama"),
+                                           reporter.top_n("vessel", "length", n=20))
+            self.assertEqual(repr(results), repr([self.reporter.longest_shipment(), self.reporter.vessels_from_country("Panama"),
+                                                  self.reporter.top_n("vessel", "length", n=20)]))
+
+            streamed = [vessel.imo async for vessel in reporter.iter_vessels_from_country("Panama", chunk_size=7)]
+            self.assertEqual(streamed, [vessel.imo for vessel in self.reporter.iter_vessels_from_country("Panama")])
+
+    async def test_timeout_interrupts_the_query(self):
+        """Test that a timed out call stops its query and frees the worker."""
+        async with AsyncReporter(self.path, workers=1) as reporter:
+            started = time.perf_counter()
+            with self.assertRaises(TimeoutError):
+                await reporter.call(lambda: reporter.reporter.conn.execute(ENDLESS_QUERY).fetchone(), timeout=0.2)
+
+            self.assertEqual(await reporter.total_amount_of_vessels(), self.reporter.total_amount_of_vessels())
+            self.assertLess(time.perf_counter() - started, 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import threading
+import unittest
+import database
+import shipmentapp
+from port import Port
+
+
+class TestConnectionManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        database.configure(os.path.join(self.tmp.name, "test.db"))
+        with database.get_connection() as conn:
+            shipmentapp.create_tables(conn.cursor())
+            conn.execute("INSERT INTO shipments (id, origin, destination, vessel) VALUES ('S1', 'TRIST', 'TRIZM', 1)")
+
+    def tearDown(self):
+        database.configure(database.DATABASE_PATH)
+        self.tmp.cleanup()
+
+    def test_thread_local_connection(self):
+        """Test that each thread reuses its own connection to the configured database."""
+        conn = database.get_connection()
+        self.assertIs(database.get_connection(), conn)
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(database.get_connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], conn)
+
+        self.assertEqual(Port("TRIST", 1, "Istanbul", "Istanbul", None, "Turkey").get_shipments(), ("S1",))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import math
+import sqlite3
+import unittest
+import shipmentapp
+from frame import ShipmentFrame
+
+
+class TestShipmentFrame(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.frame = ShipmentFrame.from_database()
+        cls.shipments = {shipment.id: shipment for shipment in shipmentapp.fetch_all_shipments()}
+        cls.vessels = {vessel.imo: vessel for vessel in shipmentapp.fetch_all_vessels()}
+
+    def test_conversions_match_scalar_methods(self):
+        """Test that vectorized conversions equal the per-shipment results."""
+        for to_format in ("Knts", "Mph", "Kmph"):
+            speeds = self.frame.convert_speed(to_format)
+            for i, shipment_id in enumerate(self.frame.id):
+                self.assertEqual(speeds[i], self.shipments[shipment_id].convert_speed(to_format))
+
+        for to_format in ("NM", "M", "KM", "MI", "YD"):
+            distances = self.frame.convert_distance(to_format)
+            for i, shipment_id in enumerate(self.frame.id):
+                self.assertEqual(distances[i], self.shipments[shipment_id].convert_distance(to_format))
+
+        durations = self.frame.convert_duration("%D:%H")
+        self.assertEqual(durations[0], self.shipments[self.frame.id[0]].convert_duration("%D:%H"))
+
+        with self.assertRaises(ValueError):
+            self.frame.convert_speed("invalid")
+
+    def test_fuel_costs_match_scalar_methods(self):
+        """Test that vectorized fuel costs equal Shipment.calculate_fuel_costs."""
+        costs = self.frame.fuel_costs(2.5)
+        self.assertEqual(len(costs), len(self.shipments))
+        for i, shipment_id in enumerate(self.frame.id):
+            shipment = self.shipments[shipment_id]
+            self.assertEqual(costs[i], shipment.calculate_fuel_costs(2.5, self.vessels[shipment.vessel]))
+
+    def test_null_measures_are_nan(self):
+        """Test that a shipment without a cargo weight or distance loads as NaN instead of failing the frame."""
+        conn = sqlite3.connect(":memory:")
+        shipmentapp.create_tables(conn.cursor())
+        conn.execute("INSERT INTO vessels (imo, type) VALUES (1, 'Tanker')")
+        conn.executemany("INSERT INTO shipments (id, date, cargo_weight, distance_naut, origin, destination, vessel) VALUES (?, '01-01-2023', ?, ?, 'TRIST', 'NLRTM', 1)",
+                         [("S1", None, None), ("S2", 10, 5.0)])
+        frame = ShipmentFrame.from_database(conn)
+        self.assertTrue(math.isnan(frame.cargo_weight[0]) and math.isnan(frame.distance_naut[0]))
+        self.assertEqual((frame.cargo_weight[1], frame.distance_naut[1]), (10, 5))
+        conn.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import identitymap
+import shipmentapp
+from shipmentreporter import Reporter
+
+
+class TestIdentityMap(unittest.TestCase):
+
+    def test_repeated_lookups_share_objects(self):
+        """Test that repeated lookups return the same object and count hits and misses."""
+        with identitymap.session() as cache:
+            port = shipmentapp.fetch_port_details("TRIST")
+            self.assertIs(shipmentapp.fetch_port_details("TRIST"), port)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+            shipment = shipmentapp.fetch_shipment_details(port.get_shipments()[0])
+            self.assertIn(port, shipment.get_ports().values())
+
+    def test_lru_bound_and_invalidation(self):
+        """Test that the least recently used entry is evicted and invalidation drops entries."""
+        with identitymap.session(maxsize=2) as cache:
+            first = cache.get_port("TRIST")
+            cache.get_port("TRIZM")
+            cache.get_port("TRIST")
+            cache.get_vessel(shipmentapp.fetch_all_vessels()[0].imo)
+
+            self.assertEqual(len(cache), 2)
+            self.assertIsNone(cache.get("port", "TRIZM"))
+            self.assertIs(cache.get("port", "TRIST"), first)
+
+            cache.invalidate("vessel")
+            self.assertEqual(len(cache), 1)
+            cache.invalidate("port", "TRIST")
+            self.assertIsNot(cache.get_port("TRIST"), first)
+
+    def test_reporter_reuses_ports(self):
+        """Test that a reporter's ranking methods return cached port objects."""
+        reporter = Reporter()
+        self.assertIs(reporter.ports_with_most_shipments()[0], reporter.ports_with_most_shipments()[0])
+        self.assertGreater(reporter.identity_map.hits, 0)
+
+if __name__ == '__main__':
+    unittest.main()
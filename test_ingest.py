@@ -0,0 +1,194 @@
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+import ingest
+import shipmentapp
+
+
+def make_entry(tracking_number, origin_id, destination_id, imo, date="01-01-2023"):
+    def port(port_id):
+        return {"id": port_id, "code": 1, "name": port_id, "alias": None, "city": port_id,
+                "province": None, "country": "Turkey"}
+
+    return {
+        "date": date,
+        "tracking_number": tracking_number,
+        "cargo_weight": 1000,
+        "distance_naut": 100.5,
+        "duration_hours": 20.0,
+        "average_speed": 5.0,
+        "origin": port(origin_id),
+        "destination": port(destination_id),
+        "vessel": {"imo": imo, "mmsi": imo + 1, "country": "Turkey", "name": f"VESSEL {imo}",
+                   "type": "Container Ship", "build": 2020, "gross": 500, "netto": 400, "size": "120 / 20"},
+    }
+
+
+class TestIterJsonArray(unittest.TestCase):
+
+    def test_matches_json_load(self):
+        """Test that incremental parsing yields the same elements as json.load."""
+        data = [make_entry(f"T{i}", "TRIST", "TRIZM", 1000000 + i) for i in range(50)] + [1, "x", [2, 3], 456]
+        text = json.dumps(data, indent=4)
+
+        self.assertEqual(list(ingest.iter_json_array(io.StringIO(text), read_size=7)), data)
+        self.assertEqual(list(ingest.iter_json_array(io.StringIO("[]"))), [])
+
+    def test_rejects_truncated_input(self):
+        """Test that a truncated document raises instead of silently stopping."""
+        with self.assertRaises(ValueError):
+            list(ingest.iter_json_array(io.StringIO('[{"a": 1}, {"b"'), read_size=4))
+
+
+class TestPopulateDatabase(unittest.TestCase):
+
+    def test_batched_load(self):
+        """Test that batches deduplicate ports and vessels and insert every shipment."""
+        entries = [make_entry(f"T{i}", "TRIST" if i % 2 else "TRIZM", "NLRTM", 1000000 + i % 3) for i in range(25)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, "feed.json")
+            with open(json_path, "w") as file:
+                json.dump(entries, file)
+
+            with sqlite3.connect(os.path.join(tmp, "test.db")) as conn:
+                cursor = conn.cursor()
+                shipmentapp.create_tables(cursor)
+                stats = shipmentapp.populate_database(cursor, json_path, batch_size=10)
+
+                self.assertEqual((stats.shipments, stats.ports, stats.vessels, stats.batches), (25, 3, 3, 3))
+                self.assertEqual(cursor.execute("SELECT COUNT(*) FROM shipments").fetchone()[0], 25)
+                self.assertEqual(cursor.execute("SELECT COUNT(*) FROM ports").fetchone()[0], 3)
+                self.assertEqual(cursor.execute("SELECT length, beam FROM vessels LIMIT 1").fetchone(), (120, 20))
+
+    def test_batch_keeps_callers_transaction(self):
+        """Test that a batch inside an open transaction neither commits nor rolls back the caller's work."""
+        with tempfile.TemporaryDirectory() as tmp:
+            with sqlite3.connect(os.path.join(tmp, "test.db")) as conn:
+                cursor = conn.cursor()
+                shipmentapp.create_tables(cursor)
+                conn.commit()
+
+                cursor.execute("INSERT INTO ports (id, name) VALUES ('CALLER', 'Caller')")
+                ingest.write_batch(cursor, [("TRIST", 1, "Istanbul", None, None, "Turkey")], [], [])
+                with self.assertRaises(sqlite3.IntegrityError):
+                    ingest.write_batch(cursor, [("TRIZM", 1, "Izmir", None, None, "Turkey")], [],
+                                       [("T1",) + (None,) * 9, ("T1",) + (None,) * 9])
+                self.assertTrue(conn.in_transaction)
+                self.assertEqual(cursor.execute("SELECT id FROM ports ORDER BY id").fetchall(), [("CALLER",), ("TRIST",)])
+                conn.rollback()
+                self.assertEqual(cursor.execute("SELECT COUNT(*) FROM ports").fetchone()[0], 0)
+
+
+class TestLoadDelta(unittest.TestCase):
+
+    def test_delta_load_is_idempotent(self):
+        """Test that delta loads skip known files and tracking numbers and update changed ports."""
+        with tempfile.TemporaryDirectory() as tmp:
+            feed_dir = os.path.join(tmp, "feeds")
+            os.mkdir(feed_dir)
+            with open(os.path.join(feed_dir, "day1.json"), "w") as file:
+                json.dump([make_entry("T1", "TRIST", "TRIZM", 1000001), make_entry("T2", "TRIST", "TRIZM", 1000001)], file)
+
+            with sqlite3.connect(os.path.join(tmp, "test.db")) as conn:
+                cursor = conn.cursor()
+                shipmentapp.create_tables(cursor)
+                self.assertEqual(ingest.load_delta(cursor, feed_dir).shipments, 2)
+
+                renamed = make_entry("T3", "TRIST", "TRIZM", 1000001)
+                renamed["origin"]["name"] = "Istanbul"
+                with open(os.path.join(feed_dir, "day2.json"), "w") as file:
+                    json.dump([make_entry("T2", "TRIST", "TRIZM", 1000001), renamed], file)
+
+                stats = ingest.load_delta(cursor, feed_dir)
+                self.assertEqual((stats.shipments, stats.skipped_files), (1, 1))
+                self.assertEqual(cursor.execute("SELECT COUNT(*) FROM shipments").fetchone()[0], 3)
+                self.assertEqual(cursor.execute("SELECT name FROM ports WHERE id = 'TRIST'").fetchone()[0], "Istanbul")
+
+                stats = ingest.load_delta(cursor, feed_dir)
+                self.assertEqual((stats.shipments, stats.skipped_files), (0, 2))
+
+
+class TestParallelLoad(unittest.TestCase):
+
+    def test_chunks_hold_whole_elements(self):
+        """Test that feed chunks decode to the same elements as iter_json_array."""
+        data = [make_entry(f"T{i}", "TRIST", "TRIZM", 1000000 + i) for i in range(40)]
+        data[3]["origin"]["name"] = 'Quay }, {"x'
+        text = json.dumps(data, indent=2)
+
+        chunks = list(ingest.iter_feed_chunks(io.StringIO(text), chunk_size=300))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual([entry for chunk in chunks for entry in json.loads(f"[{chunk}]")], data)
+        self.assertEqual(list(ingest.iter_feed_chunks(io.StringIO(" [ ] "))), [])
+        with self.assertRaises(ValueError):
+            list(ingest.iter_feed_chunks(io.StringIO('[{"a": 1}, {"b"'), chunk_size=4))
+
+    def test_invalid_entries_are_rejected_with_reason(self):
+        """Test that validation normalizes good entries and rejects bad ones without stopping the chunk."""
+        padded = make_entry("T1", "TRIST", "TRIZM", 1000001, date="1-2-2023")
+        padded["cargo_weight"] = "1000"
+        negative = make_entry("T2", "TRIST", "TRIZM", 1000001)
+        negative["distance_naut"] = -1
+        no_vessel = make_entry("T3", "TRIST", "TRIZM", 1000001)
+        del no_vessel["vessel"]
+        text = ", ".join(json.dumps(entry) for entry in (padded, negative, no_vessel))
+        text += ', {"date": oops}, ' + json.dumps(make_entry("T4", "TRIST", "TRIZM", 1000001, date="30-02-2023"))
+        unhashable = make_entry("T5", "TRIST", "TRIZM", 1000001)
+        unhashable["origin"]["id"] = ["TRIST"]
+        text += ", " + json.dumps(unhashable)
+
+        elements, ports, vessels, shipments, positions, rejects = ingest.parse_chunk(text)
+        self.assertEqual(elements, 6)
+        self.assertEqual((len(ports), len(vessels)), (2, 1))
+        self.assertEqual(shipments, [("T1", "01-02-2023", 1000, 100.5, 20.0, 5.0, "TRIST", "TRIZM", 1000001, "2023-02-01")])
+        self.assertEqual(positions, [0])
+        self.assertEqual([(index, reason.split(":")[0]) for index, reason, _ in rejects], [
+            (1, "distance_naut is out of range"), (2, "entry has no vessel"), (3, "malformed JSON"), (4, "date does not exist"),
+            (5, "origin id is not a non-empty string")])
+
+    def test_parallel_load_matches_serial_load(self):
+        """Test that a load across worker processes writes what the serial load writes and logs the rejects."""
+        entries = [make_entry(f"T{i}", "TRIST" if i % 2 else "TRIZM", "NLRTM", 1000000 + i % 3) for i in range(60)]
+        invalid = make_entry("BAD", "TRIST", "NLRTM", 1000000)
+        invalid["vessel"]["size"] = "big"
+        repeated = make_entry("T2", "TRIZM", "NLRTM", 1000002)
+        repeated["cargo_weight"] = 1
+        repeated_last = make_entry("T59", "TRIZM", "NLRTM", 1000002)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            serial_path, parallel_path = os.path.join(tmp, "serial.json"), os.path.join(tmp, "parallel.json")
+            with open(serial_path, "w") as file:
+                json.dump(entries, file)
+            with open(parallel_path, "w") as file:
+                json.dump(entries[:30] + [invalid] + entries[30:] + [repeated, repeated_last], file)
+
+            tables = []
+            for name, load in (("serial", lambda cursor: ingest.load_shipments(cursor, entries, batch_size=10)),
+                               ("parallel", lambda cursor: ingest.load_feed(
+                                   cursor, parallel_path, workers=2, batch_size=10, rejects=rejects, chunk_size=500))):
+                rejects = ingest.RejectLog(os.path.join(tmp, "rejects.jsonl"))
+                with sqlite3.connect(os.path.join(tmp, f"{name}.db")) as conn:
+                    cursor = conn.cursor()
+                    shipmentapp.create_tables(cursor)
+                    stats = load(cursor)
+                    tables.append([cursor.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall()
+                                   for table in ("ports", "vessels", "shipments")])
+                rejects.close()
+
+            self.assertEqual((stats.shipments, stats.rejected), (60, 3))
+            self.assertEqual(tables[0], tables[1])
+            with open(os.path.join(tmp, "rejects.jsonl")) as file:
+                invalid_reject, repeated_reject, repeated_last_reject = map(json.loads, file)
+            self.assertEqual((invalid_reject["index"], invalid_reject["entry"]["tracking_number"]), (30, "BAD"))
+            self.assertTrue(invalid_reject["reason"].startswith("vessel size"))
+            self.assertEqual((repeated_reject["index"], repeated_reject["entry"]["tracking_number"]), (61, "T2"))
+            self.assertEqual(repeated_reject["reason"], "duplicate tracking number")
+            # A repeat is found whether its first copy is in the same batch or an earlier one
+            self.assertEqual((repeated_last_reject["index"], repeated_last_reject["entry"]["tracking_number"]), (62, "T59"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+import database
+import instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        instrumentation.reset()
+        instrumentation.enable(slow_query_seconds=0)
+        self.conn = database.connect(":memory:")
+        self.conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+        self.conn.executemany("INSERT INTO items (name) VALUES (?)", [(f"item {i}",) for i in range(25)])
+
+    def tearDown(self):
+        self.conn.close()
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def stats(self, sql: str) -> dict:
+        return next(stats for stats in instrumentation.snapshot()["queries"] if stats["sql"] == sql)
+
+    def test_counts_rows_and_latency_per_query(self):
+        """Test that executions, fetched rows and histogram buckets add up per normalized query."""
+        cursor = self.conn.cursor()
+        for ids in ([1, 2], [3, 4, 5]):
+            cursor.execute(f"SELECT * FROM items WHERE id IN ({', '.join('?' * len(ids))})", ids)
+            cursor.fetchall()
+        rows = list(database.iter_rows(self.conn.cursor(), "SELECT * FROM items", chunk_size=10))
+
+        in_list = self.stats("SELECT * FROM items WHERE id IN (?, ...)")
+        self.assertEqual((in_list["count"], in_list["rows"]), (2, 5))
+        self.assertEqual(sum(in_list["histogram"].values()), 2)
+        self.assertEqual(self.stats("SELECT * FROM items")["rows"], len(rows))
+        self.assertEqual(self.stats("INSERT INTO items (name) VALUES (?)")["count"], 1)
+        self.assertTrue(instrumentation.snapshot()["slow"])
+
+        plain = sqlite3.connect(":memory:")
+        self.assertNotIsInstance(plain, instrumentation.InstrumentedConnection)
+        plain.close()
+
+    def test_own_trace_callback_runs_alongside(self):
+        """Test that installing a trace callback of one's own keeps the instrumentation's callback."""
+        traced = []
+        self.conn.set_trace_callback(traced.append)
+        with mock.patch.object(instrumentation, "_trace") as instrumentation_trace:
+            self.conn.execute("INSERT INTO items (name) VALUES ('traced')")
+
+        self.assertIn("INSERT INTO items (name) VALUES ('traced')", traced)
+        instrumentation_trace.assert_any_call("INSERT INTO items (name) VALUES ('traced')")
+
+    def test_periodic_dump(self):
+        """Test that the dump thread writes a readable snapshot and a final one when stopped."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "queries.json")
+            instrumentation.start_dump(path, interval=0.01)
+            self.conn.execute("SELECT COUNT(*) FROM items").fetchone()
+            instrumentation.stop_dump()
+            with open(path, encoding="utf-8") as file:
+                dumped = json.load(file)
+
+        self.assertIn("SELECT COUNT(*) FROM items", [stats["sql"] for stats in dumped["queries"]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import csv
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import database
+import reportbatch
+from datetime import date
+from shipmentreporter import Reporter
+
+
+class TestRunJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "shipments.db")
+        self.output_dir = os.path.join(self.tmp.name, "reports")
+        shutil.copy(database.DATABASE_PATH, self.path)
+        self.reporter = Reporter(self.path)
+
+    def tearDown(self):
+        self.reporter.close()
+        self.tmp.cleanup()
+
+    def read(self, name: str) -> list:
+        with open(os.path.join(self.output_dir, name), newline="", encoding="utf-8") as file:
+            return list(csv.reader(file))
+
+    def test_jobs_write_their_outputs_in_parallel(self):
+        """Test that summary and export jobs write complete files and failures are reported per job."""
+        port = self.reporter.ports_with_most_shipments()[0]
+        jobs = [
+            {"name": "longest_and_shortest_vessels", "method": "longest_and_shortest_vessels"},
+            {"name": "vessel_count", "method": "total_amount_of_vessels"},
+            {"name": "docking", "method": "vessels_that_docked_port_between", "args": [port.id, "2023-01-01", "2023-12-31"], "export": True},
+            {"name": "missing_port", "method": "vessels_that_docked_port_between", "args": ["NOPE", "2023-01-01", "2023-12-31"], "export": True},
+        ]
+        results = reportbatch.run_jobs(jobs, self.output_dir, self.path, workers=2)
+
+        self.assertEqual([result.name for result in results], [job["name"] for job in jobs])
+        self.assertEqual(self.read("vessel_count.csv"), [["value"], [str(self.reporter.total_amount_of_vessels())]])
+        self.assertEqual(self.read("longest_and_shortest_vessels.csv")[1][0], str(self.reporter.longest_and_shortest_vessels()[0].imo))
+
+        docked = self.reporter.vessels_that_docked_port_between(port, date(2023, 1, 1), date(2023, 12, 31))
+        self.assertEqual((results[2].rows, len(self.read("docking.csv")) - 1), (len(docked), len(docked)))
+
+        self.assertIn("NOPE", results[3].error)
+        self.assertEqual(sorted(os.listdir(self.output_dir)), ["docking.csv", "longest_and_shortest_vessels.csv", "vessel_count.csv"])
+
+    def test_read_only_reporter(self):
+        """Test that the workers' reporters cannot write to the database."""
+        reporter = Reporter(self.path, read_only=True)
+        with self.assertRaises(sqlite3.OperationalError):
+            reporter.conn.execute("DELETE FROM vessels")
+        reporter.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import database
+import identitymap
+import resolver
+import shipmentapp
+
+
+class TestBatchResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.shipments = shipmentapp.fetch_all_shipments()
+        self.statements = []
+        database.get_connection().set_trace_callback(self.statements.append)
+
+    def tearDown(self):
+        database.get_connection().set_trace_callback(None)
+
+    def test_constant_number_of_queries(self):
+        """Test that a batch resolves every shipment's relations with a fixed number of queries."""
+        with identitymap.session(), resolver.batch(self.shipments) as batch:
+            for shipment in self.shipments:
+                ports = shipment.get_ports()
+                self.assertEqual(ports["origin"].id, shipment.origin)
+                self.assertEqual(ports["destination"].id, shipment.destination)
+                self.assertEqual(shipment.get_vessel().imo, shipment.vessel)
+
+        selects = [sql for sql in self.statements if sql.lstrip().startswith("SELECT")]
+        self.assertEqual(len(selects), 2)
+        self.assertEqual(len(batch.vessels), len({shipment.vessel for shipment in self.shipments}))
+
+    def test_matches_per_object_lookup(self):
+        """Test that both the IN-list and the temp table paths return the same objects as get_ports."""
+        sample = self.shipments[:3]
+        small = resolver.resolve(sample)
+        large = resolver.resolve(self.shipments)
+
+        for shipment in sample:
+            expected = shipment.get_ports()["origin"]
+            self.assertEqual(repr(small.ports[shipment.origin]), repr(expected))
+            self.assertEqual(repr(large.ports[shipment.origin]), repr(expected))
+
+    def test_missing_port_raises(self):
+        """Test that unknown ports raise the same error inside a batch."""
+        shipment = self.shipments[0]
+        shipment.origin = "XXXXX"
+        with resolver.batch([shipment]):
+            with self.assertRaises(ValueError):
+                shipment.get_ports()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+import rollups
+import schema
+import shipmentapp
+import testutil
+from shipmentreporter import Reporter
+
+SHIPMENT_INSERT = "INSERT INTO shipments (id, date, cargo_weight, distance_naut, origin, destination, vessel) VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+
+class TestRollups(testutil.DerivedTableTestCase):
+    module = rollups
+    queries = ("SELECT * FROM shipment_rollups ORDER BY grain, dimension, key, bucket",)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "rollups.db")
+        self.conn = sqlite3.connect(self.path)
+        self.cursor = self.conn.cursor()
+        shipmentapp.create_tables(self.cursor)
+        self.cursor.executemany("INSERT INTO vessels (imo, country, type, gross, netto) VALUES (?, ?, ?, ?, ?)", [
+            (1, "Malta", "Bulk Carrier", 200, 100), (2, "Turkey", "Container Ship", 300, 100),
+        ])
+        self.cursor.executemany(SHIPMENT_INSERT, [
+            ("S1", "30-12-2022", 100, 1000, "TRIST", "NLRTM", 1),
+            ("S2", "02-01-2023", 200, 500, "NLRTM", "TRIST", 2),
+            ("S3", "03-01-2023", 50, 250, "TRIST", "TRIST", 1),
+        ])
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def test_kept_current_by_triggers(self):
+        """Test that shipment and vessel changes keep the rollups equal to a full recompute."""
+        self.assertCurrent()
+
+        self.cursor.execute("UPDATE shipments SET date = '15-02-2023', date_iso = '2023-02-15', cargo_weight = 70 WHERE id = 'S2'")
+        self.cursor.execute("DELETE FROM shipments WHERE id = 'S1'")
+        self.cursor.execute("UPDATE vessels SET type = 'Tanker', netto = 50 WHERE imo = 1")
+        self.cursor.execute(SHIPMENT_INSERT, ("S4", "04-01-2023", 10, 10, "TRIZM", "TRIST", 3))
+        self.cursor.execute("INSERT INTO vessels (imo, country, type, gross, netto) VALUES (3, 'Greece', 'Tanker', 10, 10)")
+        self.assertCurrent()
+
+        expected = self.rows()
+        with schema.bulk_load(self.conn):
+            self.cursor.execute("DELETE FROM shipment_rollups")
+        self.assertEqual(self.rows(), expected)
+
+    def test_follow_date_updates(self):
+        """Test that updating only the date, unpadded or not, moves the shipment in the rollups."""
+        self.cursor.execute("UPDATE shipments SET date = '15-2-2023' WHERE id = 'S1'")
+        self.cursor.execute(SHIPMENT_INSERT, ("S4", "31-02-2023", 10, 10, "TRIZM", "TRIST", 2))
+        self.assertEqual(self.cursor.execute("SELECT date_iso FROM shipments WHERE id IN ('S1', 'S4') ORDER BY id").fetchall(),
+                         [("2023-02-15",), (None,)])
+        self.assertCurrent()
+
+        self.cursor.execute("UPDATE shipments SET date = '28-02-2023' WHERE id = 'S4'")
+        self.assertCurrent()
+        self.assertEqual(self.cursor.execute("""
+            SELECT shipments FROM shipment_rollups WHERE grain = 'month' AND dimension = 'port' AND key = 'TRIST' AND bucket = '2023-02-01'
+        """).fetchone(), (2,))
+
+    def test_time_series(self):
+        """Test range queries per grain, with the first week and month included whole."""
+        reporter = Reporter(self.path)
+        self.assertEqual(reporter.time_series("port", date(2023, 1, 1), date(2023, 1, 31), "TRIST", grain="day"), (
+            ("2023-01-02", "TRIST", 1, 200.0, 500.0, 450.0),
+            ("2023-01-03", "TRIST", 1, 50.0, 250.0, 175.0),
+        ))
+        # The week of 1 January 2023 starts on 26 December 2022; a round trip counts once at its port
+        self.assertEqual(reporter.time_series("port", date(2023, 1, 1), date(2023, 1, 8), "TRIST", grain="week"), (
+            ("2022-12-26", "TRIST", 1, 100.0, 1000.0, 700.0),
+            ("2023-01-02", "TRIST", 2, 250.0, 750.0, 625.0),
+        ))
+        self.assertEqual([row[:3] for row in reporter.time_series("vessel_country", date(2023, 1, 15), date(2023, 1, 15))],
+                         [("2023-01-01", "Malta", 1), ("2023-01-01", "Turkey", 1)])
+        with self.assertRaises(ValueError):
+            reporter.time_series("port", date(2023, 1, 1), date(2023, 1, 2), grain="year")
+        reporter.close()
+
+if __name__ == '__main__':
+    unittest.main()
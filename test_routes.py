@@ -0,0 +1,83 @@
+import sqlite3
+import unittest
+import routes
+import schema
+import shipmentapp
+import testutil
+
+SHIPMENT_INSERT = "INSERT INTO shipments (id, date, cargo_weight, distance_naut, duration_hours, average_speed, origin, destination, vessel) VALUES (?, '01-01-2023', ?, ?, ?, ?, ?, ?, 1)"
+
+
+class TestRouteGraph(testutil.DerivedTableTestCase):
+    module = routes
+    queries = ("SELECT * FROM lane_stats ORDER BY 1, 2",)
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.cursor = self.conn.cursor()
+        shipmentapp.create_tables(self.cursor)
+        self.cursor.executemany(SHIPMENT_INSERT, [
+            ("S1", 100, 1000, 100, 10, "TRIST", "NLRTM"),
+            ("S2", 300, 1200, 80, 15, "TRIST", "NLRTM"),
+            ("S3", 50, 300, 20, 15, "TRIST", "TRIZM"),
+            ("S4", 70, 400, 60, 7, "TRIZM", "NLRTM"),
+        ])
+        self.conn.commit()
+
+    def test_lanes_kept_current_by_triggers(self):
+        """Test that inserts, updates and deletes keep the lane sums and counts exact, also after a bulk load."""
+        self.assertCurrent()
+
+        self.cursor.execute("UPDATE shipments SET destination = 'TRIZM', cargo_weight = 10 WHERE id = 'S2'")
+        self.cursor.execute("DELETE FROM shipments WHERE id = 'S4'")
+        self.cursor.execute(SHIPMENT_INSERT, ("S7", None, None, 30, None, "TRIST", "TRIZM"))
+        self.cursor.execute("UPDATE shipments SET distance_naut = NULL WHERE id = 'S1'")
+        self.assertCurrent()
+        self.cursor.execute("DELETE FROM shipments WHERE id = 'S7'")
+        self.assertCurrent()
+
+        with schema.bulk_load(self.conn):
+            self.cursor.execute(SHIPMENT_INSERT, ("S5", 1, 2, 3, 4, "NLRTM", "TRIST"))
+            self.conn.commit()
+        self.assertEqual(routes.RouteGraph.from_database(self.conn).lane("NLRTM", "TRIST").trips, 1)
+        self.cursor.execute("DELETE FROM shipments WHERE id = 'S5'")
+        self.assertCurrent()
+
+    def test_queries_and_incremental_update(self):
+        """Test busiest lanes, neighbors, multi-hop shortest paths and picking up new shipments."""
+        graph = routes.RouteGraph.from_database(self.conn)
+        busiest = graph.busiest_lanes(1)[0]
+        self.assertEqual((busiest.origin, busiest.destination, busiest.trips, busiest.mean_distance), ("TRIST", "NLRTM", 2, 1100))
+        self.assertEqual([lane.origin for lane in graph.neighbors("NLRTM", "in")], ["TRIST", "TRIZM"])
+
+        # Through Izmir beats the direct lane on mean distance and on mean duration
+        self.assertEqual(graph.shortest_path("TRIST", "NLRTM"), (700, ["TRIST", "TRIZM", "NLRTM"]))
+        self.assertEqual(graph.shortest_path("TRIST", "NLRTM", "duration"), (80, ["TRIST", "TRIZM", "NLRTM"]))
+        self.assertIsNone(graph.shortest_path("NLRTM", "TRIST"))
+
+        self.cursor.execute(SHIPMENT_INSERT, ("S6", 10, 900, 5, 20, "NLRTM", "TRIST"))
+        self.conn.commit()
+        self.assertEqual(graph.update(self.conn), 1)
+        self.assertEqual(graph.update(self.conn), 0)
+        self.assertEqual(graph.shortest_path("NLRTM", "TRIST"), (900, ["NLRTM", "TRIST"]))
+
+    def test_missing_measures_are_not_averaged(self):
+        """Test that shipments without a measure neither lower the lane mean nor make a lane without it look free."""
+        self.cursor.executemany(SHIPMENT_INSERT, [
+            ("S5", None, None, None, None, "TRIST", "TRIZM"),
+            ("S6", None, None, None, None, "TRIST", "GRPIR"),
+            ("S7", None, None, None, None, "GRPIR", "NLRTM"),
+        ])
+        self.conn.commit()
+        incremental = routes.RouteGraph()
+        for row in self.cursor.execute("SELECT origin, destination, cargo_weight, distance_naut, duration_hours, average_speed FROM shipments"):
+            incremental.add_shipment(*row)
+
+        for graph in (routes.RouteGraph.from_database(self.conn), incremental):
+            izmir = graph.lane("TRIST", "TRIZM")
+            self.assertEqual((izmir.trips, izmir.mean_distance, izmir.mean_speed), (2, 300, 15))
+            self.assertIsNone(graph.lane("TRIST", "GRPIR").mean_distance)
+            self.assertEqual(graph.shortest_path("TRIST", "NLRTM"), (700, ["TRIST", "TRIZM", "NLRTM"]))
+
+if __name__ == '__main__':
+    unittest.main()
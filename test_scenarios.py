@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+import shipmentapp
+from frame import COLUMNS, ShipmentFrame
+from scenarios import FuelScenarios, GROUPINGS
+
+PRICES = (0.75, 1.5, 2.25)
+
+
+class TestFuelScenarios(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.frame = ShipmentFrame.from_database()
+        cls.shipments = {shipment.id: shipment for shipment in shipmentapp.fetch_all_shipments()}
+        cls.vessels = {vessel.imo: vessel for vessel in shipmentapp.fetch_all_vessels()}
+
+    def test_matrix_matches_scalar_method(self):
+        """Test that every cell equals Shipment.calculate_fuel_costs, whatever the chunk size."""
+        costs = FuelScenarios(self.frame, PRICES, chunk_size=97).matrix()
+        self.assertEqual(costs.shape, (len(self.frame), len(PRICES)))
+        for i, shipment_id in enumerate(self.frame.id[:200]):
+            shipment = self.shipments[shipment_id]
+            for j, price in enumerate(PRICES):
+                self.assertEqual(costs[i, j], shipment.calculate_fuel_costs(price, self.vessels[shipment.vessel]))
+
+    def test_aggregates_and_efficiency_overrides(self):
+        """Test that every grouping adds up to the totals and that overrides only change their vessel type."""
+        engine = FuelScenarios(self.frame, PRICES, chunk_size=500)
+        costs = engine.matrix()
+        aggregates = engine.aggregate(*GROUPINGS)
+        for name in GROUPINGS:
+            self.assertTrue(np.allclose(sum(aggregates[name].values()), engine.totals()), name)
+
+        vessel_type = self.frame.vessel_type[0]
+        rows = self.frame.vessel_type == vessel_type
+        self.assertTrue(np.allclose(aggregates["vessel_type"][vessel_type], costs[rows].sum(axis=0)))
+
+        by_type = FuelScenarios(self.frame, PRICES, efficiency_values={vessel_type: 1.0}, chunk_size=500).aggregate("vessel_type")["vessel_type"]
+        for key, totals in by_type.items():
+            self.assertEqual(np.array_equal(totals, aggregates["vessel_type"][key]), key != vessel_type, key)
+
+        with self.assertRaises(ValueError):
+            engine.aggregate("country")
+
+    def test_months_follow_iso_dates(self):
+        """Test that months come from the ISO dates, so unpadded and unparsable dates land where SQLite puts them."""
+        columns = {name: getattr(self.frame, name)[:3] for name in COLUMNS}
+        columns["date"] = np.array(["1-3-2023", "01-03-2023", "30-02-2023"], dtype=object)
+        columns["date_iso"] = np.array(["2023-03-01", "2023-03-01", None], dtype=object)
+        engine = FuelScenarios(ShipmentFrame(**columns), PRICES)
+        months = engine.aggregate("month")["month"]
+        self.assertEqual(list(months), ["2023-03", None])
+        self.assertTrue(np.allclose(months["2023-03"], np.nansum(engine.matrix()[:2], axis=0)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import sqlite3
+import unittest
+import dates
+import schema
+
+
+class TestMigrate(unittest.TestCase):
+
+    def test_upgrades_legacy_database_in_place(self):
+        """Test that a database without versioning gets ISO dates, indexes and a version."""
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE ports (id TEXT PRIMARY KEY, code INTEGER, name TEXT, city TEXT, province TEXT, country TEXT)")
+        conn.execute("CREATE TABLE vessels (imo INTEGER PRIMARY KEY, mmsi INTEGER, name TEXT, country TEXT, type TEXT, gross INTEGER, netto INTEGER, length INTEGER, beam INTEGER)")
+        conn.execute("CREATE TABLE shipments (id TEXT PRIMARY KEY, date DATE, cargo_weight INTEGER, distance_naut REAL, duration_hours REAL, average_speed REAL, origin TEXT, destination TEXT, vessel INTEGER)")
+        conn.execute("INSERT INTO shipments (id, date, origin, destination, vessel) VALUES ('S1', '31-12-2023', 'TRIST', 'TRIZM', 1)")
+        conn.commit()
+
+        self.assertEqual(schema.migrate(conn), schema.SCHEMA_VERSION)
+        self.assertEqual(schema.migrate(conn), schema.SCHEMA_VERSION)
+        self.assertEqual(conn.execute("SELECT date_iso FROM shipments").fetchone()[0], "2023-12-31")
+
+        # Rows written without an ISO date are normalized by the trigger
+        conn.execute("INSERT INTO shipments (id, date) VALUES ('S2', '02-01-2024')")
+        self.assertEqual(conn.execute("SELECT date_iso FROM shipments WHERE id = 'S2'").fetchone()[0], "2024-01-02")
+
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM shipments WHERE vessel = 1").fetchall()
+        self.assertIn("idx_shipments_vessel", str(plan))
+
+    def test_iso_date(self):
+        """Test conversion of feed dates to ISO dates."""
+        self.assertEqual(dates.iso_date("05-03-2023"), "2023-03-05")
+        self.assertEqual(dates.iso_date("1-2-2023"), "2023-02-01")
+        self.assertIsNone(dates.iso_date("30-02-2023"))
+        self.assertIsNone(dates.iso_date("2023-02-01"))
+
+        # Feed validation and the SQL for stored rows use the same parser
+        conn = sqlite3.connect(":memory:")
+        for value in ("05-03-2023", "1-2-2023", "001-02-2023", "30-02-2023", "2023-02-01"):
+            try:
+                parsed = dates.parse_date(value).isoformat()
+            except ValueError:
+                parsed = None
+            self.assertEqual(parsed, dates.iso_date(value), value)
+            self.assertEqual(conn.execute(f"SELECT {dates.ISO_DATE_SQL.format(':value')}", {"value": value}).fetchone()[0], parsed, value)
+        with self.assertRaisesRegex(ValueError, "date does not exist"):
+            dates.parse_date("30-02-2023")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import sqlite3
+import unittest
+import schema
+import search
+import shipmentapp
+import testutil
+
+
+def port_ids(cursor, text, **kwargs):
+    return [row[0] for row in search.search(cursor, "port", text, **kwargs)]
+
+
+class TestSearch(testutil.DerivedTableTestCase):
+    module = search
+    queries = ("SELECT id, name, city, province FROM port_search ORDER BY id",)
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.cursor = self.conn.cursor()
+        shipmentapp.create_tables(self.cursor)
+        self.cursor.executemany("INSERT INTO ports (id, name, city, province, country) VALUES (?, ?, ?, ?, ?)", [
+            ("TRIST", "Istanbul", "İstanbul", "Marmara", "Turkey"),
+            ("TRIZM", "Izmir", "Izmir", "Aegean", "Turkey"),
+            ("TRALI", "Aliaga", "Aliaga", "Izmir", "Turkey"),
+            ("NLRTM", "Rotterdam", "Rotterdam", "Zuid-Holland", "Netherlands"),
+        ])
+        self.cursor.executemany("INSERT INTO vessels (imo, mmsi, name) VALUES (?, ?, ?)", [
+            (9313905, 219216000, "MAERSK BOSTON"), (9632844, 353036000, "EVER JUDGER"),
+        ])
+        self.conn.commit()
+
+    def test_prefix_and_typos(self):
+        """Test type-ahead prefixes, diacritics, ranking by column and typo-tolerant matching."""
+        self.assertEqual(port_ids(self.cursor, "rot"), ["NLRTM"])
+        self.assertEqual(port_ids(self.cursor, "istanbul"), ["TRIST"])
+        # A match on the port name outranks one on the province
+        self.assertEqual(port_ids(self.cursor, "izm"), ["TRIZM", "TRALI"])
+        self.assertEqual(port_ids(self.cursor, "rotterdm"), ["NLRTM"])
+        self.assertEqual(port_ids(self.cursor, "rotterdm", fuzzy=False), [])
+        self.assertEqual(port_ids(self.cursor, "izmr", limit=1), ["TRIZM"])
+        self.assertEqual([row[0] for row in search.search(self.cursor, "vessel", "mersk bost")], [9313905])
+        self.assertEqual([row[0] for row in search.search(self.cursor, "vessel", "35303")], [9632844])
+        self.assertEqual(port_ids(self.cursor, '"* OR'), [])
+
+        # Only words that match no indexed term are widened, and numbers never are
+        self.cursor.execute("INSERT INTO ports (id, name) VALUES ('TRIZT', 'Izmit')")
+        self.assertEqual(port_ids(self.cursor, "izmir"), ["TRIZM", "TRALI"])
+        self.assertEqual(search.similar_terms(self.cursor, "vessel", "219216001"), [])
+
+    def test_kept_current_by_triggers(self):
+        """Test that inserts, updates and deletes reach the indexes, also after a bulk load."""
+        self.cursor.execute("UPDATE ports SET name = 'Europoort' WHERE id = 'NLRTM'")
+        self.cursor.execute("DELETE FROM ports WHERE id = 'TRIST'")
+        # An id without letters or digits has no tokens to find the entry by
+        self.cursor.execute("INSERT INTO ports (id, name) VALUES ('--', 'Nowhere')")
+        self.cursor.execute("DELETE FROM ports WHERE id = '--'")
+        self.cursor.execute("UPDATE vessels SET name = 'EVER GIVEN' WHERE imo = 9632844")
+        self.cursor.execute("INSERT INTO vessels (imo, mmsi, name) VALUES (1, 2, 'MAERSK KOWLOON')")
+        self.assertCurrent()
+        self.assertEqual(port_ids(self.cursor, "europ"), ["NLRTM"])
+        # The vessel index reads its text from vessels, so checking it against the table is enough
+        self.cursor.execute("INSERT INTO vessel_search (vessel_search) VALUES ('integrity-check')")
+        self.assertEqual([row[2] for row in search.search(self.cursor, "vessel", "ever")], ["EVER GIVEN"])
+
+        with schema.bulk_load(self.conn):
+            self.cursor.execute("INSERT INTO ports (id, name) VALUES ('DEHAM', 'Hamburg')")
+            self.conn.commit()
+        self.assertEqual(port_ids(self.cursor, "hamb"), ["DEHAM"])
+        self.cursor.execute("DELETE FROM ports WHERE id = 'DEHAM'")
+        self.assertCurrent()
+
+if __name__ == '__main__':
+    unittest.main()
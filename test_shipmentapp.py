@@ -1,4 +1,9 @@
 import unittest
+from datetime import date
+import identitymap
+import resolver
+import shipmentapp
+from shipmentreporter import Reporter
 from shipment import Shipment
 from vessel import Vessel
 from port import Port
@@ -92,6 +97,58 @@ class TestPort(unittest.TestCase):
         # We assume get_shipments returns the IDs of shipments
         self.assertNotIn("SHIP-TR001", shipments, "Expected 'SHIP-TR001' not to be in shipments since this ID is not in the db")
 
+class TestSlottedEntities(unittest.TestCase):
+
+    def test_one_slotted_type_everywhere(self):
+        """Test that the entities have no __dict__ and that every fetch path returns the same types."""
+        port_args = ("TRIST", 34000, "Istanbul", "Istanbul", "Marmara", "Turkey")
+        vessel_args = (1234567, 271000123, "ISTANBUL PRIDE", "Turkey", "Container Ship", 2019, 50000, 30000, 250, 40)
+        shipment_args = ("SHIP-TR001", "2023-05-15", 25000, 8500, 170, 16, "TRIST", "TRIZM", 1234567)
+        for cls, args in ((Port, port_args), (Vessel, vessel_args), (Shipment, shipment_args)):
+            self.assertFalse(hasattr(cls(*args), "__dict__"))
+        self.assertEqual(repr(Port(*port_args)), "Port(id=TRIST, code=34000, name=Istanbul, city=Istanbul, province=Marmara, country=Turkey)")
+
+        port = shipmentapp.fetch_all_ports()[0]
+        self.assertIsInstance(port, Port)
+        self.assertIsInstance(shipmentapp.fetch_all_shipments()[0], Shipment)
+        with identitymap.session():
+            batch_port = resolver.fetch_ports([port.id])[port.id]
+            self.assertIs(identitymap.current().get_port(port.id), batch_port)
+            self.assertIsInstance(batch_port, Port)
+
+class TestStreaming(unittest.TestCase):
+
+    def test_keyset_pages_cover_iterator(self):
+        """Test that paging with the last id yields the same ports as streaming them all."""
+        streamed = [port.id for port in shipmentapp.iter_ports(chunk_size=100)]
+        self.assertEqual(sorted(streamed), sorted(port.id for port in shipmentapp.fetch_all_ports()))
+
+        paged, after = [], None
+        while True:
+            page = shipmentapp.fetch_ports_page(after, limit=500)
+            if not page:
+                break
+            paged.extend(port.id for port in page)
+            after = page[-1].id
+        self.assertEqual(paged, streamed)
+
+        resumed = [port.id for port in shipmentapp.iter_ports(after=streamed[9])]
+        self.assertEqual(resumed, streamed[10:])
+
+    def test_reporter_iterators_match_tuples(self):
+        """Test that the streaming reporter methods return the same rows as the tuple methods."""
+        reporter = Reporter()
+        self.assertEqual([repr(port) for port in reporter.iter_ports_in_country("Turkey", chunk_size=3)],
+                         [repr(port) for port in reporter.ports_in_country("Turkey")])
+        self.assertEqual([repr(vessel) for vessel in reporter.iter_vessels_from_country("Panama", chunk_size=3)],
+                         [repr(vessel) for vessel in reporter.vessels_from_country("Panama")])
+
+        port = reporter.ports_with_most_shipments()[0]
+        docked = reporter.vessels_that_docked_port_between(port, date(2023, 1, 1), date(2023, 12, 31))
+        streamed = list(reporter.iter_vessels_that_docked_port_between(port, date(2023, 1, 1), date(2023, 12, 31), after=docked[0].imo))
+        self.assertGreater(len(docked), 1)
+        self.assertEqual([vessel.imo for vessel in streamed], [vessel.imo for vessel in docked[1:]])
+
 if __name__ == '__main__':
     # Run all tests
     unittest.main()
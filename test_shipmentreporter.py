@@ -0,0 +1,212 @@
+import csv
+import gc
+import gzip
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import date
+import database
+import shipmentapp
+from shipmentreporter import Reporter, safe_filename
+
+
+class TestExportToCsv(unittest.TestCase):
+
+    def setUp(self):
+        self.reporter = Reporter()
+
+    def test_gzip_export_to_directory(self):
+        """Test that a compressed export lands in the output directory with a safe name."""
+        with tempfile.TemporaryDirectory() as tmp:
+            self.reporter.vessels_from_country("Panama", to_csv=True, output_dir=tmp, compress=True)
+            stats = self.reporter.last_export
+
+            self.assertEqual(stats.target, os.path.join(tmp, "vessels_from_country_Panama.csv.gz"))
+            self.assertEqual(stats.bytes, os.path.getsize(stats.target))
+            with gzip.open(stats.target, "rt", newline="") as file:
+                rows = list(csv.reader(file))
+
+        self.assertEqual(rows[0][0], "imo")
+        self.assertEqual(stats.rows, len(rows) - 1)
+        self.assertEqual(stats.rows, len(self.reporter.vessels_from_country("Panama")))
+
+    def test_streams_in_chunks_to_file_like(self):
+        """Test that chunked export to a file-like object writes every row once."""
+        target = io.StringIO()
+        stats = self.reporter.export_to_csv(((i, f"name {i}") for i in range(12)), target, ["id", "name"], chunk_size=5)
+
+        lines = target.getvalue().splitlines()
+        self.assertEqual((stats.rows, len(lines)), (12, 13))
+        self.assertEqual(stats.bytes, len(target.getvalue().encode("utf-8")))
+
+        port = self.reporter.ports_with_most_shipments()[0]
+        binary = io.BytesIO()
+        self.reporter.vessels_that_docked_port_between(port, date(2023, 1, 1), date(2023, 12, 31), to_csv=True, output=binary)
+        self.assertEqual(self.reporter.last_export.rows, len(binary.getvalue().splitlines()) - 1)
+
+    def test_safe_filename(self):
+        """Test that free text cannot escape the output directory and different texts never share a file."""
+        self.assertRegex(safe_filename("ports_in_country", "../etc/passwd x"), r"^ports_in_country_etc_passwd_x-[0-9a-f]{8}\.csv$")
+        self.assertNotIn("/", safe_filename("a/b", "c\\\\d", compress=True))
+        self.assertEqual(safe_filename("ports_in_country", "Panama"), "ports_in_country_Panama.csv")
+
+        # Names in other scripts are kept, and names that clean up alike still get files of their own
+        self.assertEqual(safe_filename("vessels_from_country", "日本"), "vessels_from_country_日本.csv")
+        names = {safe_filename("ports_in_country", country) for country in ("A/B", "A B", "A_B", "???", "!!!")}
+        self.assertEqual(len(names), 5)
+        self.assertNotIn("ports_in_country_.csv", names)
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "test.db")
+        with sqlite3.connect(self.path) as conn:
+            shipmentapp.create_tables(conn.cursor())
+            conn.execute("INSERT INTO vessels (imo, country) VALUES (1, 'Turkey')")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_repeated_calls_hit_until_data_changes(self):
+        """Test that identical calls are served from the cache until another connection commits."""
+        reporter = Reporter(self.path, cache=True)
+        self.assertEqual(reporter.total_amount_of_vessels(), 1)
+        self.assertEqual(reporter.total_amount_of_vessels(), 1)
+        self.assertIs(reporter.vessels_from_country("Turkey"), reporter.vessels_from_country(country="Turkey"))
+        self.assertEqual((reporter.result_cache.hits, reporter.result_cache.misses), (2, 2))
+
+        with sqlite3.connect(self.path) as writer:
+            writer.execute("INSERT INTO vessels (imo, country) VALUES (2, 'Turkey')")
+
+        self.assertEqual(reporter.total_amount_of_vessels(), 2)
+        self.assertEqual(len(reporter.vessels_from_country("Turkey")), 2)
+        self.assertEqual(reporter.result_cache.invalidations, 1)
+
+    def test_size_limit_and_exports_bypass(self):
+        """Test that the cache stays within its bound and CSV exports always run."""
+        reporter = Reporter(self.path, cache=True, cache_size=2)
+        for country in ("Turkey", "Panama", "Malta"):
+            reporter.vessels_from_country(country)
+        self.assertEqual(len(reporter.result_cache), 2)
+
+        target = io.StringIO()
+        reporter.vessels_from_country("Turkey", True, output=target)
+        reporter.vessels_from_country("Turkey", True, output=target)
+        self.assertEqual(len(target.getvalue().splitlines()), 4)
+        self.assertIsNone(Reporter(self.path).result_cache)
+
+    def test_function_arguments_bypass(self):
+        """Test that calls with a function argument are never served from the cache."""
+        reporter = Reporter(self.path, cache=True)
+        with sqlite3.connect(self.path) as writer:
+            writer.executemany("INSERT INTO vessels (imo, length) VALUES (?, ?)", [(2, 100), (3, 300)])
+        self.assertEqual([v.imo for v in reporter.top_n("vessel", lambda vessel: vessel.length or 0, 2)], [3, 2])
+        self.assertEqual([v.imo for v in reporter.top_n("vessel", lambda vessel: -(vessel.length or 0), 2)], [1, 2])
+        self.assertEqual(len(reporter.result_cache), 0)
+
+    def test_changed_rows_refresh_shared_objects(self):
+        """Test that a port renamed after it was fetched comes back with its new name."""
+        with sqlite3.connect(self.path) as writer:
+            writer.execute("INSERT INTO ports (id, name) VALUES ('TWNAN', 'Nangang')")
+        reporter = Reporter(self.path)
+        port = reporter.search_ports("nangang")[0]
+        with sqlite3.connect(self.path) as writer:
+            writer.execute("UPDATE ports SET name = 'Renamed' WHERE id = 'TWNAN'")
+        self.assertIs(reporter.search_ports("renamed")[0], port)
+        self.assertEqual(port.name, "Renamed")
+        reporter.close()
+
+class TestClose(unittest.TestCase):
+
+    def test_failed_open_closes_quietly(self):
+        """Test that a reporter whose connection failed is garbage collected without errors."""
+        unraisable = []
+        previous, sys.unraisablehook = sys.unraisablehook, unraisable.append
+        try:
+            with self.assertRaises(sqlite3.OperationalError):
+                Reporter(os.path.join(tempfile.gettempdir(), "missing", "test.db"), read_only=True)
+            gc.collect()
+        finally:
+            sys.unraisablehook = previous
+        self.assertEqual(unraisable, [])
+
+class TestTopN(unittest.TestCase):
+
+    def setUp(self):
+        self.reporter = Reporter()
+
+    def test_indexed_and_streamed_rankings_agree(self):
+        """Test that a named metric and the same metric as a function rank identically, ties included."""
+        for metric, ascending in (("length", False), ("beam", True)):
+            by_name = self.reporter.top_n("vessel", metric, 50, ascending)
+            by_function = self.reporter.top_n("vessel", lambda vessel: getattr(vessel, metric), 50, ascending)
+            self.assertEqual([vessel.imo for vessel in by_name], [vessel.imo for vessel in by_function])
+
+            values = [getattr(vessel, metric) for vessel in by_name]
+            self.assertEqual(values, sorted(values, reverse=not ascending))
+
+        tied = self.reporter.top_n("vessel", "beam", 1, with_ties=True)
+        self.assertEqual(len({vessel.beam for vessel in tied}), 1)
+        streamed = self.reporter.top_n("vessel", lambda vessel: vessel.beam, 1, with_ties=True)
+        self.assertEqual([vessel.imo for vessel in tied], [vessel.imo for vessel in streamed])
+        for n, ascending in ((1, True), (7, False), (7, True)):
+            tied = self.reporter.top_n("vessel", "length", n, ascending, with_ties=True)
+            streamed = self.reporter.top_n("vessel", lambda vessel: vessel.length, n, ascending, with_ties=True)
+            self.assertEqual([vessel.imo for vessel in tied], [vessel.imo for vessel in streamed])
+
+    def test_wrappers_and_filters(self):
+        """Test that the single-answer methods are the head of the matching ranking."""
+        longest, shortest = self.reporter.longest_and_shortest_vessels()
+        self.assertIs(longest, self.reporter.top_n("vessel", "length", 1)[0])
+        self.assertIs(shortest, self.reporter.top_n("vessel", "length", 1, ascending=True)[0])
+        self.assertEqual(self.reporter.longest_shipment().id, self.reporter.top_n("shipment", "distance_naut", 1)[0].id)
+
+        panama = self.reporter.top_n("vessel", "shipments", 5, filters={"country": "Panama"})
+        self.assertTrue(panama and all(vessel.country == "Panama" for vessel in panama))
+        with self.assertRaises(ValueError):
+            self.reporter.top_n("vessel", "name")
+        with self.assertRaises(ValueError):
+            self.reporter.top_n("port", "shipments", filters={"name": "x"})
+
+class TestConcurrentReporter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "shipments.db")
+        shutil.copy(database.DATABASE_PATH, self.path)
+        self.reporter = Reporter(self.path, concurrent=True, workers=4)
+
+    def tearDown(self):
+        self.reporter.close()
+        self.tmp.cleanup()
+
+    def test_parallel_batch_matches_sequential_calls(self):
+        """Test that a parallel batch returns the same results, in order, as calling one by one."""
+        calls = ["longest_shipment", ("top_n", ("vessel", "length"), {"n": 50}),
+                 ("vessels_from_country", ("Panama",)), ("ports_in_country", ("China",))] * 3
+        results = self.reporter.run_parallel(calls)
+
+        sequential = Reporter(self.path)
+        expected = [sequential.longest_shipment(), sequential.top_n("vessel", "length", n=50),
+                    sequential.vessels_from_country("Panama"), sequential.ports_in_country("China")] * 3
+        self.assertEqual(repr(results), repr(expected))
+        self.assertEqual(self.reporter.conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        with self.assertRaises(RuntimeError):
+            sequential.run_parallel(["longest_shipment"])
+
+    def test_reads_while_a_writer_holds_the_lock(self):
+        """Test that reports are answered from the last commit while a load is in progress."""
+        vessels = self.reporter.total_amount_of_vessels()
+        with sqlite3.connect(self.path, timeout=0) as writer:
+            writer.execute("BEGIN IMMEDIATE")
+            writer.execute("DELETE FROM vessels")
+            self.assertEqual(self.reporter.run_parallel(["total_amount_of_vessels"]), [vessels])
+        self.assertEqual(self.reporter.run_parallel(["total_amount_of_vessels"]), [0])
+
+if __name__ == '__main__':
+    unittest.main()
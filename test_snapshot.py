@@ -0,0 +1,84 @@
+import math
+import os
+import sqlite3
+import tempfile
+import unittest
+import numpy as np
+import shipmentapp
+import snapshot
+from frame import ShipmentFrame, COLUMNS
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "snapshot.db")
+        self.snapshot_path = os.path.join(self.tmp.name, "shipments.snapshot")
+        self.conn = sqlite3.connect(self.path)
+        self.cursor = self.conn.cursor()
+        shipmentapp.create_tables(self.cursor)
+        self.cursor.executemany("INSERT INTO ports (id, code, name, country) VALUES (?, ?, ?, ?)", [
+            ("TRIST", 1, "İstanbul", "Turkey"), ("NLRTM", None, "Rotterdam", None),
+        ])
+        self.cursor.executemany("INSERT INTO vessels (imo, type, gross, netto) VALUES (?, ?, ?, ?)", [
+            (2, "Tanker", 300, 100), (1, "Bulk Carrier", 200, None),
+        ])
+        self.cursor.executemany("INSERT INTO shipments (id, date, cargo_weight, distance_naut, duration_hours, average_speed, origin, destination, vessel) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+            ("S1", "01-01-2023", 10, 100.5, 10, 10.05, "TRIST", "NLRTM", 2),
+            ("S2", "01-01-2023", None, None, 5, 8.0, "NLRTM", "TRIST", 1),
+            ("S3", "02-01-2023", 30, 50.0, 2, 25.0, "NLRTM", None, 9),
+        ])
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        """Test that every table comes back with its values, NULLs and dictionary-encoded strings intact."""
+        snapshot.write_snapshot(self.snapshot_path, self.path)
+        with snapshot.Snapshot(self.snapshot_path) as mapped:
+            for table, (query, kinds) in snapshot.TABLES.items():
+                rows = self.cursor.execute(query).fetchall()
+                self.assertEqual(mapped.rows(table), len(rows))
+                for index, name in enumerate(kinds):
+                    expected = [row[index] for row in rows]
+                    if kinds[name] == "string":
+                        actual = mapped.strings(table, name).tolist()
+                    else:
+                        values = mapped.column(table, name).tolist()
+                        nulls = mapped.nulls(table, name)
+                        actual = [None if (nulls is not None and nulls[i]) or (isinstance(value, float) and math.isnan(value)) else value
+                                  for i, value in enumerate(values)]
+                    self.assertEqual(actual, expected, f"{table}.{name}")
+
+            # Repeated strings share one dictionary entry, and numbers are views on the mapping
+            self.assertEqual(mapped.dictionary("shipments", "date").tolist(), ["01-01-2023", "02-01-2023"])
+            self.assertFalse(mapped.column("shipments", "distance_naut").flags.writeable)
+
+    def test_invalidated_when_database_changes(self):
+        """Test that a write to the database makes the snapshot stale and open_snapshot rewrites it."""
+        mapped = snapshot.open_snapshot(self.snapshot_path, self.path)
+        self.assertTrue(mapped.is_current(self.path))
+        mapped.close()
+
+        self.cursor.execute("DELETE FROM shipments WHERE id = 'S3'")
+        self.conn.commit()
+        with self.assertRaises(RuntimeError):
+            snapshot.open_snapshot(self.snapshot_path, self.path, rebuild=False)
+        with snapshot.open_snapshot(self.snapshot_path, self.path) as mapped:
+            self.assertEqual(mapped.rows("shipments"), 2)
+
+    def test_frame_matches_database(self):
+        """Test that a frame built from the snapshot equals one loaded from the database."""
+        expected = ShipmentFrame.from_database(self.conn)
+        with snapshot.open_snapshot(self.snapshot_path, self.path) as mapped:
+            frame = ShipmentFrame.from_snapshot(mapped)
+            for name in COLUMNS:
+                self.assertTrue(np.array_equal(getattr(frame, name), getattr(expected, name), equal_nan=True)
+                                if getattr(frame, name).dtype != object
+                                else getattr(frame, name).tolist() == getattr(expected, name).tolist(), name)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import sqlite3
+import unittest
+import schema
+import shipmentapp
+import summary
+import testutil
+
+
+class TestSummaryTables(testutil.DerivedTableTestCase):
+    module = summary
+    queries = ("SELECT * FROM vessel_shipment_stats ORDER BY 1", "SELECT * FROM port_shipment_stats ORDER BY 1",
+               "SELECT * FROM port_type_shipment_stats ORDER BY 1, 2")
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.cursor = self.conn.cursor()
+        shipmentapp.create_tables(self.cursor)
+        self.cursor.executemany("INSERT INTO vessels (imo, type) VALUES (?, ?)", [(1, "Bulk Carrier"), (2, "Container Ship")])
+        self.cursor.executemany("INSERT INTO shipments (id, date, origin, destination, vessel) VALUES (?, ?, ?, ?, ?)", [
+            ("S1", "05-01-2023", "TRIST", "TRIZM", 1),
+            ("S2", "01-02-2023", "TRIST", "NLRTM", 2),
+            ("S3", "31-12-2022", "TRIZM", "TRIST", 1),
+            ("S4", "15-06-2023", "TRIST", "TRIZM", 1),
+        ])
+
+    def test_kept_current_by_triggers(self):
+        """Test that inserts, deletes and updates of shipments and vessel types keep the summaries exact."""
+        self.assertCurrent()
+
+        self.cursor.execute("DELETE FROM shipments WHERE id = 'S4'")
+        self.cursor.execute("UPDATE shipments SET origin = 'NLRTM', date_iso = '2024-01-01' WHERE id = 'S1'")
+        self.cursor.execute("UPDATE vessels SET type = 'Container Ship' WHERE imo = 1")
+        self.assertCurrent()
+
+        # A date that does not parse leaves date_iso NULL until it is corrected
+        self.cursor.execute("UPDATE shipments SET date = '30-02-2023' WHERE id = 'S2'")
+        self.assertCurrent()
+        self.cursor.execute("UPDATE shipments SET date = '1-3-2023' WHERE id = 'S2'")
+        self.assertCurrent()
+
+        self.cursor.execute("DELETE FROM shipments")
+        self.assertEqual(self.rows(), [[], [], []])
+
+    def test_shipment_without_date_keeps_first_and_last(self):
+        """Test that counting a shipment without a date leaves the first and last dates as rebuild has them."""
+        self.cursor.execute("INSERT INTO shipments (id, date, origin, destination, vessel) VALUES ('S5', NULL, 'TRIST', 'NLRTM', 1)")
+        self.cursor.execute("INSERT INTO shipments (id, date, origin, destination, vessel) VALUES ('S6', '01-07-2023', 'TRIST', 'NLRTM', 1)")
+        self.assertEqual(self.rows()[1][0], ("TRIST", 5, "2023-01-05", "2023-07-01"))
+        self.assertCurrent()
+
+    def test_bulk_load_rebuilds_once(self):
+        """Test that a bulk load without triggers fills in ISO dates and leaves the triggers in place."""
+        with schema.bulk_load(self.conn):
+            self.cursor.execute("INSERT INTO shipments (id, date, origin, destination, vessel) VALUES ('S5', '01-03-2021', 'NLRTM', 'TRIST', 2)")
+            self.conn.commit()
+            self.assertEqual(self.cursor.execute("SELECT date_iso FROM shipments WHERE id = 'S5'").fetchone()[0], None)
+
+        self.assertEqual(self.cursor.execute("SELECT date_iso FROM shipments WHERE id = 'S5'").fetchone()[0], "2021-03-01")
+        self.assertIn(("NLRTM", 1, "2021-03-01", "2021-03-01"), self.rows()[1])
+        self.cursor.execute("DELETE FROM shipments WHERE id = 'S5'")
+        self.assertCurrent()
+
+if __name__ == '__main__':
+    unittest.main()
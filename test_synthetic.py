@@ -0,0 +1,39 @@
+import itertools
+import os
+import tempfile
+import unittest
+import ingest
+import shipmentapp
+import synthetic
+from benchmark import parse_size
+
+
+class TestSyntheticFeed(unittest.TestCase):
+
+    def test_feed_is_deterministic_and_shaped_like_the_real_one(self):
+        """Test that a seed always gives the same feed and that ingest can read it."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "feed.json")
+            synthetic.write_feed(path, 500, seed=7)
+            with open(path, encoding="utf-8") as file:
+                entries = list(ingest.iter_json_array(file))
+
+        self.assertEqual(entries, list(synthetic.iter_entries(500, seed=7)))
+        self.assertNotEqual(entries[:10], list(itertools.islice(synthetic.iter_entries(500, seed=8), 10)))
+        with open(shipmentapp.JSON_FILE_PATH, encoding="utf-8") as file:
+            real = next(ingest.iter_json_array(file))
+        self.assertEqual(set(entries[0]), set(real))
+        self.assertEqual(set(entries[0]["vessel"]), set(real["vessel"]))
+
+        for entry in entries:
+            ingest.shipment_row(entry)
+            ingest.vessel_row(entry["vessel"])
+            self.assertNotEqual(entry["origin"]["id"], entry["destination"]["id"])
+
+    def test_parse_size(self):
+        """Test the benchmark feed sizes."""
+        self.assertEqual([parse_size(size) for size in ("10k", "1M", "10M", "2.5k", "1234")],
+                         [10_000, 1_000_000, 10_000_000, 2500, 1234])
+
+if __name__ == '__main__':
+    unittest.main()
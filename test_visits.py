@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import date, datetime
+import schema
+import shipmentapp
+from port import Port
+from shipmentreporter import Reporter
+
+
+def timeline(cursor):
+    return cursor.execute("SELECT shipment, kind, port, time FROM port_visits ORDER BY shipment, kind").fetchall()
+
+
+class TestPortVisits(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "visits.db")
+        self.conn = sqlite3.connect(self.path)
+        self.cursor = self.conn.cursor()
+        shipmentapp.create_tables(self.cursor)
+        self.cursor.executemany("INSERT INTO ports (id, country) VALUES (?, 'Turkey')", [("TRIST",), ("TRIZM",)])
+        self.cursor.executemany("INSERT INTO vessels (imo) VALUES (?)", [(1,), (2,)])
+        self.cursor.executemany("INSERT INTO shipments (id, date, duration_hours, origin, destination, vessel) VALUES (?, ?, ?, ?, ?, ?)", [
+            ("S1", "30-12-2022", 60.5, "TRIST", "TRIZM", 1),
+            ("S2", "10-01-2023", 12, "TRIZM", "TRIST", 1),
+            ("S3", "02-01-2023", 24, "TRIST", "TRIZM", 2),
+        ])
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def test_kept_current_by_triggers(self):
+        """Test that every shipment has a departure and an arrival at date plus duration, also after changes."""
+        self.assertEqual(timeline(self.cursor)[:2], [
+            ("S1", "arrival", "TRIZM", "2023-01-01 12:30:00"),
+            ("S1", "departure", "TRIST", "2022-12-30 00:00:00"),
+        ])
+
+        self.cursor.execute("UPDATE shipments SET duration_hours = 1 WHERE id = 'S1'")
+        self.assertIn(("S1", "arrival", "TRIZM", "2022-12-30 01:00:00"), timeline(self.cursor))
+        self.cursor.execute("UPDATE shipments SET date = '2-1-2023' WHERE id = 'S1'")
+        self.assertIn(("S1", "departure", "TRIST", "2023-01-02 00:00:00"), timeline(self.cursor))
+        self.cursor.execute("DELETE FROM shipments WHERE id = 'S3'")
+        self.assertEqual([row[0] for row in timeline(self.cursor)], ["S1", "S1", "S2", "S2"])
+
+        expected = timeline(self.cursor)
+        with schema.bulk_load(self.conn):
+            self.cursor.execute("DELETE FROM port_visits")
+        self.assertEqual(timeline(self.cursor), expected)
+
+    def test_docking_window_and_occupancy(self):
+        """Test that arrivals count on the day the voyage ends and vessels stay in port until they move on."""
+        reporter = Reporter(self.path)
+        izmir = Port("TRIZM", None, None, None, None, "Turkey")
+
+        # S1 left on 30 December but only arrived in Izmir on 1 January
+        self.assertEqual([vessel.imo for vessel in reporter.vessels_that_docked_port_between(izmir, date(2022, 12, 1), date(2022, 12, 31))], [])
+        self.assertEqual([vessel.imo for vessel in reporter.vessels_that_docked_port_between(izmir, date(2023, 1, 1), date(2023, 1, 1))], [1])
+
+        self.assertEqual([vessel.imo for vessel in reporter.vessels_in_port_at(izmir, datetime(2023, 1, 5))], [1, 2])
+        self.assertEqual([vessel.imo for vessel in reporter.vessels_in_port_at(izmir, datetime(2023, 1, 10, 6))], [2])
+        self.assertEqual(reporter.port_traffic(izmir, date(2023, 1, 1), date(2023, 1, 31)),
+                         (("2023-01-01", 1, 0), ("2023-01-03", 1, 0), ("2023-01-10", 0, 1)))
+
+        # Vessel 1 left at midnight on 10 January; a window starting mid-stay counts the vessels already in port
+        self.assertEqual([vessels for _, vessels in reporter.port_occupancy(izmir, date(2023, 1, 1), date(2023, 1, 11))],
+                         [1, 1, 2, 2, 2, 2, 2, 2, 2, 1, 1])
+        self.assertEqual(reporter.port_occupancy(izmir, date(2023, 1, 9), date(2023, 1, 10)), (("2023-01-09", 2), ("2023-01-10", 1)))
+        reporter.close()
+
+if __name__ == '__main__':
+    unittest.main()
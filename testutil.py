@@ -0,0 +1,25 @@
+import unittest
+
+
+class DerivedTableTestCase(unittest.TestCase):
+    # Set by subclasses: the module whose rebuild() recomputes the derived tables,
+    # and queries listing their rows in a fixed order. setUp provides self.cursor.
+    module = None
+    queries = ()
+
+    def rows(self) -> list:
+        return [self.cursor.execute(query).fetchall() for query in self.queries]
+
+    def rebuilt(self) -> list:
+        """Return the rows as the module's rebuild computes them, leaving the maintained rows in place."""
+        self.cursor.execute("SAVEPOINT rebuilt")
+        try:
+            self.module.rebuild(self.cursor)
+            return self.rows()
+        finally:
+            self.cursor.execute("ROLLBACK TO rebuilt")
+            self.cursor.execute("RELEASE rebuilt")
+
+    def assertCurrent(self):
+        """Assert that the rows the triggers maintain equal a full rebuild."""
+        self.assertEqual(self.rows(), self.rebuilt())
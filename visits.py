@@ -0,0 +1,81 @@
+from dates import NOT_FILLING_IN_SQL, row_date_sql
+
+# One row per departure from the origin port and per arrival at the destination
+# port of every shipment. Departures are timed at the shipment date, arrivals at
+# the date plus the duration; times are "YYYY-MM-DD HH:MM:SS" text, so they sort
+# and compare like the ISO dates. Triggers on shipments keep the table current.
+
+TRIGGERS = ("port_visits_insert", "port_visits_delete", "port_visits_update")
+
+# Timestamp of the arrival, the departure timestamp moved on by the whole seconds of the voyage
+ARRIVAL_SQL = "datetime({date}, printf('+%d seconds', CAST(ROUND({row}.duration_hours * 3600) AS INTEGER)))"
+
+
+def _insert_sql(row: str, source: str = "") -> str:
+    """Statements that add the departure and arrival of the shipments referenced as ``row``."""
+    date = row_date_sql(row)
+    return f"""
+        INSERT OR REPLACE INTO port_visits (port, time, kind, vessel, shipment)
+        SELECT {row}.origin, datetime({date}), 'departure', {row}.vessel, {row}.id {source}
+        WHERE {row}.origin IS NOT NULL AND {date} IS NOT NULL;
+
+        INSERT OR REPLACE INTO port_visits (port, time, kind, vessel, shipment)
+        SELECT {row}.destination, {ARRIVAL_SQL.format(date=date, row=row)}, 'arrival', {row}.vessel, {row}.id {source}
+        WHERE {row}.destination IS NOT NULL AND {date} IS NOT NULL AND {row}.duration_hours IS NOT NULL;
+    """
+
+
+def create_visit_table(cursor):
+    """Version 5: port visit timeline for docking-window and occupancy queries, kept current by triggers."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS port_visits (
+            port TEXT NOT NULL,
+            time TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            vessel INTEGER,
+            shipment TEXT NOT NULL,
+            PRIMARY KEY (shipment, kind)
+        )
+    """)
+
+    # Windows at a port are range scans; the vessel column makes them covering
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_port_visits_port_time ON port_visits (port, time, vessel)")
+    # Whether a vessel moved on after arriving is a range scan over its own visits
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_port_visits_vessel_time ON port_visits (vessel, time)")
+
+    rebuild(cursor)
+    create_triggers(cursor)
+
+
+def rebuild(cursor):
+    """Recompute the timeline from the shipments."""
+    cursor.execute("DELETE FROM port_visits")
+    for statement in _insert_sql("shipments", "FROM shipments").split(";"):
+        if statement.strip():
+            cursor.execute(statement)
+
+
+def create_triggers(cursor):
+    """Create the triggers that keep the timeline current."""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS port_visits_insert AFTER INSERT ON shipments
+        BEGIN {_insert_sql("NEW")} END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS port_visits_delete AFTER DELETE ON shipments
+        BEGIN DELETE FROM port_visits WHERE shipment = OLD.id; END
+    """)
+
+    # Filling in a missing date_iso does not move any visit
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS port_visits_update
+        AFTER UPDATE OF id, date, date_iso, duration_hours, origin, destination, vessel ON shipments
+        WHEN {NOT_FILLING_IN_SQL}
+        BEGIN DELETE FROM port_visits WHERE shipment = OLD.id; {_insert_sql("NEW")} END
+    """)
+
+
+def drop_triggers(cursor):
+    """Drop the maintenance triggers; see schema.bulk_load."""
+    for trigger in TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")